@@ -1,18 +1,55 @@
-import paramiko
 import threading
 import os
 import time
-import socket
-import subprocess
-from datetime import datetime
-import pytz
 import sys
-import openpyxl
-from openpyxl.styles import PatternFill, Font
 import queue
-from contextlib import contextmanager
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import multiprocessing
+import sqlite3
 import importlib
+from datetime import datetime
+from plc_engine import (
+    BatchEngine,
+    PLCDevice,
+    InstallProgressParser,
+    classify_install_failure,
+    clean_ip_address,
+    resource_path,
+    autosave_path_for,
+    FleetStateStore,
+    load_autosave,
+    write_report_xlsx,
+    SYSTEM_SERVICES_FILE,
+    TIMEZONE,
+    ISSUE_TIME_SYNC,
+    ISSUE_SYSTEM_SERVICES,
+    ISSUE_TIMEZONE,
+    DEFAULT_SSH_TIMEOUT,
+    DEFAULT_SSH_KEEPALIVE,
+    DEFAULT_RETRY_ATTEMPTS,
+    DEFAULT_RETRY_DELAY,
+    DEFAULT_PAUSE_BETWEEN,
+    DEFAULT_UPLOAD_TIMEOUT,
+    DEFAULT_UPLOAD_SAFETY_FACTOR,
+    DEFAULT_STALL_WINDOW,
+    DEFAULT_STALL_MIN_RATE,
+    DEFAULT_UPDATE_COMMAND_TIMEOUT,
+    DEFAULT_IDLE_TIMEOUT,
+    DEFAULT_POST_REBOOT_WAIT,
+    DEFAULT_POST_REBOOT_TIMEOUT,
+    DEFAULT_POST_REBOOT_POLL,
+    DEFAULT_PARALLEL_WORKERS,
+    DEFAULT_SHARD_PROCESSES,
+    DEFAULT_DETACHED_UPDATE,
+    DEFAULT_DETACHED_POLL,
+    DEFAULT_HTTP_INSTALL,
+    DEFAULT_HTTP_INSTALL_PORT,
+    DEFAULT_PRESTAGE_RATE_LIMIT,
+    DEFAULT_CLEANUP_STALE_BUNDLES,
+    DEFAULT_SKIP_UNREACHABLE,
+    DEFAULT_ASYNC_READ,
+    DEFAULT_PREDIAL_AHEAD,
+    DEFAULT_ASYNC_READ_CONCURRENCY,
+)
 from PySide6.QtCore import Qt, QTimer, QObject, Signal
 from PySide6.QtGui import QColor, QBrush, QIcon, QTextCursor
 from PySide6.QtWidgets import (
@@ -37,6 +74,7 @@ from PySide6.QtWidgets import (
     QGroupBox,
     QHeaderView,
     QMessageBox,
+    QInputDialog,
     QRadioButton,
     QButtonGroup,
     QTreeWidget,
@@ -44,15 +82,18 @@ from PySide6.QtWidgets import (
     QPlainTextEdit,
 )
 
-try:
-    qdarktheme = importlib.import_module("qdarktheme")
-except Exception:
-    qdarktheme = None
 
-try:
-    apply_stylesheet = importlib.import_module("qt_material").apply_stylesheet
-except Exception:
-    apply_stylesheet = None
+def apply_theme(qt_app):
+    """Motyw ciemny (qdarktheme / qt_material, jeśli zainstalowane) - moduły ładowane dopiero przy starcie okna."""
+    try:
+        qdarktheme = importlib.import_module("qdarktheme")
+        qdarktheme.setup_theme("dark")
+    except Exception:
+        pass
+    try:
+        importlib.import_module("qt_material").apply_stylesheet(qt_app, theme="dark_teal.xml")
+    except Exception:
+        pass
 
 
 class TkConstants:
@@ -181,6 +222,21 @@ class CompatTreeWidget(QTreeWidget):
 
     def insert(self, _parent, _where, text="", values=(), tags=()):
         item = QTreeWidgetItem([text] + [str(v) for v in values])
+        self._apply_tags(item, tags)
+        self.addTopLevelItem(item)
+        return item
+
+    def item(self, item, text="", values=(), tags=()):
+        """Zmienia tekst, wartości i tagi istniejącego wiersza (jak Treeview.item)."""
+        for col, value in enumerate([text] + [str(v) for v in values]):
+            if item.text(col) != value:
+                item.setText(col, value)
+        for col in range(item.columnCount()):
+            item.setBackground(col, QBrush())
+            item.setForeground(col, QBrush())
+        self._apply_tags(item, tags)
+
+    def _apply_tags(self, item, tags):
         for tag in tags:
             style = self._tag_styles.get(tag, {})
             bg = style.get("background")
@@ -190,8 +246,6 @@ class CompatTreeWidget(QTreeWidget):
                     item.setBackground(col, QBrush(bg))
                 if fg:
                     item.setForeground(col, QBrush(fg))
-        self.addTopLevelItem(item)
-        return item
 
     def update_idletasks(self):
         QApplication.processEvents()
@@ -222,6 +276,10 @@ class FileDialogCompat:
             path += defaultextension
         return path
 
+    @staticmethod
+    def askdirectory(title="Wybierz katalog"):
+        return QFileDialog.getExistingDirectory(None, title, "")
+
 
 class MessageBoxCompat:
     @staticmethod
@@ -257,83 +315,13 @@ class UiBridge(QObject):
 
 
 
-# Konfiguracja hardcoded (nie zmienia się)
-PLC_USER = "admin"
-ROOT_PASS = "12345"
-TIMEZONE = "Europe/Warsaw"
-SYSTEM_SERVICES_FILE = "Default.scm.config"
-
-# Domyślne wartości (będą w GUI)
-DEFAULT_SSH_TIMEOUT = 30
-DEFAULT_SSH_KEEPALIVE = 30
-DEFAULT_RETRY_ATTEMPTS = 3
-DEFAULT_RETRY_DELAY = 10
-DEFAULT_PAUSE_BETWEEN = 5
-DEFAULT_UPLOAD_TIMEOUT = 900  # 15 minut dla 300MB firmware
-DEFAULT_UPDATE_COMMAND_TIMEOUT = 600  # 10 minut dla update-axcf
-DEFAULT_IDLE_TIMEOUT = 60
-DEFAULT_POST_REBOOT_WAIT = 60
-DEFAULT_POST_REBOOT_TIMEOUT = 300
-DEFAULT_POST_REBOOT_POLL = 5
-DEFAULT_PARALLEL_WORKERS = 1
-
-def resource_path(relative_path):
-    """Zwraca absolutną ścieżkę do pliku, działa również w exe PyInstaller."""
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
-
-def clean_ip_address(text):
-    """
-    Ekstraktuje adres IP z różnych formatów:
-    - https://192.168.1.100/config → 192.168.1.100
-    - 192.168.1.100:8080 → 192.168.1.100
-    - [192.168.1.100] → 192.168.1.100
-    """
-    import re
-    if not text:
-        return ""
-    
-    # Znajdź wzorzec IP (4 liczby oddzielone kropkami)
-    match = re.search(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', text)
-    if match:
-        ip = match.group(1)
-        # Walidacja zakresów (0-255)
-        try:
-            parts = ip.split('.')
-            if all(0 <= int(p) <= 255 for p in parts):
-                return ip
-        except:
-            pass
-    
-    return text.strip()  # Fallback - zwróć oczyszczony tekst
-
-class FatalUpdateError(Exception):
-    """Błąd krytyczny - operacja nie powinna być ponawiana (bez retry)."""
-    pass
-
-class PLCDevice:
-    """Klasa reprezentująca jeden sterownik PLC."""
-    def __init__(self, name, ip, password):
-        self.name = name
-        self.ip = ip
-        self.password = password
-        self.firmware_version = ""
-        self.timezone = ""
-        self.system_services_ok = ""
-        self.last_check = ""
-        self.last_update = ""
-        self.status = "Oczekuje"
-        self.error_log = ""
-        self.plc_model = ""
-        self.plc_time = ""
-        self.time_sync_error = False
-
-class BatchProcessorApp(QMainWindow):
+class BatchProcessorApp(BatchEngine, QMainWindow):
     """Główna aplikacja do przetwarzania wsadowego sterowników PLC."""
 
+    # Wczytywanie listy: wiersze przekazywane do tabeli co N sterowników lub co N sekund
+    INVENTORY_BATCH_ROWS = 500
+    INVENTORY_BATCH_INTERVAL = 0.1
+
     def __init__(self):
         self._qt_app = QApplication.instance() or QApplication(sys.argv)
         super().__init__()
@@ -344,39 +332,20 @@ class BatchProcessorApp(QMainWindow):
         except Exception:
             pass
 
-        try:
-            if qdarktheme:
-                qdarktheme.setup_theme("dark")
-            if apply_stylesheet:
-                apply_stylesheet(self._qt_app, theme="dark_teal.xml")
-        except Exception:
-            pass
+        apply_theme(self._qt_app)
 
-        # Zmienne stanu
+        # Zmienne stanu GUI (stan silnika ustawia BatchEngine.__init__)
         self.excel_path = StringVar()
         self.firmware_path = StringVar()
-        self.devices = []
-        self.processing = False
-        self.log_queue = queue.Queue()
-        self.upload_log_progress = {}
+        self.firmware_catalog_dir = StringVar()
         self.show_errors_only = BooleanVar(value=False)
+        self.loading_inventory = False
+        self.saving_report = False
+        self.device_items = {}  # PLCDevice -> wiersz tabeli
+        self.discovery_targets = ""
         self._ui_bridge = UiBridge()
         self._ui_bridge.invoke.connect(self._run_ui_callback)
-        
-        # Konfigurowalne ustawienia (domyślne wartości)
-        self.ssh_timeout = DEFAULT_SSH_TIMEOUT
-        self.ssh_keepalive = DEFAULT_SSH_KEEPALIVE
-        self.retry_attempts = DEFAULT_RETRY_ATTEMPTS
-        self.retry_delay = DEFAULT_RETRY_DELAY
-        self.pause_between_devices = DEFAULT_PAUSE_BETWEEN
-        self.upload_timeout = DEFAULT_UPLOAD_TIMEOUT
-        self.update_command_timeout = DEFAULT_UPDATE_COMMAND_TIMEOUT
-        self.idle_timeout = DEFAULT_IDLE_TIMEOUT
-        self.post_reboot_wait = DEFAULT_POST_REBOOT_WAIT
-        self.post_reboot_timeout = DEFAULT_POST_REBOOT_TIMEOUT
-        self.post_reboot_poll = DEFAULT_POST_REBOOT_POLL
-        self.parallel_workers = DEFAULT_PARALLEL_WORKERS
-        
+
         # Tworzenie GUI
         self.create_widgets()
 
@@ -398,7 +367,38 @@ class BatchProcessorApp(QMainWindow):
 
     def mainloop(self):
         self.show()
-        return self._qt_app.exec()
+        try:
+            return self._qt_app.exec()
+        finally:
+            self.network_profiles.flush()
+
+    def show_upload_progress(self, percent, text, color):
+        self.upload_progress.config(value=percent)
+        self.upload_status_label.config(text=text, fg=color)
+
+    def show_install_eta(self, text):
+        self.install_eta_label.config(text=text)
+
+    def show_batch_progress(self, percent, text, color):
+        self.batch_progress.config(value=percent)
+        self.batch_progress_label.config(text=text, fg=color)
+
+    def batch_finished(self, summary):
+        total = summary["total"]
+        self.status_bar.config(text="Gotowy")
+        self.batch_progress_label.config(
+            text=f"Zakończono: sukces {summary['success']}, błędy {summary['failed']}, "
+                 f"nieprzetworzone {summary['not_processed']}",
+            fg="#10B981" if summary["failed"] == 0 else "#EF4444"
+        )
+        messagebox.showinfo(
+            "Operacja zakończona",
+            f"Operacja: {summary['operation'].upper()}\n\n"
+            f"Sukces: {summary['success']}/{total}\n"
+            f"Błędy: {summary['failed']}/{total}\n"
+            f"Nieprzetworzone: {summary['not_processed']}/{total}\n\n"
+            f"Sprawdź logi i zakładkę tabeli, aby uzyskać szczegóły."
+        )
 
     def create_action_button(self, parent, text, command, variant="neutral", **kwargs):
         """Tworzy nowoczesny przycisk z lepszym designem."""
@@ -421,949 +421,6 @@ class BatchProcessorApp(QMainWindow):
         return btn
 
 
-    def create_ssh_client(self, ip, password, timeout=None):
-        """Tworzy i konfiguruje klienta SSH z odpowiednimi timeoutami."""
-        if timeout is None:
-            timeout = self.ssh_timeout
-
-        try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            ssh.connect(
-                ip,
-                username=PLC_USER,
-                password=password,
-                timeout=timeout,
-                banner_timeout=timeout,
-                auth_timeout=timeout,
-                allow_agent=False,
-                look_for_keys=False
-            )
-
-            transport = ssh.get_transport()
-            if transport:
-                transport.set_keepalive(self.ssh_keepalive)
-
-            return ssh
-        except paramiko.AuthenticationException as e:
-            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
-            raise Exception(f"{diagnosis}: {str(e)}") from e
-        except ConnectionRefusedError as e:
-            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
-            raise Exception(f"{diagnosis}: {str(e)}") from e
-        except socket.timeout as e:
-            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
-            raise Exception(f"{diagnosis}: {str(e)}") from e
-        except TimeoutError as e:
-            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
-            raise Exception(f"{diagnosis}: {str(e)}") from e
-        except Exception as e:
-            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
-            raise Exception(f"{diagnosis}: {str(e)}") from e
-
-    def check_ping(self, ip):
-        """Sprawdza, czy host odpowiada na ping."""
-        try:
-            result = subprocess.run(
-                ["ping", "-n", "1", "-w", "1200", ip],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=False
-            )
-            return result.returncode == 0
-        except Exception:
-            return None
-
-    def check_ssh_port(self, ip, timeout=None):
-        """Sprawdza dostępność portu SSH 22."""
-        if timeout is None:
-            timeout = self.ssh_timeout
-
-        sock = None
-        try:
-            sock = socket.create_connection((ip, 22), timeout=timeout)
-            return True, None
-        except ConnectionRefusedError:
-            return False, "Port zamknięty (firewall)"
-        except socket.timeout:
-            return False, "Timeout połączenia"
-        except OSError:
-            return False, "Host nieosiągalny (ping fail)"
-        finally:
-            if sock:
-                try:
-                    sock.close()
-                except Exception:
-                    pass
-
-    def diagnose_ssh_error(self, ip, error, timeout=None):
-        """Diagnostyka błędów SSH z rozróżnieniem przyczyn."""
-        if timeout is None:
-            timeout = self.ssh_timeout
-
-        error_msg = str(error).lower()
-
-        if isinstance(error, paramiko.AuthenticationException) or "authentication failed" in error_msg:
-            return "Błędne hasło"
-
-        ping_ok = self.check_ping(ip)
-        if ping_ok is False:
-            return "Host nieosiągalny (ping fail)"
-
-        port_open, port_reason = self.check_ssh_port(ip, timeout=min(timeout, 5))
-        if not port_open:
-            return port_reason
-
-        if isinstance(error, socket.timeout) or "timed out" in error_msg or "timeout" in error_msg:
-            return "Timeout połączenia"
-
-        return "Błąd połączenia SSH"
-
-    @contextmanager
-    def ssh_connection(self, device):
-        """
-        Context manager dla bezpiecznego zarządzania połączeniem SSH.
-        Automatycznie zamyka połączenie nawet przy błędach.
-        
-        Użycie:
-            with self.ssh_connection(device) as (ssh, sftp):
-                # ... operacje ...
-        """
-        ssh = None
-        sftp = None
-        
-        try:
-            self.log(f"  Otwieranie połączenia SSH do {device.ip}...")
-
-            ssh = self.create_ssh_client(device.ip, device.password)
-            
-            sftp = ssh.open_sftp()
-            
-            self.log(f"  Połączono z {device.ip}")
-            
-            yield ssh, sftp
-            
-        except Exception as e:
-            self.log(f"  Błąd połączenia SSH: {str(e)}")
-            raise
-            
-        finally:
-            # Zamknij SFTP
-            if sftp:
-                try:
-                    sftp.close()
-                    time.sleep(1)
-                    self.log(f"  Zamknięto SFTP")
-                    time.sleep(0.3)
-                except Exception as e:
-                    self.log(f"  UWAGA: Błąd zamykania SFTP: {str(e)}")
-            
-            # Zamknij SSH
-            if ssh:
-                try:
-                    transport = ssh.get_transport()
-                    if transport and transport.is_active():
-                        transport.close()
-                    ssh.close()
-                    time.sleep(1)
-                    self.log(f"  Zamknięto SSH")
-                    time.sleep(1) 
-                except Exception as e:
-                    self.log(f"  UWAGA: Błąd zamykania SSH: {str(e)}")
-
-    def wait_for_ssh_back(self, device):
-        """Po restarcie czeka aktywnie na ponowną dostępność SSH sterownika."""
-        max_attempts = max(1, int(self.post_reboot_timeout / self.post_reboot_poll))
-        self.log(
-            f"  Oczekiwanie po restarcie: start po {self.post_reboot_wait}s, "
-            f"timeout globalny {self.post_reboot_timeout}s, "
-            f"max prób reconnect: ~{max_attempts}"
-        )
-        time.sleep(self.post_reboot_wait)
-
-        start_time = time.time()
-        attempt = 0
-
-        while (time.time() - start_time) < self.post_reboot_timeout:
-            attempt += 1
-            test_ssh = None
-            try:
-                test_ssh = paramiko.SSHClient()
-                test_ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                test_ssh.connect(
-                    device.ip,
-                    username=PLC_USER,
-                    password=device.password,
-                    timeout=10,
-                    banner_timeout=10,
-                    auth_timeout=10,
-                    allow_agent=False,
-                    look_for_keys=False
-                )
-
-                transport = test_ssh.get_transport()
-                if transport:
-                    transport.set_keepalive(self.ssh_keepalive)
-
-                self.log(f"  Sterownik {device.ip} wrócił online (próba {attempt})")
-                return True
-            except (paramiko.AuthenticationException, ConnectionRefusedError, socket.timeout, TimeoutError, OSError) as e:
-                elapsed = int(time.time() - start_time)
-                reason = self.diagnose_ssh_error(device.ip, e, timeout=10)
-                self.log(
-                    f"  Reconnect próba {attempt}/{max_attempts} nieudana "
-                    f"({elapsed}s/{self.post_reboot_timeout}s): {reason}"
-                )
-                time.sleep(self.post_reboot_poll)
-            except Exception as e:
-                elapsed = int(time.time() - start_time)
-                self.log(
-                    f"  Reconnect próba {attempt}/{max_attempts} nieudana "
-                    f"({elapsed}s/{self.post_reboot_timeout}s): {str(e)}"
-                )
-                time.sleep(self.post_reboot_poll)
-            finally:
-                if test_ssh:
-                    try:
-                        test_ssh.close()
-                    except:
-                        pass
-
-        raise Exception(
-            f"Sterownik nie wrócił online po {self.post_reboot_timeout}s "
-            f"od pierwszej próby połączenia (wykonano {attempt} prób reconnect)"
-        )
-
-    def is_transient_error(self, error):
-        """Błędy tymczasowe - można ponawiać."""
-        error_msg = str(error).lower()
-        transient_keywords = [
-            "timeout", "timed out", "eof", "socket", "connection reset",
-            "connection refused", "network", "host unreachable", "banner"
-        ]
-        return any(keyword in error_msg for keyword in transient_keywords)
-
-    def is_fatal_error(self, error):
-        """Błędy krytyczne - bez retry."""
-        return isinstance(error, FatalUpdateError)
-        
-
-
-    def execute_firmware_update(self, device):
-        ssh = None
-        channel = None
-        try:
-            device.status = "Aktualizacja firmware..."
-            self.after(0, lambda d=device: self.update_device_row(d))
-            self.log(f"  Nowe połączenie SSH dla firmware update...")
-
-            ssh = self.create_ssh_client(device.ip, device.password)
-            
-            update_command = f"sudo update-axcf{device.plc_model}"
-            self.log(f"  Uruchamiam: {update_command}")
-            self.log(f"  Czekam na zakończenie procesu update (może zająć kilka minut)...")
-            
-            channel = ssh.get_transport().open_session()
-            channel.get_pty()
-            channel.exec_command(update_command)
-            channel.send(device.password + "\n")
-            
-            output = ""
-            start_time = time.time()
-            timeout = self.update_command_timeout
-            
-            while True:
-                if time.time() - start_time > timeout:
-                    self.log(f"  UWAGA: Timeout - przekroczono {timeout}s oczekiwania")
-                    break
-                
-                if channel.recv_ready():
-                    chunk = channel.recv(1024).decode(errors="ignore")
-                    output += chunk
-                    for line in chunk.split('\n'):
-                        if line.strip() and any(keyword in line.lower() for keyword in 
-                            ['installing', 'updating', 'done', 'success', 'error', 'failed', 'reboot']):
-                            self.log(f"    {line.strip()}")
-                
-                if channel.exit_status_ready():
-                    exit_code = channel.recv_exit_status()
-                    self.log(f"  Proces zakończony z kodem: {exit_code}")
-                    
-                    if exit_code != 0:
-                            self.log(f"  UWAGA: Exit code: {exit_code} (może być normalne przy reboot)")
-                    break
-                
-                time.sleep(0.5)
-            
-            if channel.recv_stderr_ready():
-                errors = channel.recv_stderr(4096).decode(errors="ignore")
-                if errors.strip():
-                    self.log(f"  UWAGA: Stderr: {errors[:200]}")
-            
-            self.log("  Aktualizacja firmware zakończona. Sterownik restartuje się")
-            device.status = "Oczekiwanie na restart..."
-            self.after(0, lambda d=device: self.update_device_row(d))
-            self.wait_for_ssh_back(device)
-            
-        except Exception as e:
-            raise e
-        finally:
-            if channel:
-                try:
-                    channel.close()
-                    self.log("  Zamknięto kanał SSH")
-                except:
-                    pass
-            
-            if ssh:
-                try:
-                    transport = ssh.get_transport()
-                    if transport and transport.is_active():
-                        transport.close()
-                    ssh.close()
-                    time.sleep(1)
-                    self.log("  Zamknięto SSH")
-                except:
-                    pass
-            
-            time.sleep(3)
-
-    def execute_reboot(self, device):
-        ssh = None
-        try:
-            device.status = "Oczekiwanie na restart..."
-            self.after(0, lambda d=device: self.update_device_row(d))
-            self.log(f"  Nowe połączenie SSH dla reboot...")
-
-            ssh = self.create_ssh_client(device.ip, device.password)
-            
-            self.log("  Uruchamiam 'sudo reboot'...")
-            
-            stdin, stdout, stderr = ssh.exec_command("sudo reboot", get_pty=True)
-            stdin.write(device.password + "\n")
-            stdin.flush()
-            time.sleep(2)
-            
-        except Exception as e:
-            # Ignoruj błędy zamknięcia - reboot ich powoduje
-            if "Socket is closed" in str(e) or "Timeout" in str(e) or "EOF" in str(e):
-                self.log("  Reboot zainicjowany (połączenie przerwane - oczekiwane)")
-            else:
-                raise e
-        finally:
-            if ssh:
-                try:
-                    ssh.close()
-                    time.sleep(1)
-                    self.log("  Zamknięto SSH po reboot")
-                except:
-                    pass
-            time.sleep(1)
-
-        self.wait_for_ssh_back(device)
-
-
-
-
-    def upload_callback(self, filename, transferred, total, device=None):
-        """
-        Callback wywoływany podczas uploadu pliku przez SFTP.
-        Aktualizuje progress bar i status.
-        """
-        if total > 0:
-            percent = (transferred / total) * 100
-            
-            # Aktualizuj progress bar
-            self.after(0, lambda p=percent: self.upload_progress.config(value=p))
-            
-            # Oblicz rozmiary w MB
-            transferred_mb = transferred / 1024 / 1024
-            total_mb = total / 1024 / 1024
-            
-            # Formatuj status
-            status_text = f"{filename}: {transferred_mb:.1f} MB / {total_mb:.1f} MB ({percent:.1f}%)"
-
-            if device:
-                device.status = f"Wysyłanie pliku ({int(percent)}%)..."
-                self.after(0, lambda d=device: self.update_device_row(d))
-            
-            # Aktualizuj GUI (thread-safe)
-            self.after(0, lambda: self.upload_status_label.config(
-                text=status_text, 
-                fg="#3B82F6"
-            ))
-            
-            # Log co 10%
-            progress_threshold = int(percent // 10) * 10
-            last_logged = self.upload_log_progress.get(filename, 0)
-
-            if progress_threshold >= 10 and progress_threshold > last_logged:
-                self.upload_log_progress[filename] = progress_threshold
-                self.log(f"  Upload: {progress_threshold}% ({transferred_mb:.1f}/{total_mb:.1f} MB)")
-
-    def upload_file_with_resume(self, sftp, local_path, remote_path, device=None):
-        """Upload z obsługą .partial, wznowieniem i timeoutami postępu."""
-        filename = os.path.basename(local_path)
-        remote_partial_path = f"{remote_path}.partial"
-        local_size = os.path.getsize(local_path)
-
-        if local_size <= 0:
-            raise Exception(f"Nieprawidłowy rozmiar pliku: {filename}")
-
-        resume_offset = 0
-        try:
-            resume_offset = sftp.stat(remote_partial_path).st_size
-        except FileNotFoundError:
-            resume_offset = 0
-        except IOError:
-            resume_offset = 0
-
-        if resume_offset > local_size:
-            self.log(f"  UWAGA: Plik .partial większy niż lokalny. Usuwam i zaczynam od zera: {remote_partial_path}")
-            sftp.remove(remote_partial_path)
-            resume_offset = 0
-
-        if resume_offset > 0:
-            self.log(
-                f"  Wznawianie transferu od {resume_offset/1024/1024:.1f} MB "
-                f"z {local_size/1024/1024:.1f} MB"
-            )
-        else:
-            self.log(f"  Start transferu: {filename} ({local_size/1024/1024:.1f} MB)")
-
-        transfer_start = time.time()
-        transferred = resume_offset
-        chunk_size = 64 * 1024
-
-        channel = sftp.get_channel()
-        channel.settimeout(self.idle_timeout)
-
-        mode = 'ab' if resume_offset > 0 else 'wb'
-        try:
-            with open(local_path, 'rb') as local_file:
-                local_file.seek(resume_offset)
-                with sftp.open(remote_partial_path, mode) as remote_file:
-                    while transferred < local_size:
-                        elapsed = time.time() - transfer_start
-                        if elapsed > self.upload_timeout:
-                            raise TimeoutError(
-                                f"Timeout uploadu: przekroczono {self.upload_timeout}s "
-                                f"dla pliku {filename}"
-                            )
-
-                        data = local_file.read(chunk_size)
-                        if not data:
-                            break
-
-                        try:
-                            remote_file.write(data)
-                            remote_file.flush()
-                        except socket.timeout as e:
-                            raise TimeoutError(
-                                f"Brak postępu transferu przez {self.idle_timeout}s "
-                                f"(idle timeout)"
-                            ) from e
-
-                        transferred += len(data)
-                        self.upload_callback(filename, transferred, local_size, device=device)
-        finally:
-            channel.settimeout(None)
-
-        remote_partial_size = sftp.stat(remote_partial_path).st_size
-        if remote_partial_size != local_size:
-            raise Exception(
-                f"Transfer niepełny! Lokalny: {local_size}, Zdalny .partial: {remote_partial_size}"
-            )
-
-        try:
-            sftp.remove(remote_path)
-        except FileNotFoundError:
-            pass
-        except IOError:
-            pass
-
-        sftp.rename(remote_partial_path, remote_path)
-
-        remote_size = sftp.stat(remote_path).st_size
-        if remote_size != local_size:
-            raise Exception(f"Weryfikacja po rename nieudana! Lokalny: {local_size}, Zdalny: {remote_size}")
-
-        self.log(f"  Transfer ukończony: {filename}")
-        return remote_size
-
-    def reset_upload_progress(self):
-        """Resetuje progress bar po zakończeniu uploadu."""
-        self.upload_log_progress.clear()
-        self.after(0, lambda: self.upload_progress.config(value=0))
-        self.after(0, lambda: self.upload_status_label.config(
-            text="Oczekiwanie na transfer...",
-            fg="#64748B"
-        ))
-
-
-
-    def process_batch(self, operation):
-        """
-        Główna metoda przetwarzania wsadowego.
-        operation: "read", "system_services", "timezone", "firmware", "all"
-        """
-        self.processing = True
-        self.after(0, self.update_action_buttons_state)
-        
-        total = len(self.devices)
-        success_count = 0
-        failed_count = 0
-        failed_devices = []
-        max_workers = max(1, min(5, int(self.parallel_workers)))
-
-        def process_single_device(idx, device):
-            if not self.processing:
-                return "not_processed", "Operacja zatrzymana"
-
-            self.log(f"\n{'='*60}")
-            self.log(f"[{idx}/{total}] Przetwarzanie: {device.name} ({device.ip})")
-            self.log(f"{'='*60}")
-
-            device.status = "W trakcie"
-            device.error_log = ""
-            self.after(0, lambda d=device: self.update_device_row(d))
-
-            attempt = 0
-            success = False
-            last_error = ""
-
-            while attempt < self.retry_attempts and not success:
-                if not self.processing:
-                    return "not_processed", "Operacja zatrzymana"
-
-                attempt += 1
-
-                if attempt > 1:
-                    self.log(
-                        f"Retry próba {attempt}/{self.retry_attempts} "
-                        f"(pozostało {self.retry_attempts - attempt + 1} prób)"
-                    )
-                    time.sleep(self.retry_delay)
-
-                try:
-                    if operation == "read":
-                        self.read_single_device(device)
-                        success = True
-
-                    elif operation == "system_services":
-                        self.update_system_services_only(device)
-                        success = True
-
-                    elif operation == "timezone":
-                        self.update_timezone_only(device)
-                        success = True
-
-                    elif operation == "firmware":
-                        self.update_firmware_only_operation(device)
-                        success = True
-
-                    elif operation == "all":
-                        self.update_all_operations(device)
-                        success = True
-
-                    if success:
-                        device.status = "OK"
-                        self.log(f"[{device.name}] Operacja zakończona sukcesem")
-                        return "success", ""
-
-                except Exception as e:
-                    error_msg = str(e)
-                    last_error = error_msg
-                    device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {error_msg}"
-
-                    if self.is_fatal_error(e):
-                        device.status = "Błąd"
-                        self.log(f"[{device.name}] Błąd krytyczny (bez retry): {error_msg}")
-                        return "failed", error_msg
-
-                    if self.is_transient_error(e) and attempt < self.retry_attempts:
-                        self.log(
-                            f"Błąd tymczasowy (próba {attempt}/{self.retry_attempts}): {error_msg}"
-                        )
-                        self.log(
-                            f"  Kolejny retry za {self.retry_delay}s "
-                            f"(pozostało {self.retry_attempts - attempt} prób)"
-                        )
-                    else:
-                        device.status = "Błąd"
-                        if self.is_transient_error(e):
-                            self.log(f"[{device.name}] Operacja nieudana po {self.retry_attempts} próbach: {error_msg}")
-                        else:
-                            self.log(f"[{device.name}] Błąd nienaprawialny (bez retry): {error_msg}")
-                        return "failed", error_msg
-                finally:
-                    self.after(0, lambda d=device: self.update_device_row(d))
-
-            if not success:
-                device.status = "Błąd"
-                return "failed", last_error or "Nieznany błąd"
-
-            return "success", ""
-        
-        self.log(f"{'='*60}")
-        self.log(f"START OPERACJI WSADOWEJ: {operation.upper()}")
-        self.log(f"Liczba sterowników: {total}")
-        self.log(f"Tryb równoległy: {max_workers} worker(ów)")
-        self.log(f"{'='*60}")
-
-        self.after(0, lambda: self.batch_progress.config(value=0))
-        self.after(0, lambda: self.batch_progress_label.config(
-            text=f"Start operacji {operation.upper()} (0/{total})",
-            fg="#3B82F6"
-        ))
-        
-        completed = 0
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {}
-
-            for idx, device in enumerate(self.devices, 1):
-                if not self.processing:
-                    self.log("Operacja zatrzymana przez użytkownika")
-                    break
-
-                if idx > 1 and self.pause_between_devices > 0:
-                    self.log(f"\nCzekam {self.pause_between_devices} sekund przed kolejnym sterownikiem...")
-                    time.sleep(self.pause_between_devices)
-
-                future = executor.submit(process_single_device, idx, device)
-                futures[future] = device
-
-            for future in as_completed(futures):
-                device = futures[future]
-                try:
-                    result_status, error_msg = future.result()
-                except Exception as e:
-                    result_status, error_msg = "failed", str(e)
-
-                if result_status == "success":
-                    success_count += 1
-                elif result_status == "failed":
-                    failed_count += 1
-                    failed_devices.append((device.name, error_msg))
-
-                completed += 1
-                progress_after = (completed / total) * 100 if total else 0
-                self.after(0, lambda p=progress_after: self.batch_progress.config(value=p))
-                self.after(0, lambda c=completed, t=total: self.batch_progress_label.config(
-                    text=f"Postęp: {c}/{t} sterowników",
-                    fg="#3B82F6"
-                ))
-
-        processed_count = success_count + failed_count
-        not_processed_count = max(0, total - processed_count)
-
-        recommendations = []
-        if failed_devices:
-            failed_text = "\n".join(msg for _, msg in failed_devices).lower()
-            if "niezgodność" in failed_text or "kompatybil" in failed_text:
-                recommendations.append("- Sprawdź zgodność modelu firmware (axcf2152/axcf3152).")
-            if any(word in failed_text for word in ["timeout", "timed out", "connection", "socket", "eof"]):
-                recommendations.append("- Sprawdź łączność sieciową i dostęp SSH do sterowników.")
-            if "nie istnieje" in failed_text:
-                recommendations.append("- Zweryfikuj obecność wymaganych plików lokalnych (firmware/System Services).")
-        
-        # Podsumowanie
-        self.log(f"\n{'='*60}")
-        self.log(f"PODSUMOWANIE OPERACJI: {operation.upper()}")
-        self.log(f"{'='*60}")
-        self.log(f"Sukces: {success_count}/{total}")
-        self.log(f"Błędy: {failed_count}/{total}")
-        self.log(f"Nieprzetworzone: {not_processed_count}/{total}")
-        if failed_devices:
-            self.log("Lista nieudanych sterowników:")
-            for name, err in failed_devices[:10]:
-                self.log(f"   - {name}: {err[:120]}")
-            if len(failed_devices) > 10:
-                self.log(f"   ... i {len(failed_devices) - 10} więcej")
-
-        if recommendations:
-            self.log("Rekomendacje:")
-            for recommendation in recommendations:
-                self.log(f"   {recommendation}")
-        self.log(f"{'='*60}\n")
-        
-        self.processing = False
-        self.after(0, self.update_action_buttons_state)
-        self.after(0, lambda: self.status_bar.config(text="Gotowy"))
-        self.after(0, lambda: self.batch_progress_label.config(
-            text=f"Zakończono: sukces {success_count}, błędy {failed_count}, nieprzetworzone {not_processed_count}",
-            fg="#10B981" if failed_count == 0 else "#EF4444"
-        ))
-        
-        # Pokaż podsumowanie
-        self.after(0, lambda: messagebox.showinfo(
-            "Operacja zakończona",
-            f"Operacja: {operation.upper()}\n\n"
-            f"Sukces: {success_count}/{total}\n"
-            f"Błędy: {failed_count}/{total}\n"
-            f"Nieprzetworzone: {not_processed_count}/{total}\n\n"
-            f"Sprawdź logi i zakładkę tabeli, aby uzyskać szczegóły."
-        ))
-
-
-    def read_single_device(self, device):
-        """
-        Odczytuje dane z pojedynczego sterownika.
-        """
-        try:
-            device.status = "Łączenie SSH..."
-            self.after(0, lambda d=device: self.update_device_row(d))
-            
-            with self.ssh_connection(device) as (ssh, sftp):
-                
-                # 1. Wykryj model PLC
-                device.status = "Wykrywanie modelu..."
-                self.after(0, lambda d=device: self.update_device_row(d))
-                device.plc_model = self.detect_plc_model(ssh)
-                
-                # 2. Wersja Firmware
-                device.status = "Odczyt firmware..."
-                self.after(0, lambda d=device: self.update_device_row(d))
-                stdin, stdout, stderr = ssh.exec_command("grep Arpversion /etc/plcnext/arpversion")
-                fw_output = stdout.read().decode().strip()
-                
-                self.log(f"  Surowy output wersji firmware: '{fw_output}'")
-                
-                version_string = "?"
-                if fw_output:
-                    fw_output = fw_output.replace('Arpversion', '').strip()
-                    
-                    if ":" in fw_output:
-                        parts = fw_output.split(':', 1)
-                        version_string = parts[1].strip() if len(parts) > 1 else "?"
-                    elif "=" in fw_output:
-                        version_string = fw_output.split("=")[-1].strip()
-                    else:
-                        version_string = fw_output.strip()
-                    
-                    self.log(f"  Sparsowana wersja: '{version_string}'")
-                
-                if version_string and version_string != "?" and version_string[0].isdigit():
-                    device.firmware_version = version_string
-                else:
-                    device.firmware_version = "?"
-                    self.log(f"  UWAGA: Nie można odczytać poprawnej wersji firmware!")
-                
-                # 3. Strefa czasowa
-                device.status = "Sprawdzanie strefy czasowej..."
-                self.after(0, lambda d=device: self.update_device_row(d))
-                stdin, stdout, stderr = ssh.exec_command("cat /etc/timezone")
-                device.timezone = stdout.read().decode(errors="ignore").strip()
-                
-                # 4. Sprawdzenie synchronizacji czasu
-                device.status = "Sprawdzanie synchronizacji czasu..."
-                self.after(0, lambda d=device: self.update_device_row(d))
-                plc_time_obj, plc_time_str, is_synced = self.check_time_sync(ssh)
-                device.plc_time = plc_time_str
-                device.time_sync_error = not is_synced
-                
-                # 5. System Services - porównanie zawartości pliku
-                device.status = "Sprawdzanie System Services..."
-                self.after(0, lambda d=device: self.update_device_row(d))
-                try:
-                    remote_path = "/opt/plcnext/config/System/Scm/Default.scm.config"
-                    
-                    local_file = resource_path(SYSTEM_SERVICES_FILE)
-                    if os.path.exists(local_file):
-                        # Odczytaj lokalny plik
-                        with open(local_file, 'rb') as f:
-                            local_content = f.read()
-                        
-                        # Pobierz zawartość zdalnego pliku
-                        with sftp.open(remote_path, 'r') as remote_file:
-                            remote_content = remote_file.read()
-                        
-                        # Porównaj zawartość (jako bytes)
-                        if local_content == remote_content:
-                            device.system_services_ok = "OK"
-                            self.log(f"  System Services - zawartość zgodna")
-                        else:
-                            device.system_services_ok = "Niezgodność"
-                            self.log(f"  UWAGA: System Services - zawartość różni się od wzorcowej")
-                    else:
-                        device.system_services_ok = "Brak lokalnego"
-                        self.log(f"  UWAGA: Brak lokalnego pliku wzorcowego: {SYSTEM_SERVICES_FILE}")
-                        
-                except FileNotFoundError:
-                    device.system_services_ok = "Brak"
-                    self.log(f"  UWAGA: Plik System Services nie istnieje na sterowniku")
-                except Exception as e:
-                    device.system_services_ok = "Błąd"
-                    self.log(f"  UWAGA: Błąd sprawdzania System Services: {str(e)}")
-                
-                # 6. Znacznik czasowy odczytu
-                device.last_check = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                
-                # Logowanie podsumowania
-                self.log(f"  Model: AXC F {device.plc_model}")
-                self.log(f"  Firmware: {device.firmware_version}")
-                self.log(f"  Czas PLC: {device.plc_time}")
-                self.log(f"  Strefa czasowa: {device.timezone}")
-                self.log(f"  System Services: {device.system_services_ok}")
-                
-            # Context manager automatycznie zamknie SSH/SFTP tutaj
-            
-        except Exception as e:
-            raise e
-
-
-
-
-    def detect_plc_model(self, ssh):
-        """
-        Wykrywa model sterownika PLC za pomocą komendy 'rauc status'.
-        Zwraca numer modelu (np. "2152", "3152", "1152") lub None w przypadku błędu.
-        """
-        try:
-            stdin, stdout, stderr = ssh.exec_command("rauc status")
-            rauc_output = stdout.read().decode(errors="ignore").strip()
-            
-            # Szukamy linii "Compatible: axcfXXXX_v1"
-            for line in rauc_output.split('\n'):
-                if 'Compatible:' in line:
-                    # Przykład: "Compatible: axcf2152_v1"
-                    parts = line.split(':')
-                    if len(parts) > 1:
-                        compatible = parts[1].strip()
-                        # Wyciągamy numer modelu (2152, 3152, 1152)
-                        if 'axcf' in compatible:
-                            model = compatible.replace('axcf', '').split('_')[0]
-                            self.log(f"  Wykryty model PLC: AXC F {model}")
-                            return model
-            
-            self.log(f"  UWAGA: Nie można wykryć modelu z 'rauc status'")
-            return None
-            
-        except Exception as e:
-            self.log(f"  UWAGA: Błąd wykrywania modelu: {str(e)}")
-            return None
-
-    def extract_model_from_firmware(self, firmware_path):
-        """
-        Wyciąga numer modelu z nazwy pliku firmware.
-        Przykład: 'axcf2152-2024.0.8_LTS-24.0.8.183.raucb' -> '2152'
-        """
-        filename = os.path.basename(firmware_path)
-        if filename.startswith('axcf'):
-            model = filename.split('-')[0].replace('axcf', '')
-            return model
-        return None
-
-    def validate_firmware_compatibility(self, device, firmware_path):
-        """
-        Sprawdza czy firmware jest kompatybilny z modelem sterownika.
-        Zwraca (True, message) jeśli kompatybilny, (False, message) jeśli nie.
-        """
-        fw_model = self.extract_model_from_firmware(firmware_path)
-        
-        if not fw_model:
-            return False, "Nie można odczytać modelu z nazwy firmware"
-        
-        if not device.plc_model:
-            return False, "Model sterownika nie został wykryty"
-        
-        if fw_model != device.plc_model:
-            return False, f"NIEZGODNOŚĆ: Firmware dla {fw_model}, sterownik to {device.plc_model}"
-        
-        return True, f"Firmware kompatybilny z modelem {device.plc_model}"
-
-    def check_time_sync(self, ssh):
-        """
-        Sprawdza czy czas sterownika jest zsynchronizowany z czasem systemowym.
-        Zwraca (datetime_object, time_string, is_synced).
-        """
-        try:
-            # Pobierz czas z sterownika z timeoutem
-            stdin, stdout, stderr = ssh.exec_command("date '+%Y-%m-%d %H:%M:%S'", timeout=10)
-            plc_time_str = stdout.read().decode(errors="ignore").strip()
-            
-            if not plc_time_str:
-                self.log(f"  UWAGA: Nie można odczytać czasu ze sterownika")
-                return None, "", False
-            
-            # Parsuj czas sterownika
-            plc_time = datetime.strptime(plc_time_str, "%Y-%m-%d %H:%M:%S")
-            
-            # Pobierz aktualny czas lokalny (warszawski)
-            local_tz = pytz.timezone(TIMEZONE)
-            local_time = datetime.now(local_tz).replace(tzinfo=None)
-            
-            # Oblicz różnicę
-            time_diff = abs((local_time - plc_time).total_seconds())
-            
-            # Tolerancja 60 sekund
-            is_synced = time_diff < 60
-            
-            if not is_synced:
-                self.log(f"  UWAGA: DESYNCHRONIZACJA CZASU: różnica {time_diff:.0f}s")
-                self.log(f"    Sterownik: {plc_time_str}")
-                self.log(f"    Lokalny: {local_time.strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            return plc_time, plc_time_str, is_synced
-            
-        except Exception as e:
-            self.log(f"  UWAGA: Błąd sprawdzania czasu: {str(e)}")
-            return None, "", False
-
-    def compare_firmware_versions(self, current_version, target_version):
-        """
-        Porównuje wersje firmware ze szczegółowym logowaniem.
-        Zwraca True jeśli wersje są IDENTYCZNE (nie trzeba aktualizować).
-        """
-        target_version_number = self.get_target_fw_version(target_version)
-        
-        self.log(f"  Porównanie wersji firmware:")
-        self.log(f"     Aktualna wersja na sterowniku: '{current_version}'")
-        self.log(f"     Wersja z pliku firmware: '{target_version_number}'")
-        
-        if not current_version or current_version == "?":
-            self.log(f"     UWAGA: Nie można odczytać aktualnej wersji - wymuszam aktualizację")
-            return False 
-        
-        if not target_version_number:
-            self.log(f"     UWAGA: Nie można odczytać wersji z pliku - wymuszam aktualizację")
-            return False
-        
-        # Normalizacja: usuń białe znaki i porównaj
-        current_clean = current_version.strip()
-        target_clean = target_version_number.strip()
-        
-        is_same = current_clean == target_clean
-        
-        if is_same:
-            self.log(f"     Wersje są IDENTYCZNE - aktualizacja NIE jest potrzebna")
-        else:
-            self.log(f"     UWAGA: Wersje są RÓŻNE - aktualizacja jest potrzebna")
-            self.log(f"        Różnica: '{current_clean}' != '{target_clean}'")
-        
-        return is_same
-    
-    def get_target_fw_version(self, firmware_path):
-        """Wyodrębnia numer wersji z nazwy pliku firmware."""
-        # Przykład: 'axcf2152-2024.0.8_LTS-24.0.8.183.raucb' -> '24.0.8.183'
-        filename = os.path.basename(firmware_path)
-        
-        # Usuń rozszerzenie .raucb
-        if filename.endswith('.raucb'):
-            filename = filename[:-6]
-        
-        # Podziel po myślniku
-        parts = filename.split('-')
-        
-        # Ostatnia część to wersja (np. '24.0.8.183')
-        if len(parts) >= 3:
-            version = parts[-1]
-            self.log(f"  Wykryta wersja firmware z pliku: {version}")
-            return version
-        
-        self.log(f"  UWAGA: Nie można odczytać wersji z nazwy pliku: {filename}")
-        return ""
-
     def create_widgets(self):
         """Tworzy interfejs użytkownika w PySide6."""
         central = QWidget(self)
@@ -1385,6 +442,8 @@ class BatchProcessorApp(QMainWindow):
         excel_layout.addWidget(self.excel_path_label, 1)
         self.load_excel_btn = self.create_action_button(excel_group, "Wczytaj listę", self.load_excel, "primary")
         excel_layout.addWidget(self.load_excel_btn)
+        self.discover_btn = self.create_action_button(excel_group, "Wykryj w sieci", self.discover_network, "info")
+        excel_layout.addWidget(self.discover_btn)
         batch_layout.addWidget(excel_group)
 
         firmware_group = QGroupBox("Plik Firmware (opcjonalnie dla aktualizacji)")
@@ -1393,6 +452,11 @@ class BatchProcessorApp(QMainWindow):
         self.firmware_path_label = QLineEdit()
         self.firmware_path_label.setReadOnly(True)
         firmware_layout.addWidget(self.firmware_path_label, 1)
+        firmware_layout.addWidget(self.create_action_button(firmware_group, "Katalog firmware (wiele modeli)", self.select_firmware_catalog, "neutral"))
+        self.firmware_catalog_label = QLineEdit()
+        self.firmware_catalog_label.setReadOnly(True)
+        firmware_layout.addWidget(self.firmware_catalog_label, 1)
+        firmware_layout.addWidget(self.create_action_button(firmware_group, "Wyczyść katalog", self.clear_firmware_catalog_selection, "neutral"))
         batch_layout.addWidget(firmware_group)
 
         read_group = QGroupBox("Odczyt danych")
@@ -1411,6 +475,12 @@ class BatchProcessorApp(QMainWindow):
         update_grid.addWidget(self.batch_tz_btn, 0, 1)
         update_grid.addWidget(self.batch_fw_btn, 1, 0)
         update_grid.addWidget(self.batch_all_btn, 1, 1)
+        self.batch_prestage_btn = self.create_action_button(update_group, "Pre-stage Firmware (w tle)", self.batch_prestage_firmware, "info")
+        self.batch_activate_btn = self.create_action_button(update_group, "Aktywuj pre-stage (update-axcf)", self.batch_activate_firmware, "danger")
+        update_grid.addWidget(self.batch_prestage_btn, 2, 0)
+        update_grid.addWidget(self.batch_activate_btn, 2, 1)
+        self.batch_switch_slot_btn = self.create_action_button(update_group, "Przełącz slot RAUC (rollback)", self.batch_switch_slot, "warning")
+        update_grid.addWidget(self.batch_switch_slot_btn, 3, 0, 1, 2)
         batch_layout.addWidget(update_group)
 
         transfer_group = QGroupBox("Status transferu plików")
@@ -1429,6 +499,8 @@ class BatchProcessorApp(QMainWindow):
         self.batch_progress_label = CompatLabel("Oczekiwanie na start...")
         batch_progress_layout.addWidget(self.batch_progress)
         batch_progress_layout.addWidget(self.batch_progress_label)
+        self.install_eta_label = CompatLabel("ETA instalacji: --")
+        batch_progress_layout.addWidget(self.install_eta_label)
         batch_layout.addWidget(batch_progress_group)
 
         controls_layout = QHBoxLayout()
@@ -1445,10 +517,10 @@ class BatchProcessorApp(QMainWindow):
         table_group = QGroupBox("Lista sterowników")
         table_layout = QVBoxLayout(table_group)
         self.device_tree = CompatTreeWidget()
-        self.device_tree.setColumnCount(10)
+        self.device_tree.setColumnCount(12)
         self.device_tree.setHeaderLabels([
-            "Nazwa", "IP", "Model PLC", "Wersja Firmware", "Czas sterownika",
-            "Strefa czasowa", "System Services", "Ostatni odczyt", "Status", "Issues"
+            "Nazwa", "IP", "Model PLC", "Wersja Firmware", "Sloty RAUC", "Czas sterownika",
+            "Strefa czasowa", "System Services", "Ostatni odczyt", "Status", "Instalacja", "Issues"
         ])
         self.device_tree.header().setSectionResizeMode(QHeaderView.Interactive)
         self.device_tree.tag_configure('success', background='#D1FAE5', foreground='#065F46')
@@ -1465,13 +537,20 @@ class BatchProcessorApp(QMainWindow):
         log_layout.addWidget(self.log_text)
         log_layout.addWidget(self.create_action_button(log_tab, "Wyczysc logi", self.clear_logs, "neutral"))
 
+        # Konfiguracja i ręczna obsługa budowane przy pierwszym otwarciu zakładki
         config_tab = QWidget()
         notebook.addTab(config_tab, "Konfiguracja")
-        self.create_config_interface(config_tab)
-
         manual_tab = QWidget()
         notebook.addTab(manual_tab, "Reczna obsluga")
-        self.create_manual_interface(manual_tab)
+        fleet_tab = QWidget()
+        notebook.addTab(fleet_tab, "Historia floty")
+        self.lazy_tabs = {
+            config_tab: self.create_config_interface,
+            manual_tab: self.create_manual_interface,
+            fleet_tab: self.create_fleet_history_interface,
+        }
+        self.notebook = notebook
+        notebook.currentChanged.connect(lambda index: self.build_lazy_tab(notebook.widget(index)))
 
         self.status_bar = CompatLabel("Gotowy")
         self.status_bar.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
@@ -1479,6 +558,13 @@ class BatchProcessorApp(QMainWindow):
 
         self.excel_path.trace_add("write", lambda *_: self.excel_path_label.setText(self.excel_path.get()))
         self.firmware_path.trace_add("write", lambda *_: self.firmware_path_label.setText(self.firmware_path.get()))
+        self.firmware_catalog_dir.trace_add("write", lambda *_: self.firmware_catalog_label.setText(self.firmware_catalog_dir.get()))
+
+    def build_lazy_tab(self, tab):
+        """Buduje zawartość zakładki przy pierwszym otwarciu."""
+        builder = self.lazy_tabs.pop(tab, None)
+        if builder:
+            builder(tab)
 
     def _create_spin_row(self, layout, row, label_text, int_var, minimum, maximum, step=1, suffix=""):
         label = QLabel(label_text)
@@ -1511,10 +597,17 @@ class BatchProcessorApp(QMainWindow):
             self.upload_timeout_var,
             self.update_command_timeout_var,
             self.idle_timeout_var,
+            self.upload_safety_factor_var,
+            self.stall_window_var,
+            self.stall_min_rate_var,
             self.post_reboot_wait_var,
             self.post_reboot_timeout_var,
             self.post_reboot_poll_var,
             self.parallel_workers_var,
+            self.shard_processes_var,
+            self.detached_poll_var,
+            self.http_install_port_var,
+            self.prestage_rate_limit_var,
         ]
         for var in config_vars:
             spin = getattr(var, "_spin", None)
@@ -1533,10 +626,24 @@ class BatchProcessorApp(QMainWindow):
         self.upload_timeout_var = IntVar(self.upload_timeout)
         self.update_command_timeout_var = IntVar(self.update_command_timeout)
         self.idle_timeout_var = IntVar(self.idle_timeout)
+        self.upload_safety_factor_var = IntVar(self.upload_safety_factor)
+        self.stall_window_var = IntVar(self.stall_window)
+        self.stall_min_rate_var = IntVar(self.stall_min_rate)
         self.post_reboot_wait_var = IntVar(self.post_reboot_wait)
         self.post_reboot_timeout_var = IntVar(self.post_reboot_timeout)
         self.post_reboot_poll_var = IntVar(self.post_reboot_poll)
         self.parallel_workers_var = IntVar(self.parallel_workers)
+        self.shard_processes_var = IntVar(self.shard_processes)
+        self.detached_poll_var = IntVar(self.detached_poll_interval)
+        self.detached_update_var = BooleanVar(self.detached_update)
+        self.http_install_port_var = IntVar(self.http_install_port)
+        self.http_install_var = BooleanVar(self.http_install)
+        self.prestage_rate_limit_var = IntVar(self.prestage_rate_limit)
+        self.cleanup_stale_bundles_var = BooleanVar(self.cleanup_stale_bundles)
+        self.skip_unreachable_var = BooleanVar(self.skip_unreachable)
+        self.predial_ahead_var = IntVar(self.predial_ahead)
+        self.async_read_var = BooleanVar(self.async_read)
+        self.async_read_concurrency_var = IntVar(self.async_read_concurrency)
 
         sections = [
             ("SSH Settings", [
@@ -1549,9 +656,13 @@ class BatchProcessorApp(QMainWindow):
             ]),
             ("Transfer Settings", [
                 ("Pause Between Devices:", self.pause_between_var, 0, 30, 1, " s"),
-                ("Upload Timeout (firmware):", self.upload_timeout_var, 300, 3600, 300, " s"),
+                ("Min. Upload Deadline:", self.upload_timeout_var, 60, 3600, 60, " s"),
+                ("Upload Deadline Safety Factor:", self.upload_safety_factor_var, 1, 10, 1, " x"),
+                ("Stall Window:", self.stall_window_var, 10, 300, 5, " s"),
+                ("Stall Throughput Floor:", self.stall_min_rate_var, 1, 1024, 1, " KB/s"),
                 ("Idle Timeout (no progress):", self.idle_timeout_var, 30, 300, 1, " s"),
                 ("Update Command Timeout:", self.update_command_timeout_var, 300, 1800, 60, " s"),
+                ("Pre-stage Rate Limit (0 = off):", self.prestage_rate_limit_var, 0, 100000, 50, " KB/s"),
             ]),
             ("Reboot Settings", [
                 ("Initial Wait After Reboot:", self.post_reboot_wait_var, 30, 180, 1, " s"),
@@ -1560,6 +671,13 @@ class BatchProcessorApp(QMainWindow):
             ]),
             ("Parallel Processing", [
                 ("Parallel PLC workers:", self.parallel_workers_var, 1, 5, 1, ""),
+                ("Worker processes (sharding):", self.shard_processes_var, 1, 16, 1, ""),
+                ("Pre-dialed sessions (0 = off):", self.predial_ahead_var, 0, 10, 1, ""),
+                ("Async read sessions:", self.async_read_concurrency_var, 16, 1024, 16, ""),
+            ]),
+            ("Firmware Install Mode", [
+                ("Detached Poll Interval:", self.detached_poll_var, 5, 120, 1, " s"),
+                ("HTTP Streaming Port:", self.http_install_port_var, 1024, 65535, 1, ""),
             ]),
         ]
 
@@ -1568,14 +686,125 @@ class BatchProcessorApp(QMainWindow):
             grid = QGridLayout(box)
             for i, (text, var, minimum, maximum, step, suffix) in enumerate(rows):
                 self._create_spin_row(grid, i, text, var, minimum, maximum, step, suffix)
+            if title == "Transfer Settings":
+                self.cleanup_stale_bundles_checkbox = QCheckBox("Usuwaj stare *.raucb / *.partial przed wysłaniem firmware")
+                self.cleanup_stale_bundles_checkbox.setChecked(self.cleanup_stale_bundles_var.get())
+                self.cleanup_stale_bundles_checkbox.toggled.connect(self.cleanup_stale_bundles_var.set)
+                grid.addWidget(self.cleanup_stale_bundles_checkbox, len(rows), 0, 1, 2)
+            if title == "Parallel Processing":
+                self.skip_unreachable_checkbox = QCheckBox("Pomijaj sterowniki bez portu 22 w pre-flight (zamiast na koniec kolejki)")
+                self.skip_unreachable_checkbox.setChecked(self.skip_unreachable_var.get())
+                self.skip_unreachable_checkbox.toggled.connect(self.skip_unreachable_var.set)
+                grid.addWidget(self.skip_unreachable_checkbox, len(rows), 0, 1, 2)
+                self.async_read_checkbox = QCheckBox("Odczyt w jednej pętli asyncio (setki sesji SSH naraz, wymaga asyncssh)")
+                self.async_read_checkbox.setChecked(self.async_read_var.get())
+                self.async_read_checkbox.toggled.connect(self.async_read_var.set)
+                grid.addWidget(self.async_read_checkbox, len(rows) + 1, 0, 1, 2)
+            if title == "Firmware Install Mode":
+                self.detached_update_checkbox = QCheckBox("Uruchamiaj update-axcf w tle (bez blokowania workera)")
+                self.detached_update_checkbox.setChecked(self.detached_update_var.get())
+                self.detached_update_checkbox.toggled.connect(self.detached_update_var.set)
+                grid.addWidget(self.detached_update_checkbox, len(rows), 0, 1, 2)
+                self.http_install_checkbox = QCheckBox("Instalacja strumieniowa z lokalnego serwera HTTP (rauc install <url>, bez SFTP)")
+                self.http_install_checkbox.setChecked(self.http_install_var.get())
+                self.http_install_checkbox.toggled.connect(self.http_install_var.set)
+                grid.addWidget(self.http_install_checkbox, len(rows) + 1, 0, 1, 2)
             layout.addWidget(box)
 
+        profiles_box = QGroupBox("Network Profiles (zapisane pomiary łącza)")
+        profiles_layout = QVBoxLayout(profiles_box)
+        self.network_profiles_tree = CompatTreeWidget()
+        self.network_profiles_tree.setColumnCount(7)
+        self.network_profiles_tree.setHeaderLabels([
+            "IP", "Nazwa", "Handshake SSH", "RTT", "Upload", "Instalacja", "Ostatni pomiar"
+        ])
+        self.network_profiles_tree.header().setSectionResizeMode(QHeaderView.Interactive)
+        self.network_profiles_tree.setMinimumHeight(160)
+        profiles_layout.addWidget(self.network_profiles_tree)
+        profiles_layout.addWidget(
+            self.create_action_button(parent, "Odśwież profile", self.refresh_network_profiles_view, "neutral")
+        )
+        layout.addWidget(profiles_box)
+        self.refresh_network_profiles_view()
+
         buttons = QHBoxLayout()
         buttons.addWidget(self.create_action_button(parent, "Zastosuj zmiany", self.apply_config, "primary"))
         buttons.addWidget(self.create_action_button(parent, "Przywroc domyslne", self.reset_config, "neutral"))
         layout.addLayout(buttons)
         layout.addStretch()
 
+    def refresh_network_profiles_view(self):
+        """Odświeża tabelę profili sieci w zakładce konfiguracji."""
+        tree = getattr(self, "network_profiles_tree", None)
+        if tree is None:
+            return
+        tree.delete()
+        for ip, profile in sorted(self.network_profiles.all().items()):
+            def fmt(key, scale, unit, digits=0):
+                value = profile.get(key)
+                return f"{value * scale:.{digits}f} {unit}" if value else "-"
+            tree.insert("", "end", text=ip, values=(
+                profile.get("name", ""),
+                fmt("handshake_ms", 1, "ms"),
+                fmt("rtt_ms", 1, "ms"),
+                fmt("upload_bps", 1 / (1024 * 1024), "MB/s", 2),
+                fmt("install_s", 1, "s"),
+                profile.get("updated", ""),
+            ))
+
+    def create_fleet_history_interface(self, parent):
+        """Zakładka zapytań do historii floty (baza SQLite zapisywana przy każdej partii)."""
+        layout = QVBoxLayout(parent)
+
+        query_box = QGroupBox("Zapytanie")
+        query_layout = QGridLayout(query_box)
+        query_layout.addWidget(QLabel("Widok:"), 0, 0)
+        self.fleet_query_combo = QComboBox()
+        for name, (label, _parameter, _columns) in FleetStateStore.QUERIES.items():
+            self.fleet_query_combo.addItem(label, name)
+        query_layout.addWidget(self.fleet_query_combo, 0, 1)
+        self.fleet_query_param_label = QLabel()
+        query_layout.addWidget(self.fleet_query_param_label, 1, 0)
+        self.fleet_query_entry = CompatLineEdit()
+        self.fleet_query_entry.returnPressed.connect(self.run_fleet_query)
+        query_layout.addWidget(self.fleet_query_entry, 1, 1)
+        query_layout.addWidget(self.create_action_button(query_box, "Wykonaj", self.run_fleet_query, "primary"), 2, 0, 1, 2)
+        layout.addWidget(query_box)
+
+        self.fleet_query_tree = CompatTreeWidget()
+        self.fleet_query_tree.header().setSectionResizeMode(QHeaderView.Interactive)
+        layout.addWidget(self.fleet_query_tree, 1)
+        self.fleet_query_status = CompatLabel("")
+        layout.addWidget(self.fleet_query_status)
+
+        def on_query_changed(_index):
+            parameter = FleetStateStore.QUERIES[self.fleet_query_combo.currentData()][1]
+            self.fleet_query_param_label.setText(f"{parameter}:" if parameter else "")
+            self.fleet_query_entry.setEnabled(bool(parameter))
+
+        self.fleet_query_combo.currentIndexChanged.connect(on_query_changed)
+        on_query_changed(0)
+        self.run_fleet_query()
+
+    def run_fleet_query(self):
+        """Wykonuje wybrane zapytanie do historii floty i pokazuje wynik w tabeli."""
+        name = self.fleet_query_combo.currentData()
+        started = time.perf_counter()
+        try:
+            columns, rows = self.fleet_state.query(name, self.fleet_query_entry.get())
+        except (ValueError, sqlite3.Error) as e:
+            self.fleet_query_status.config(text=str(e))
+            return
+        elapsed = time.perf_counter() - started
+        tree = self.fleet_query_tree
+        tree.delete()
+        tree.setColumnCount(len(columns))
+        tree.setHeaderLabels(columns)
+        for row in rows:
+            values = ["" if value is None else value for value in row]
+            tree.insert("", "end", text=str(values[0]), values=values[1:])
+        self.fleet_query_status.config(text=f"{len(rows)} wierszy ({elapsed * 1000:.1f} ms)")
+
     def create_manual_interface(self, parent):
         """Tworzy nowoczesny interfejs do ręcznej obsługi pojedynczego sterownika."""
         layout = QVBoxLayout(parent)
@@ -1618,6 +847,7 @@ class BatchProcessorApp(QMainWindow):
         ops_layout = QVBoxLayout(ops_box)
         ops_layout.addWidget(self.create_action_button(ops_box, "Ustaw strefę czasową", self.manual_set_timezone, "warning"))
         ops_layout.addWidget(self.create_action_button(ops_box, "Wyślij System Services", self.manual_upload_system_services, "info"))
+        ops_layout.addWidget(self.create_action_button(ops_box, "Przełącz slot RAUC (rollback)", self.manual_switch_slot, "danger"))
         layout.addWidget(ops_box)
 
         fw_box = QGroupBox("Aktualizacja Firmware")
@@ -1638,14 +868,16 @@ class BatchProcessorApp(QMainWindow):
     def update_action_buttons_state(self):
         """Włącza/wyłącza przyciski zgodnie z aktualnym etapem pracy."""
         has_devices = len(self.devices) > 0
-        has_firmware = bool(self.firmware_path.get() and os.path.exists(self.firmware_path.get()))
-        is_busy = self.processing
+        has_firmware = self.has_firmware_source()
+        is_busy = self.processing or self.loading_inventory
 
         normal = "normal"
         disabled = "disabled"
 
         if hasattr(self, 'load_excel_btn'):
             self.load_excel_btn.config(state=disabled if is_busy else normal)
+        if hasattr(self, 'discover_btn'):
+            self.discover_btn.config(state=disabled if is_busy else normal)
         if hasattr(self, 'batch_read_btn'):
             self.batch_read_btn.config(state=normal if (has_devices and not is_busy) else disabled)
         if hasattr(self, 'batch_sys_btn'):
@@ -1656,45 +888,41 @@ class BatchProcessorApp(QMainWindow):
             self.batch_fw_btn.config(state=normal if (has_devices and has_firmware and not is_busy) else disabled)
         if hasattr(self, 'batch_all_btn'):
             self.batch_all_btn.config(state=normal if (has_devices and has_firmware and not is_busy) else disabled)
+        if hasattr(self, 'batch_prestage_btn'):
+            self.batch_prestage_btn.config(state=normal if (has_devices and has_firmware and not is_busy) else disabled)
+        if hasattr(self, 'batch_activate_btn'):
+            self.batch_activate_btn.config(state=normal if (has_devices and has_firmware and not is_busy) else disabled)
+        if hasattr(self, 'batch_switch_slot_btn'):
+            self.batch_switch_slot_btn.config(state=normal if (has_devices and not is_busy) else disabled)
         if hasattr(self, 'save_excel_btn'):
-            self.save_excel_btn.config(state=normal if (has_devices and not is_busy) else disabled)
+            self.save_excel_btn.config(state=normal if (has_devices and not is_busy and not self.saving_report) else disabled)
         if hasattr(self, 'stop_btn'):
             self.stop_btn.config(state=normal if is_busy else disabled)
 
-    def device_has_issues(self, device):
-        """Czy urządzenie ma problemy prezentowane w kolumnie Issues."""
-        if device.time_sync_error:
-            return True
-        if device.system_services_ok not in ["OK", ""]:
-            return True
-        if device.timezone and device.timezone.strip() != TIMEZONE.strip():
-            return True
-        if device.status == "Błąd":
-            return True
-        return False
-
     def get_device_row_render_data(self, device):
-        """Przygotowuje wartości i tagi dla jednego wiersza tabeli."""
-        issues = []
-        has_issues = False
+        """Przygotowuje wartości i tagi dla jednego wiersza tabeli (zapamiętane do zmiany stanu sterownika)."""
+        if device.row_cache is not None:
+            return device.row_cache
+
+        flags = device.compliance
+        issues = device.issues
 
         plc_time_display = device.plc_time
-        if device.time_sync_error:
+        if flags & ISSUE_TIME_SYNC:
             plc_time_display = f"BŁĄD: {device.plc_time}"
-            issues.append("Desynchronizacja czasu")
-            has_issues = True
 
         sys_services_display = device.system_services_ok
-        if device.system_services_ok not in ["OK", ""]:
+        if flags & ISSUE_SYSTEM_SERVICES:
             sys_services_display = f"BŁĄD: {device.system_services_ok}"
-            issues.append("System Services")
-            has_issues = True
 
         timezone_display = device.timezone
-        if device.timezone and device.timezone.strip() != TIMEZONE.strip():
+        if flags & ISSUE_TIMEZONE:
             timezone_display = f"BŁĄD: {device.timezone}"
-            issues.append(f"Strefa czasowa ({device.timezone} ≠ {TIMEZONE})")
-            has_issues = True
+
+        if device.install_progress is not None:
+            install_display = f"{device.install_progress}% {device.install_step}"[:40]
+        else:
+            install_display = device.install_step[:40] or device.install_state
 
         if device.status == "W trakcie":
             issues_text = "Sprawdzanie..."
@@ -1707,15 +935,17 @@ class BatchProcessorApp(QMainWindow):
             device.ip,
             f"AXC F {device.plc_model}" if device.plc_model else "",
             device.firmware_version,
+            device.rauc_slots,
             plc_time_display,
             timezone_display,
             sys_services_display,
             device.last_check,
             device.status,
+            install_display,
             issues_text
         )
 
-        if has_issues:
+        if flags:
             tags = ('has_issues',)
         elif device.status == "OK":
             tags = ('success',)
@@ -1724,20 +954,23 @@ class BatchProcessorApp(QMainWindow):
         else:
             tags = ()
 
-        return values, tags
+        device.row_cache = (values, tags)
+        return device.row_cache
 
     def refresh_device_tree(self):
         """Odświeża tabelę urządzeń z uwzględnieniem filtra."""
         self.device_tree.delete(*self.device_tree.get_children())
+        self.device_items = {}
+        self._insert_device_rows(self.devices)
 
+    def _insert_device_rows(self, devices):
         show_only_errors = self.show_errors_only.get()
-        for device in self.devices:
-            if show_only_errors and not self.device_has_issues(device):
+        for device in devices:
+            if show_only_errors and not device.has_issues:
                 continue
 
             values, tags = self.get_device_row_render_data(device)
-            self.device_tree.insert("", "end", text=device.name, values=values, tags=tags)
-
+            self.device_items[device] = self.device_tree.insert("", "end", text=device.name, values=values, tags=tags)
 
     def apply_config(self):
         """Zastosuj zmiany z zakładki konfiguracji."""
@@ -1750,10 +983,24 @@ class BatchProcessorApp(QMainWindow):
         self.upload_timeout = self.upload_timeout_var.get()
         self.update_command_timeout = self.update_command_timeout_var.get()
         self.idle_timeout = self.idle_timeout_var.get()
+        self.upload_safety_factor = self.upload_safety_factor_var.get()
+        self.stall_window = self.stall_window_var.get()
+        self.stall_min_rate = self.stall_min_rate_var.get()
         self.post_reboot_wait = self.post_reboot_wait_var.get()
         self.post_reboot_timeout = self.post_reboot_timeout_var.get()
         self.post_reboot_poll = self.post_reboot_poll_var.get()
         self.parallel_workers = self.parallel_workers_var.get()
+        self.shard_processes = self.shard_processes_var.get()
+        self.detached_poll_interval = self.detached_poll_var.get()
+        self.detached_update = self.detached_update_var.get()
+        self.http_install_port = self.http_install_port_var.get()
+        self.http_install = self.http_install_var.get()
+        self.prestage_rate_limit = self.prestage_rate_limit_var.get()
+        self.cleanup_stale_bundles = self.cleanup_stale_bundles_var.get()
+        self.skip_unreachable = self.skip_unreachable_var.get()
+        self.predial_ahead = self.predial_ahead_var.get()
+        self.async_read = self.async_read_var.get()
+        self.async_read_concurrency = self.async_read_concurrency_var.get()
         
         self.log("Zastosowano nowe ustawienia konfiguracji")
         messagebox.showinfo("Sukces", "Ustawienia zostaly zaktualizowane")
@@ -1768,10 +1015,29 @@ class BatchProcessorApp(QMainWindow):
         self._set_config_var(self.upload_timeout_var, DEFAULT_UPLOAD_TIMEOUT)
         self._set_config_var(self.update_command_timeout_var, DEFAULT_UPDATE_COMMAND_TIMEOUT)
         self._set_config_var(self.idle_timeout_var, DEFAULT_IDLE_TIMEOUT)
+        self._set_config_var(self.upload_safety_factor_var, DEFAULT_UPLOAD_SAFETY_FACTOR)
+        self._set_config_var(self.stall_window_var, DEFAULT_STALL_WINDOW)
+        self._set_config_var(self.stall_min_rate_var, DEFAULT_STALL_MIN_RATE)
         self._set_config_var(self.post_reboot_wait_var, DEFAULT_POST_REBOOT_WAIT)
         self._set_config_var(self.post_reboot_timeout_var, DEFAULT_POST_REBOOT_TIMEOUT)
         self._set_config_var(self.post_reboot_poll_var, DEFAULT_POST_REBOOT_POLL)
         self._set_config_var(self.parallel_workers_var, DEFAULT_PARALLEL_WORKERS)
+        self._set_config_var(self.shard_processes_var, DEFAULT_SHARD_PROCESSES)
+        self._set_config_var(self.detached_poll_var, DEFAULT_DETACHED_POLL)
+        self.detached_update_var.set(DEFAULT_DETACHED_UPDATE)
+        self.detached_update_checkbox.setChecked(DEFAULT_DETACHED_UPDATE)
+        self._set_config_var(self.http_install_port_var, DEFAULT_HTTP_INSTALL_PORT)
+        self.http_install_var.set(DEFAULT_HTTP_INSTALL)
+        self.http_install_checkbox.setChecked(DEFAULT_HTTP_INSTALL)
+        self._set_config_var(self.prestage_rate_limit_var, DEFAULT_PRESTAGE_RATE_LIMIT)
+        self.cleanup_stale_bundles_var.set(DEFAULT_CLEANUP_STALE_BUNDLES)
+        self.cleanup_stale_bundles_checkbox.setChecked(DEFAULT_CLEANUP_STALE_BUNDLES)
+        self.skip_unreachable_var.set(DEFAULT_SKIP_UNREACHABLE)
+        self.skip_unreachable_checkbox.setChecked(DEFAULT_SKIP_UNREACHABLE)
+        self._set_config_var(self.predial_ahead_var, DEFAULT_PREDIAL_AHEAD)
+        self._set_config_var(self.async_read_concurrency_var, DEFAULT_ASYNC_READ_CONCURRENCY)
+        self.async_read_var.set(DEFAULT_ASYNC_READ)
+        self.async_read_checkbox.setChecked(DEFAULT_ASYNC_READ)
         
         self.apply_config()
         self.log("Przywrocono domyslne ustawienia")
@@ -1789,7 +1055,8 @@ class BatchProcessorApp(QMainWindow):
         """Wybór pliku Excel."""
         filepath = filedialog.askopenfilename(
             title="Wybierz plik Excel",
-            filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+            filetypes=[("Listy sterowników", "*.xlsx *.xlsm *.csv *.json"), ("Excel files", "*.xlsx *.xls"),
+                       ("CSV/JSON", "*.csv *.json"), ("All files", "*.*")]
         )
         if filepath:
             self.excel_path.set(filepath)
@@ -1799,50 +1066,150 @@ class BatchProcessorApp(QMainWindow):
         filepath = filedialog.askopenfilename(title="Wybierz plik firmware")
         if filepath:
             self.firmware_path.set(filepath)
+            self.prefetch_firmware_digest(filepath)
+            if self.firmware_catalog:
+                # Katalog ma pierwszeństwo przed pojedynczym plikiem - wybór pliku go wyłącza
+                self.clear_firmware_catalog_selection()
+
+    def select_firmware_catalog(self):
+        """Wybór katalogu firmware (mieszana flota 2152/3152 w jednej partii)."""
+        directory = filedialog.askdirectory(title="Wybierz katalog firmware")
+        if directory:
+            self.firmware_catalog_dir.set(directory)
+            threading.Thread(target=self.load_firmware_catalog, args=(directory,), daemon=True).start()
+
+    def clear_firmware_catalog_selection(self):
+        """Wyłącza katalog firmware; partie używają pliku wybranego przez 'Wybierz firmware'."""
+        self.firmware_catalog_dir.set("")
+        self.clear_firmware_catalog()
 
     def load_excel(self):
-        """Wczytuje listę sterowników z pliku Excel."""
+        """Wczytuje listę sterowników (Excel/CSV/JSON) w tle; wiersze trafiają do tabeli w trakcie parsowania."""
         excel_file = self.excel_path.get()
         if not excel_file or not os.path.exists(excel_file):
             messagebox.showerror("Błąd", "Wybierz prawidłowy plik Excel!")
             return
-        
+        if self.loading_inventory:
+            return
+
+        self.loading_inventory = True
+        self.devices = []
+        self.refresh_device_tree()
+        self.update_action_buttons_state()
+        self.status_bar.config(text=f"Wczytywanie: {os.path.basename(excel_file)}...")
+        threading.Thread(target=self._load_inventory_worker, args=(excel_file,), daemon=True).start()
+
+    def discover_network(self):
+        """Wykrywa sterowniki w podsieciach (port 22 + rauc status) i tworzy z nich listę."""
+        if self.loading_inventory or self.processing:
+            return
+        targets, ok = QInputDialog.getText(
+            self, "Wykrywanie sterowników",
+            "Podsieci lub zakresy (np. 10.20.0.0/20, 192.168.1.10-192.168.1.50):",
+            text=self.discovery_targets,
+        )
+        if not ok or not targets.strip():
+            return
+        password, ok = QInputDialog.getText(
+            self, "Wykrywanie sterowników",
+            "Hasło admin do identyfikacji (puste - tylko skan portu 22):",
+            QLineEdit.Password,
+        )
+        if not ok:
+            return
+        self.discovery_targets = targets.strip()
+        self.loading_inventory = True
+        self.update_action_buttons_state()
+        self.status_bar.config(text=f"Wykrywanie: {self.discovery_targets}...")
+        threading.Thread(target=self._discover_worker, args=(self.discovery_targets, password), daemon=True).start()
+
+    def _discover_worker(self, targets, password):
+        """Wątek wykrywania sterowników."""
         try:
-            wb = openpyxl.load_workbook(excel_file)
-            ws = wb.active
-            
-            self.devices = []
-            
-            # Pomijamy nagłówek (wiersz 1)
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if row[0] and row[1]:  # Nazwa i IP muszą być wypełnione
-                    name = str(row[0]).strip()
-                    ip = str(row[1]).strip()
-                    password = str(row[2]).strip() if row[2] else ""
-                    
-                    device = PLCDevice(name, ip, password)
-                    
-                    # Wczytaj istniejące dane jeśli są
-                    if len(row) > 3 and row[3]:
-                        device.firmware_version = str(row[3])
-                    if len(row) > 4 and row[4]:
-                        device.timezone = str(row[4])
-                    if len(row) > 5 and row[5]:
-                        device.system_services_ok = str(row[5])
-                    if len(row) > 6 and row[6]:
-                        device.last_check = str(row[6])
-                    
-                    self.devices.append(device)
-            
-            wb.close()
-            self.refresh_device_tree()
-            self.update_action_buttons_state()
-            self.log(f"Wczytano {len(self.devices)} sterowników z pliku Excel")
-            messagebox.showinfo("Sukces", f"Wczytano {len(self.devices)} sterowników")
-            
+            devices = self.discover_devices(targets, password)
+            self.after(0, lambda: self._discovery_finished(devices))
         except Exception as e:
-            self.log(f"Błąd wczytywania Excel: {str(e)}")
-            messagebox.showerror("Błąd", f"Błąd wczytywania pliku Excel:\n{str(e)}")
+            self.after(0, lambda err=e: self._discovery_failed(err))
+
+    def _discovery_failed(self, error):
+        self.loading_inventory = False
+        self.update_action_buttons_state()
+        self.status_bar.config(text="Błąd wykrywania")
+        self.log(f"Błąd wykrywania sterowników: {str(error)}")
+        messagebox.showerror("Błąd", f"Błąd wykrywania sterowników:\n{str(error)}")
+
+    def _discovery_finished(self, devices):
+        self.loading_inventory = False
+        self.devices = devices
+        self.autosave_path = None
+        self.refresh_device_tree()
+        self.update_action_buttons_state()
+        self.status_bar.config(text=f"Wykryto {len(devices)} sterowników")
+        messagebox.showinfo("Wykrywanie", f"Wykryto {len(devices)} sterowników.\nZapisz listę przyciskiem zapisu raportu.")
+
+    def _load_inventory_worker(self, path):
+        """Wątek wczytywania listy - przekazuje sterowniki do GUI partiami."""
+        started = time.perf_counter()
+        batch = []
+        last_flush = started
+        try:
+            for device in self.inventory_cache.iter_inventory(path):
+                batch.append(device)
+                now = time.perf_counter()
+                if len(batch) >= self.INVENTORY_BATCH_ROWS or now - last_flush >= self.INVENTORY_BATCH_INTERVAL:
+                    self.after(0, lambda b=batch: self._append_loaded_devices(b))
+                    batch = []
+                    last_flush = now
+            self.after(0, lambda b=batch: self._append_loaded_devices(b))
+            elapsed = time.perf_counter() - started
+            self.after(0, lambda: self._inventory_loaded(path, elapsed))
+        except Exception as e:
+            self.after(0, lambda err=e: self._inventory_load_failed(err))
+
+    def _append_loaded_devices(self, devices):
+        self.devices.extend(devices)
+        self._insert_device_rows(devices)
+        self.status_bar.config(text=f"Wczytywanie... {len(self.devices)} sterowników")
+
+    def _inventory_loaded(self, path, elapsed):
+        self.loading_inventory = False
+        self.autosave_path = autosave_path_for(path)
+        self.update_action_buttons_state()
+        self.status_bar.config(text=f"Wczytano {len(self.devices)} sterowników")
+        self.log(f"Wczytano {len(self.devices)} sterowników z pliku {os.path.basename(path)} ({elapsed:.2f} s)")
+        if not self.restore_interrupted_batch():
+            messagebox.showinfo("Sukces", f"Wczytano {len(self.devices)} sterowników")
+
+    def restore_interrupted_batch(self):
+        """Proponuje przywrócenie wyników partii przerwanej awarią (autozapis bez podsumowania)."""
+        if not os.path.exists(self.autosave_path):
+            return False
+        try:
+            operation, states, summary = load_autosave(self.autosave_path)
+        except (OSError, ValueError):
+            return False
+        known = {device.ip: device for device in self.devices}
+        states = {ip: state for ip, state in states.items() if ip in known}
+        if summary is not None or not states:
+            return False
+        if not messagebox.askyesno(
+            "Przerwana operacja",
+            f"Znaleziono wyniki przerwanej operacji {operation.upper()} dla {len(states)} sterowników.\n"
+            f"Przywrócić je w tabeli?"
+        ):
+            return False
+        for ip, state in states.items():
+            known[ip].apply_state(state)
+        self.refresh_device_tree()
+        self.log(f"Przywrócono wyniki przerwanej operacji {operation.upper()} ({len(states)} sterowników)")
+        return True
+
+    def _inventory_load_failed(self, error):
+        self.loading_inventory = False
+        self.update_action_buttons_state()
+        self.status_bar.config(text="Błąd wczytywania listy")
+        self.log(f"Błąd wczytywania Excel: {str(error)}")
+        messagebox.showerror("Błąd", f"Błąd wczytywania pliku Excel:\n{str(error)}")
 
     def save_excel(self):
         """Zapisuje aktualny stan do pliku Excel."""
@@ -1860,121 +1227,60 @@ class BatchProcessorApp(QMainWindow):
             if not save_path:
                 return
             
-            wb = openpyxl.Workbook()
-            ws = wb.active
-            ws.title = "Sterowniki PLC"
-            
-            # Nagłówki
-            headers = ["Nazwa Farmy", "IP", "Hasło", "Firmware", "Strefa czasowa", 
-                      "System Services", "Ostatni odczyt", "Ostatnia aktualizacja", "Status", "Logi błędów"]
-            ws.append(headers)
-            
-            # Formatowanie nagłówków
-            header_fill = PatternFill(start_color="4CAF50", end_color="4CAF50", fill_type="solid")
-            header_font = Font(bold=True, color="FFFFFF")
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-            
-            # Dane
-            for device in self.devices:
-                ws.append([
-                    device.name,
-                    device.ip,
-                    device.password,
-                    device.firmware_version,
-                    device.timezone,
-                    device.system_services_ok,
-                    device.last_check,
-                    device.last_update,
-                    device.status,
-                    device.error_log
-                ])
-            
-            # Dopasowanie szerokości kolumn
-            for column in ws.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)
-                ws.column_dimensions[column_letter].width = adjusted_width
-            
-            wb.save(save_path)
-            self.log(f"Zapisano raport do: {save_path}")
-            messagebox.showinfo("Sukces", f"Raport zapisany:\n{save_path}")
-            
+            # Kopia listy - zapis w tle nie blokuje okna, a tabela może się w tym czasie zmieniać
+            devices = list(self.devices)
+            self.saving_report = True
+            self.update_action_buttons_state()
+            self.status_bar.config(text=f"Zapisywanie raportu: {os.path.basename(save_path)}...")
+            threading.Thread(target=self._save_report_worker, args=(devices, save_path), daemon=True).start()
+
         except Exception as e:
             self.log(f"Błąd zapisu Excel: {str(e)}")
             messagebox.showerror("Błąd", f"Błąd zapisu do Excel:\n{str(e)}")
 
-    def update_firmware_only_operation(self, device):
-        """
-        Aktualizuje TYLKO firmware (z automatycznym wykrywaniem modelu i walidacją).
-        POPRAWIONA: Używa execute_firmware_update() dla bezpiecznego reebootu.
-        """
-        self.log(f"Aktualizacja Firmware...")
-        
-        firmware_file = self.firmware_path.get()
-        
-        # Odczyt danych (w tym model PLC) - PRZERWIJ jeśli błąd
+    def _save_report_worker(self, devices, save_path):
+        """Wątek zapisu raportu."""
+        started = time.perf_counter()
         try:
-            self.read_single_device(device)
+            write_report_xlsx(devices, save_path)
+            elapsed = time.perf_counter() - started
+            self.after(0, lambda: self._report_saved(save_path, elapsed))
         except Exception as e:
-            error_msg = f"Nie można odczytać danych sterownika przed aktualizacją: {str(e)}"
-            self.log(f"  BŁĄD: {error_msg}")
-            raise Exception(error_msg)
-        
-        # Walidacja kompatybilności
-        is_compatible, compat_msg = self.validate_firmware_compatibility(device, firmware_file)
-        self.log(f"  {compat_msg}")
+            self.after(0, lambda err=e: self._report_save_failed(err))
+
+    def _report_saved(self, save_path, elapsed):
+        self.saving_report = False
+        self.update_action_buttons_state()
+        self.status_bar.config(text="Raport zapisany")
+        self.log(f"Zapisano raport do: {save_path} ({elapsed:.2f} s)")
+        messagebox.showinfo("Sukces", f"Raport zapisany:\n{save_path}")
+
+    def _report_save_failed(self, error):
+        self.saving_report = False
+        self.update_action_buttons_state()
+        self.status_bar.config(text="Błąd zapisu raportu")
+        self.log(f"Błąd zapisu Excel: {str(error)}")
+        messagebox.showerror("Błąd", f"Błąd zapisu do Excel:\n{str(error)}")
+
+    def batch_switch_slot(self):
+        """Przełącza slot RAUC (rollback) na wszystkich sterownikach."""
+        if not self.devices:
+            messagebox.showwarning("Uwaga", "Najpierw wczytaj listę sterowników!")
+            return
         
-        if not is_compatible:
-            raise FatalUpdateError(compat_msg)
+        if self.processing:
+            messagebox.showwarning("Uwaga", "Operacja już w toku!")
+            return
         
-        # Sprawdź czy firmware jest aktualny
-        if self.compare_firmware_versions(device.firmware_version, firmware_file):
-            self.log(f"  Firmware już aktualny (v.{device.firmware_version}) - pomijam aktualizację")
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
+        response = messagebox.askyesno(
+            "Potwierdzenie",
+            f"Czy przełączyć slot RAUC na {len(self.devices)} sterownikach?\n\n"
+            "Sterowniki uruchomią się z drugiego slotu (poprzednie firmware) - bez wysyłania plików.\n"
+            "Każdy sterownik zostanie zrestartowany!"
+        )
         
-        try:
-            # KROK 1: UPLOAD FIRMWARE (w context managerze)
-            with self.ssh_connection(device) as (ssh, sftp):
-                
-                filename = os.path.basename(firmware_file)
-                remote_fw_path = f"/opt/plcnext/{filename}"
-                
-                file_size = os.path.getsize(firmware_file)
-                self.log(f"  Wysyłanie firmware ({file_size/1024/1024:.1f} MB)...")
-                
-                self.upload_file_with_resume(
-                    sftp,
-                    firmware_file,
-                    remote_fw_path,
-                    device=device
-                )
-                
-                self.reset_upload_progress()
-                
-                self.log(f"  Firmware wysłany i zweryfikowany")
-            
-            # Context manager zamknął SSH/SFTP tutaj
-            
-            # KROK 2: WYKONAJ UPDATE (NOWE połączenie SSH)
-            self.execute_firmware_update(device)
-            
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
-            
-        except Exception as e:
-            self.reset_upload_progress()
-            raise e
-
+        if response:
+            threading.Thread(target=self.run_batch, args=("switch_slot",), daemon=True).start()
 
     def batch_read_all(self):
             """Odczytuje dane ze wszystkich sterowników."""
@@ -1986,7 +1292,7 @@ class BatchProcessorApp(QMainWindow):
                 messagebox.showwarning("Uwaga", "Operacja już w toku!")
                 return
             
-            threading.Thread(target=self.process_batch, args=("read",), daemon=True).start()
+            threading.Thread(target=self.run_batch, args=("read",), daemon=True).start()
 
     def batch_system_services(self):
         """Wysyła System Services do wszystkich sterowników."""
@@ -2005,7 +1311,7 @@ class BatchProcessorApp(QMainWindow):
         )
         
         if response:
-            threading.Thread(target=self.process_batch, args=("system_services",), daemon=True).start()
+            threading.Thread(target=self.run_batch, args=("system_services",), daemon=True).start()
 
     def batch_timezone(self):
         """Ustawia strefę czasową na wszystkich sterownikach."""
@@ -2024,7 +1330,7 @@ class BatchProcessorApp(QMainWindow):
         )
         
         if response:
-            threading.Thread(target=self.process_batch, args=("timezone",), daemon=True).start()
+            threading.Thread(target=self.run_batch, args=("timezone",), daemon=True).start()
 
     def batch_firmware_only(self):
         """Aktualizuje firmware na wszystkich sterownikach."""
@@ -2036,9 +1342,8 @@ class BatchProcessorApp(QMainWindow):
             messagebox.showwarning("Uwaga", "Operacja już w toku!")
             return
         
-        firmware_file = self.firmware_path.get()
-        if not firmware_file or not os.path.exists(firmware_file):
-            messagebox.showerror("Błąd", "Wybierz prawidłowy plik firmware!")
+        if not self.has_firmware_source():
+            messagebox.showerror("Błąd", "Wybierz prawidłowy plik lub katalog firmware!")
             return
         
         response = messagebox.askyesno(
@@ -2049,10 +1354,10 @@ class BatchProcessorApp(QMainWindow):
         )
         
         if response:
-            threading.Thread(target=self.process_batch, args=("firmware",), daemon=True).start()
+            threading.Thread(target=self.run_batch, args=("firmware",), daemon=True).start()
 
-    def batch_update_all(self):
-        """WYKONUJE WSZYSTKIE OPERACJE NARAZ - zoptymalizowane."""
+    def batch_prestage_firmware(self):
+        """Faza 1: wysyła i weryfikuje firmware na wszystkich sterownikach (bez instalacji)."""
         if not self.devices:
             messagebox.showwarning("Uwaga", "Najpierw wczytaj listę sterowników!")
             return
@@ -2061,378 +1366,84 @@ class BatchProcessorApp(QMainWindow):
             messagebox.showwarning("Uwaga", "Operacja już w toku!")
             return
         
-        firmware_file = self.firmware_path.get()
-        if not firmware_file or not os.path.exists(firmware_file):
-            messagebox.showerror("Błąd", "Wybierz prawidłowy plik firmware!")
+        if not self.has_firmware_source():
+            messagebox.showerror("Błąd", "Wybierz prawidłowy plik lub katalog firmware!")
             return
         
+        limit_text = f"{self.prestage_rate_limit} KB/s" if self.prestage_rate_limit else "bez limitu"
         response = messagebox.askyesno(
             "Potwierdzenie",
-            f"PEŁNA AKTUALIZACJA {len(self.devices)} sterowników:\n\n"
-            "Operacje wykonywane dla każdego sterownika:\n"
-            "1. System Services (jeśli potrzebne)\n"
-            "2. Firmware - wysłanie i sudo update\n"
-            "3. Strefa czasowa (jeśli potrzebne)\n"
-            "4. Restart sterownika\n\n"
-            "Operacja może zająć bardzo dużo czasu!\n\n"
-            "Kontynuować?"
+            f"Czy przygotować (pre-stage) firmware na {len(self.devices)} sterownikach?\n\n"
+            f"Plik zostanie wysłany i zweryfikowany (SHA-256), bez instalacji i restartu.\n"
+            f"Limit przepustowości: {limit_text}"
         )
         
         if response:
-            threading.Thread(target=self.process_batch, args=("all",), daemon=True).start()
-
+            threading.Thread(target=self.run_batch, args=("prestage",), daemon=True).start()
 
-    def update_system_services_only(self, device):
-        """
-        Wysyła System Services i restartuje sterownik. Pomija, jeśli jest już OK.
-        POPRAWIONA: Używa execute_reboot() dla bezpiecznego reebootu.
-        """
-        self.log(f"Aktualizacja System Services...")
-        
-        # Sprawdzenie statusu przed operacją
-        try:
-            self.read_single_device(device)
-        except Exception as e:
-            self.log(f"  UWAGA: Błąd odczytu przed aktualizacją SysServices: {str(e)}")
-        
-        # Logika pominięcia
-        if device.system_services_ok == "OK":
-            self.log(f"  INFO: System Services już aktualne - pomijam")
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
+    def batch_activate_firmware(self):
+        """Faza 2: instaluje przygotowany firmware na sterownikach ze zgodnym SHA-256."""
+        if not self.devices:
+            messagebox.showwarning("Uwaga", "Najpierw wczytaj listę sterowników!")
+            return
         
-        try:
-            # KROK 1: UPLOAD SYSTEM SERVICES (w context managerze)
-            with self.ssh_connection(device) as (ssh, sftp):
-                
-                local_sys_file = resource_path(SYSTEM_SERVICES_FILE)
-                if not os.path.exists(local_sys_file):
-                    raise FatalUpdateError(f"Plik {SYSTEM_SERVICES_FILE} nie istnieje!")
-                
-                remote_sys_path = "/opt/plcnext/config/System/Scm/Default.scm.config"
-                filename = os.path.basename(local_sys_file)
-                file_size = os.path.getsize(local_sys_file)
-                
-                self.log(f"  Wysyłanie {filename} ({file_size/1024:.1f} KB)...")
-                
-                self.upload_file_with_resume(
-                    sftp,
-                    local_sys_file,
-                    remote_sys_path,
-                    device=device
-                )
-                
-                self.reset_upload_progress()
-                
-                device.system_services_ok = "OK"
-                self.log(f"  System Services wysłane i zweryfikowane")
-            
-            # Context manager zamknął SSH/SFTP tutaj
-            
-            # KROK 2: REBOOT (NOWE połączenie SSH)
-            self.execute_reboot(device)
-            
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
-            
-        except Exception as e:
-            self.reset_upload_progress()
-            raise e
-
-
-    def update_timezone_only(self, device):
-        """
-        Ustawia strefę czasową i restartuje. Pomija, jeśli już OK.
-        POPRAWIONA: Używa execute_reboot() dla bezpiecznego reebootu.
-        """
-        self.log(f"Aktualizacja strefy czasowej na {TIMEZONE}...")
+        if self.processing:
+            messagebox.showwarning("Uwaga", "Operacja już w toku!")
+            return
         
-        # Sprawdzenie statusu przed operacją
-        try:
-            self.read_single_device(device)
-        except Exception as e:
-            self.log(f"  UWAGA: Błąd odczytu przed aktualizacją Timezone: {str(e)}")
+        if not self.has_firmware_source():
+            messagebox.showerror("Błąd", "Wybierz prawidłowy plik lub katalog firmware!")
+            return
         
-        # Logika pominięcia
-        if device.timezone.strip() == TIMEZONE.strip():
-            self.log(f"  INFO: Strefa czasowa już ustawiona na {TIMEZONE} - pomijam")
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
+        response = messagebox.askyesno(
+            "Potwierdzenie",
+            f"Czy aktywować przygotowany firmware na {len(self.devices)} sterownikach?\n\n"
+            "update-axcf zostanie uruchomiony tylko tam, gdzie bundle ma zgodny SHA-256.\n"
+            "Każdy sterownik zostanie zrestartowany!"
+        )
         
-        try:
-            # KROK 1: USTAWIENIE TIMEZONE (w context managerze)
-            with self.ssh_connection(device) as (ssh, sftp):
-                
-                self.log(f"  Ustawianie strefy czasowej na {TIMEZONE}...")
-                
-                # Wpisanie TIMEZONE do /etc/timezone
-                stdin, stdout, stderr = ssh.exec_command(
-                    f"sudo sh -c 'echo {TIMEZONE} > /etc/timezone'", 
-                    get_pty=True
-                )
-                stdin.write(device.password + "\n")
-                stdin.flush()
-                time.sleep(1)
-                
-                # Użycie timedatectl
-                stdin, stdout, stderr = ssh.exec_command(
-                    f"sudo timedatectl set-timezone {TIMEZONE}", 
-                    get_pty=True
-                )
-                stdin.write(device.password + "\n")
-                stdin.flush()
-                time.sleep(1)
-                
-                device.timezone = TIMEZONE
-                self.log("  Strefa czasowa ustawiona")
-            
-            # Context manager zamknął SSH/SFTP tutaj
-            
-            # KROK 2: REBOOT (NOWE połączenie SSH)
-            self.execute_reboot(device)
-            
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
-            
-        except Exception as e:
-            raise e
+        if response:
+            threading.Thread(target=self.run_batch, args=("activate",), daemon=True).start()
 
-    def update_all_operations(self, device):
-        """
-        Wykonuje wszystkie operacje: System Services, Firmware, Timezone.
-        Zoptymalizowane pod kątem restartów i pomijania.
+    def batch_update_all(self):
+        """WYKONUJE WSZYSTKIE OPERACJE NARAZ - zoptymalizowane."""
+        if not self.devices:
+            messagebox.showwarning("Uwaga", "Najpierw wczytaj listę sterowników!")
+            return
         
-        KOLEJNOŚĆ OPERACJI:
-        1. Połączenie SSH (przez context manager)
-        2. Wykrycie modelu PLC i walidacja kompatybilności firmware
-        3. Odczyt wstępny (stan SysServices, Timezone, Firmware)
-        4. Aktualizacja System Services (tylko jeśli jest różnica/brak)
-        5. Aktualizacja Firmware (tylko wysłanie pliku - jeśli konieczne i kompatybilne)
-        6. Ustawienie strefy czasowej (tylko jeśli konieczne)
-        7. ZAMKNIĘCIE SFTP przed rebootem/update
-        8. Wykonanie sudo update / sudo reboot (tylko jeśli FW lub SS było wgrywane)
-        """
-        self.log(f"PEŁNA AKTUALIZACJA: START")
+        if self.processing:
+            messagebox.showwarning("Uwaga", "Operacja już w toku!")
+            return
         
-        firmware_file = self.firmware_path.get()
+        if not self.has_firmware_source():
+            messagebox.showerror("Błąd", "Wybierz prawidłowy plik lub katalog firmware!")
+            return
         
-        # Flagi kontrolujące potrzebę restartu/update
-        ss_updated = False
-        fw_needed = False
-        tz_updated = False
+        response = messagebox.askyesno(
+            "Potwierdzenie",
+            f"PEŁNA AKTUALIZACJA {len(self.devices)} sterowników:\n\n"
+            "Operacje wykonywane dla każdego sterownika:\n"
+            "1. System Services (jeśli potrzebne)\n"
+            "2. Firmware - wysłanie i sudo update\n"
+            "3. Strefa czasowa (jeśli potrzebne)\n"
+            "4. Restart sterownika\n\n"
+            "Operacja może zająć bardzo dużo czasu!\n\n"
+            "Kontynuować?"
+        )
         
-        try:
-            # UŻYJ CONTEXT MANAGERA dla bezpiecznego SSH/SFTP
-            with self.ssh_connection(device) as (ssh, sftp):
-                
-                # 1. Wykryj model PLC
-                device.plc_model = self.detect_plc_model(ssh)
-                
-                if not device.plc_model:
-                    raise Exception("Nie można wykryć modelu sterownika!")
-                
-                # 2. Walidacja kompatybilności firmware
-                is_compatible, compat_msg = self.validate_firmware_compatibility(device, firmware_file)
-                self.log(f"  {compat_msg}")
-                
-                if not is_compatible:
-                    raise FatalUpdateError(f"{compat_msg}\n\nZATRZYMANO AKTUALIZACJĘ!")
-                
-                # 3. Odczyt wstępny danych
-                self.log("  Wstępny odczyt danych...")
-                
-                # Firmware version
-                stdin, stdout, stderr = ssh.exec_command("grep Arpversion /etc/plcnext/arpversion")
-                fw_output = stdout.read().decode().strip()
-                
-                self.log(f"  Surowy output wersji firmware: '{fw_output}'")
-                
-                version_string = "?"
-                if fw_output:
-                    fw_output = fw_output.replace('Arpversion', '').strip()
-                    
-                    if ":" in fw_output:
-                        parts = fw_output.split(':', 1) 
-                        version_string = parts[1].strip() if len(parts) > 1 else "?"
-                    elif "=" in fw_output:
-                        version_string = fw_output.split("=")[-1].strip()
-                    else:
-                        version_string = fw_output.strip()
-                    
-                    self.log(f"  Sparsowana wersja: '{version_string}'")
-                
-                if version_string and version_string != "?" and version_string[0].isdigit():
-                    device.firmware_version = version_string
-                else:
-                    device.firmware_version = "?"
-                    self.log(f"  UWAGA: Nie można odczytać poprawnej wersji firmware!")
-                
-                # Timezone
-                stdin, stdout, stderr = ssh.exec_command("cat /etc/timezone")
-                device.timezone = stdout.read().decode(errors="ignore").strip()
-                
-                # System Services
-                try:
-                    remote_path = "/opt/plcnext/config/System/Scm/Default.scm.config"
-                    remote_stat = sftp.stat(remote_path)
-                    local_file = resource_path(SYSTEM_SERVICES_FILE)
-                    if os.path.exists(local_file):
-                        local_size = os.path.getsize(local_file)
-                        remote_size = remote_stat.st_size
-                        device.system_services_ok = "OK" if local_size == remote_size else "Różnica"
-                        if device.system_services_ok == "Różnica":
-                            self.log(f"  UWAGA: System Services - różnica rozmiaru: lokalny={local_size}, zdalny={remote_size}")
-                    else:
-                        device.system_services_ok = "Istnieje"
-                except FileNotFoundError:
-                    device.system_services_ok = "Brak"
-                except Exception as e:
-                    device.system_services_ok = "Błąd"
-                    self.log(f"  UWAGA: Błąd sprawdzania System Services: {str(e)}")
-                
-                self.log(f"  Status System Services: {device.system_services_ok}")
-                self.log(f"  Aktualna wersja FW: {device.firmware_version}")
-                self.log(f"  Aktualna strefa czasowa: {device.timezone}")
-                
-                # 4. System Services - TYLKO UPLOAD, REBOOT PÓŹNIEJ
-                if device.system_services_ok != "OK":
-                    self.log(f"  System Services: {device.system_services_ok}. Wymagana aktualizacja.")
-                    
-                    local_sys_file = resource_path(SYSTEM_SERVICES_FILE)
-                    if not os.path.exists(local_sys_file):
-                        raise FatalUpdateError(f"Plik {SYSTEM_SERVICES_FILE} nie istnieje lokalnie!")
-                    
-                    remote_sys_path = "/opt/plcnext/config/System/Scm/Default.scm.config"
-                    filename = os.path.basename(local_sys_file)
-                    
-                    self.log(f"  Wysyłanie {filename}...")
-                    
-                    self.upload_file_with_resume(
-                        sftp,
-                        local_sys_file,
-                        remote_sys_path,
-                        device=device
-                    )
-                    
-                    self.reset_upload_progress()
-                    device.system_services_ok = "OK"
-                    ss_updated = True
-                    self.log(f"  System Services wysłane i zweryfikowane")
-                else:
-                    self.log("  System Services OK - pomijam wysyłkę")
-                
-                # 5. Firmware - TYLKO UPLOAD, UPDATE PÓŹNIEJ
-                if not self.compare_firmware_versions(device.firmware_version, firmware_file):
-                    fw_needed = True
-                    target_fw_version = self.get_target_fw_version(firmware_file)
-                    self.log(f"  Firmware nieaktualne. Aktualna: {device.firmware_version}, Docelowa: {target_fw_version}")
-                    
-                    self.log("  Wysyłanie Firmware...")
-                    filename = os.path.basename(firmware_file)
-                    remote_fw_path = f"/opt/plcnext/{filename}"
-                    
-                    file_size = os.path.getsize(firmware_file)
-                    
-                    self.upload_file_with_resume(
-                        sftp,
-                        firmware_file,
-                        remote_fw_path,
-                        device=device
-                    )
-                    
-                    self.reset_upload_progress()
-                    self.log(f"  Plik firmware wysłany i zweryfikowany ({file_size/1024/1024:.1f} MB)")
-                else:
-                    self.log(f"  Firmware (v.{device.firmware_version}) jest aktualne - pomijam wysyłkę")
-
-                # 6. Timezone - TYLKO USTAWIENIE, REBOOT PÓŹNIEJ
-                if device.timezone.strip() != TIMEZONE.strip():
-                    self.log(f"  Strefa czasowa niepoprawna. Ustawianie na {TIMEZONE}...")
-                    
-                    stdin, stdout, stderr = ssh.exec_command(
-                        f"sudo sh -c 'echo {TIMEZONE} > /etc/timezone'", 
-                        get_pty=True
-                    )
-                    stdin.write(device.password + "\n")
-                    stdin.flush()
-                    time.sleep(1)
-                    
-                    stdin, stdout, stderr = ssh.exec_command(
-                        f"sudo timedatectl set-timezone {TIMEZONE}", 
-                        get_pty=True
-                    )
-                    stdin.write(device.password + "\n")
-                    stdin.flush()
-                    time.sleep(1)
-                    
-                    device.timezone = TIMEZONE
-                    tz_updated = True
-                    self.log("  Strefa czasowa ustawiona")
-                else:
-                    self.log("  Strefa czasowa OK - pomijam zmianę")
-                
-                self.log("  Wszystkie transfery zakończone")
-            
-            # Context manager zamknął SSH tutaj - wszystkie transfery zakończone!
-            
-            # 7. TERAZ WYKONAJ UPDATE/REBOOT (nowe połączenie SSH)
-            needs_reboot = ss_updated or tz_updated
-            
-            if fw_needed or needs_reboot:
-                self.log("  WYKONYWANIE AKTUALIZACJI / RESTART...")
-                
-                if fw_needed:
-                    # Firmware update - to robi automatyczny reboot
-                    self.execute_firmware_update(device)
-                    
-                elif needs_reboot:
-                    # Tylko reboot (SS lub TZ się zmieniły, ale nie FW)
-                    self.execute_reboot(device)
-            else:
-                self.log("  INFO: Wszystkie komponenty aktualne. Pomijam restart")
-
-            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            return True
-            
-        except Exception as e:
-            self.reset_upload_progress()
-            raise e
+        if response:
+            threading.Thread(target=self.run_batch, args=("all",), daemon=True).start()
 
 
-    def set_timezone_ssh(self, ssh, password):
-        """
-        Ustawia strefę czasową przez SSH (bez restartu).
-        Używa shell interaktywnego z sudo i su.
-        """
-        shell = ssh.invoke_shell()
-        
-        def send_cmd(cmd, wait=1):
-            shell.send(cmd + "\n")
-            time.sleep(wait)
-        
-        # Ustaw hasło root
-        send_cmd("sudo passwd root")
-        send_cmd(password)  # sudo password
-        send_cmd(ROOT_PASS)  # nowe hasło root
-        send_cmd(ROOT_PASS)  # potwierdzenie
-        
-        # Przełącz na root
-        send_cmd("su")
-        send_cmd(ROOT_PASS)
-        
-        # Ustaw strefę czasową
-        send_cmd(f"ln -sf /usr/share/zoneinfo/{TIMEZONE} /etc/localtime")
-        send_cmd(f"echo '{TIMEZONE}' > /etc/timezone")
-        
-        # Wyłącz hasło root
-        send_cmd("passwd -dl root")
-        send_cmd("exit")
-        
-        time.sleep(2)
-
     def update_device_row(self, device):
-        """Aktualizuje widok tabeli po zmianie statusu urządzenia."""
-        self.refresh_device_tree()
+        """Aktualizuje wiersz urządzenia w tabeli (całość tylko, gdy filtr zmienia widoczność wiersza)."""
+        item = self.device_items.get(device)
+        visible = not self.show_errors_only.get() or device.has_issues
+        if (item is not None) != visible:
+            self.refresh_device_tree()
+        elif item is not None:
+            values, tags = self.get_device_row_render_data(device)
+            self.device_tree.item(item, text=device.name, values=values, tags=tags)
         self.device_tree.update_idletasks()
 
     def stop_processing(self):
@@ -2441,11 +1452,6 @@ class BatchProcessorApp(QMainWindow):
             self.processing = False
             self.log("Żądanie zatrzymania operacji...")
 
-    def log(self, message):
-        """Dodaje wiadomość do kolejki logów."""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_queue.put(f"[{timestamp}] {message}")
-
     def update_logs(self):
         """Aktualizuje okno logów z kolejki."""
         try:
@@ -2487,7 +1493,8 @@ class BatchProcessorApp(QMainWindow):
                 f"Adres IP: {device.ip}\n"
                 f"Aktualny czas: {device.last_check}\n"
                 f"Strefa czasowa: {device.timezone}\n\n"
-                f"Wersja Firmware: {device.firmware_version}\n\n"
+                f"Wersja Firmware: {device.firmware_version}\n"
+                f"Sloty RAUC: {device.rauc_slots}\n\n"
                 f"System Services: {device.system_services_ok}"
             )
             
@@ -2586,6 +1593,44 @@ class BatchProcessorApp(QMainWindow):
             self.log(f"Błąd wysyłania System Services: {str(e)}")
             self.after(0, lambda: messagebox.showerror("Błąd", f"Błąd:\n{str(e)}"))
 
+    def manual_switch_slot(self):
+        """Ręczne przełączenie slotu RAUC (rollback bez wysyłania firmware)."""
+        ip = self.ip_entry.get()
+        password = self.password_entry.get()
+        if not ip or not password:
+            messagebox.showerror("Błąd", "Podaj IP i hasło!")
+            return
+        
+        response = messagebox.askyesno(
+            "Potwierdzenie",
+            "Czy przełączyć sterownik na drugi slot RAUC?\n"
+            "Sterownik zostanie zrestartowany!"
+        )
+        if not response:
+            return
+        
+        device = PLCDevice("Manual", ip, password)
+        threading.Thread(target=self.manual_switch_slot_worker, args=(device,), daemon=True).start()
+
+    def manual_switch_slot_worker(self, device):
+        """Worker dla przełączenia slotu RAUC."""
+        try:
+            self.status_bar.config(text="Przełączanie slotu RAUC...")
+            self.switch_rauc_slot_operation(device)
+            
+            self.status_bar.config(text="Gotowy")
+            self.after(0, lambda: messagebox.showinfo(
+                "Sukces",
+                f"Sterownik działa z drugiego slotu.\n"
+                f"Firmware: {device.firmware_version}\n"
+                f"Sloty: {device.rauc_slots}"
+            ))
+            
+        except Exception as e:
+            self.status_bar.config(text="Błąd")
+            self.log(f"Błąd przełączania slotu: {str(e)}")
+            self.after(0, lambda: messagebox.showerror("Błąd", f"Błąd:\n{str(e)}"))
+
     def manual_upload_firmware(self):
         """Ręczne wysłanie firmware (bez wykonania update)."""
         ip = self.ip_entry.get()
@@ -2619,7 +1664,7 @@ class BatchProcessorApp(QMainWindow):
             
             sftp = ssh.open_sftp()
             filename = os.path.basename(firmware_file)
-            remote_path = f"/opt/plcnext/{filename}"
+            remote_path = self.select_staging_path(ssh, firmware_file)
             
             file_size = os.path.getsize(firmware_file)
             self.log(f"Wysyłanie {filename} ({file_size/1024/1024:.1f} MB)...")
@@ -2696,22 +1741,34 @@ class BatchProcessorApp(QMainWindow):
             stdin.write(password + "\n")
             stdin.flush()
             
-            output = ""
+            parser = InstallProgressParser()
+            output_lines = []
             while True:
-                if stdout.channel.recv_ready():
-                    chunk = stdout.read(1024).decode(errors="ignore")
-                    output += chunk
+                while stdout.channel.recv_ready():
+                    chunk = stdout.channel.recv(4096).decode(errors="ignore")
+                    for line in parser.feed(chunk):
+                        output_lines.append(line)
+                        self.log(f"    {line}")
                 if stdout.channel.exit_status_ready():
                     break
                 time.sleep(0.5)
             
+            exit_code = stdout.channel.recv_exit_status()
+            while stdout.channel.recv_ready():
+                output_lines.extend(parser.feed(stdout.channel.recv(4096).decode(errors="ignore")))
+            output_lines.extend(parser.finish())
+            output = "\n".join(output_lines)
+            
             errors = stderr.read().decode(errors="ignore")
+            for line in errors.split('\n'):
+                parser.parse_line(line)
             
             ssh.close()
             time.sleep(1)
             
-            if "error" in output.lower() or "failed" in output.lower() or errors.strip():
-                raise Exception(f"Update zwrócił błąd:\n{output}\n{errors}")
+            failure = classify_install_failure(exit_code, parser.errors)
+            if failure:
+                raise failure
             
             self.status_bar.config(text="Gotowy")
             self.log(f"Aktualizacja zakończona - sterownik restartuje się")
@@ -2729,5 +1786,7 @@ class BatchProcessorApp(QMainWindow):
 
 
 if __name__ == "__main__":
+    # Procesy partii (spawn) w exe PyInstaller
+    multiprocessing.freeze_support()
     app = BatchProcessorApp()
     app.mainloop()
\ No newline at end of file
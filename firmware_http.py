@@ -0,0 +1,112 @@
+"""
+Lokalny serwer HTTP z plikami firmware dla instalacji strumieniowej (rauc install <url>).
+Osobny moduł - http.server ładowany dopiero, gdy instalacja HTTP jest włączona.
+"""
+import os
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import quote, unquote
+
+
+class FirmwareHttpHandler(BaseHTTPRequestHandler):
+    """Serwuje zarejestrowane pliki firmware z obsługą Range (rauc install <url> czyta bundle fragmentami)."""
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        firmware_path = self.server.files.get(unquote(self.path.split('?', 1)[0]).lstrip('/'))
+        if not firmware_path or not os.path.exists(firmware_path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(firmware_path)
+        start, end = 0, size - 1
+        range_header = self.headers.get("Range")
+        if range_header:
+            byte_range = self._parse_range(range_header, size)
+            if byte_range is None:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start, end = byte_range
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+
+        length = end - start + 1
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(length))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+
+        if send_body and length > 0:
+            with open(firmware_path, 'rb') as f:
+                # socket.sendfile -> os.sendfile (zero-copy) tam, gdzie jest dostępny
+                self.connection.sendfile(f, offset=start, count=length)
+            self.server.add_served(length)
+
+    @staticmethod
+    def _parse_range(header, size):
+        """Parsuje pojedynczy zakres 'bytes=a-b' / 'bytes=a-' / 'bytes=-n'. Zwraca (start, end) lub None."""
+        match = re.fullmatch(r'\s*bytes=(\d*)-(\d*)\s*', header)
+        if not match or (not match.group(1) and not match.group(2)):
+            return None
+        if not match.group(1):
+            suffix = int(match.group(2))
+            if suffix == 0:
+                return None
+            return max(0, size - suffix), size - 1
+        start = int(match.group(1))
+        end = int(match.group(2)) if match.group(2) else size - 1
+        if start >= size or end < start:
+            return None
+        return start, min(end, size - 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def log_error(self, format, *args):
+        if self.server.log:
+            self.server.log(f"  Serwer HTTP firmware: {format % args}")
+
+
+class FirmwareHttpServer(ThreadingHTTPServer):
+    """Lokalny serwer HTTP z firmware dla instalacji strumieniowej na wielu sterownikach jednocześnie."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port, log=None):
+        super().__init__(("0.0.0.0", port), FirmwareHttpHandler)
+        self.files = {}
+        self.log = log
+        self.served_bytes = 0
+        self._served_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def add_served(self, length):
+        """Licznik wysłanych bajtów - wywoływany z wątków obsługi żądań."""
+        with self._served_lock:
+            self.served_bytes += length
+
+    def add_file(self, firmware_path):
+        self.files[os.path.basename(firmware_path)] = firmware_path
+
+    def url_for(self, host_ip, firmware_path):
+        return f"http://{host_ip}:{self.server_address[1]}/{quote(os.path.basename(firmware_path))}"
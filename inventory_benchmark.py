@@ -0,0 +1,108 @@
+"""
+Pomiar wczytywania listy sterowników (każdy pomiar w świeżym interpreterze):
+dotychczasowy pełny load_workbook kontra strumieniowy read_only, CSV, JSON
+oraz ponowne wczytanie niezmienionej listy z cache (InventoryCache).
+Raportuje czas i szczytowe zużycie pamięci (RSS) procesu.
+
+    python inventory_benchmark.py [--rows 10000] [--runs 3]
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import json, sys, time
+path, mode = sys.argv[1], sys.argv[2]
+t0 = time.perf_counter()
+if mode == "legacy":
+    import openpyxl
+    from plc_engine import device_from_row
+    wb = openpyxl.load_workbook(path)
+    devices = [d for d in (device_from_row(row) for row in wb.active.iter_rows(min_row=2, values_only=True)) if d]
+    wb.close()
+elif mode == "cache":
+    from plc_engine import InventoryCache, load_inventory
+    devices = load_inventory(path, InventoryCache(sys.argv[3]))
+else:
+    from plc_engine import load_inventory
+    devices = load_inventory(path)
+elapsed = time.perf_counter() - t0
+try:
+    import resource
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+except ImportError:
+    peak_kb = None
+print(json.dumps({"seconds": elapsed, "devices": len(devices), "peak_kb": peak_kb}))
+"""
+
+CASES = [
+    ("legacy", "inventory.xlsx", "Excel - pełny load_workbook (dotychczas)"),
+    ("stream", "inventory.xlsx", "Excel - read_only, strumieniowo"),
+    ("stream", "inventory.csv", "CSV"),
+    ("stream", "inventory.json", "JSON"),
+    ("cache", "inventory.xlsx", "Excel - niezmieniony plik z cache"),
+]
+HEADERS = ["Nazwa Farmy", "IP", "Hasło", "Firmware", "Strefa czasowa", "System Services", "Ostatni odczyt"]
+
+
+def sample_rows(count):
+    for i in range(count):
+        yield [f"Farma {i:05d}", f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}", f"haslo{i}",
+               "2024.0.8 LTS (24.0.8.183)", "Europe/Warsaw", "OK", "2026-01-01 12:00:00"]
+
+
+def write_samples(directory, count):
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(HEADERS)
+    for row in sample_rows(count):
+        ws.append(row)
+    wb.save(os.path.join(directory, "inventory.xlsx"))
+
+    with open(os.path.join(directory, "inventory.csv"), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(HEADERS)
+        writer.writerows(sample_rows(count))
+
+    with open(os.path.join(directory, "inventory.json"), 'w', encoding='utf-8') as f:
+        json.dump([dict(zip(HEADERS, row)) for row in sample_rows(count)], f, ensure_ascii=False)
+
+
+def run_once(path, mode, cache_file):
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, path, mode, cache_file],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_samples(directory, args.rows)
+        cache_file = os.path.join(directory, "inventory_cache.sqlite")
+        run_once(os.path.join(directory, "inventory.xlsx"), "cache", cache_file)  # wypełnienie cache
+        print(f"Mediana z {args.runs} uruchomień, {args.rows} wierszy:")
+        for mode, filename, label in CASES:
+            runs = [run_once(os.path.join(directory, filename), mode, cache_file) for _ in range(args.runs)]
+            seconds = statistics.median(r["seconds"] for r in runs)
+            peak = [r["peak_kb"] for r in runs if r["peak_kb"] is not None]
+            peak_text = f"{statistics.median(peak) / 1024:7.1f} MB" if peak else "      -"
+            print(f"  {label:<45} {seconds * 1000:8.1f} ms  RSS {peak_text}  ({runs[-1]['devices']} sterowników)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Odczyt stanu wielu sterowników naraz w jednej pętli asyncio: sesje SSH (asyncssh)
+multipleksowane bez wątku na sterownik, komendy odczytu wysyłane równolegle osobnymi
+kanałami jednej sesji, z timeoutem na każdą komendę. Wyniki trafiają do tych samych pól
+PLCDevice i tych samych aktualizacji GUI/CLI co przy odczycie pulą wątków.
+
+Moduł importowany leniwie. asyncssh jest zależnością opcjonalną - bez niego
+BatchEngine odczytuje sterowniki pulą wątków (read_single_device).
+"""
+import asyncio
+import importlib.util
+import os
+from datetime import datetime
+
+from plc_engine import (
+    ARPVERSION_COMMAND,
+    PLC_DATE_COMMAND,
+    PLC_USER,
+    RAUC_STATUS_COMMAND,
+    SYSTEM_SERVICES_FILE,
+    SYSTEM_SERVICES_REMOTE_PATH,
+    TIME_SYNC_TOLERANCE,
+    parse_arpversion,
+    parse_rauc_status,
+    plc_time_offset,
+    resource_path,
+)
+
+COMMAND_TIMEOUT = 30  # s na jedną komendę odczytu
+
+
+def available():
+    """Czy zainstalowano asyncssh (bez importowania go)."""
+    return importlib.util.find_spec("asyncssh") is not None
+
+
+def classify_error(asyncssh, error):
+    """Przyczyna błędu odczytu (jak diagnose_ssh_error) i czy warto ponawiać: (opis, transient)."""
+    if isinstance(error, asyncssh.PermissionDenied):
+        return "Błędne hasło", False
+    if isinstance(error, ConnectionRefusedError):
+        return "Port zamknięty (firewall)", True
+    if isinstance(error, asyncio.TimeoutError):
+        return "Timeout połączenia", True
+    if isinstance(error, OSError):
+        return "Host nieosiągalny", True
+    return "Błąd połączenia SSH", True
+
+
+def load_local_services():
+    """Zawartość wzorcowego pliku System Services (None, gdy go brak)."""
+    local_file = resource_path(SYSTEM_SERVICES_FILE)
+    if not os.path.exists(local_file):
+        return None
+    with open(local_file, "rb") as f:
+        return f.read()
+
+
+async def read_device(asyncssh, engine, device, local_services):
+    """Jedna sesja SSH, wszystkie komendy odczytu naraz; wypełnia pola urządzenia."""
+    timeout = engine.ssh_timeout
+    async with asyncssh.connect(
+        device.ip,
+        username=PLC_USER,
+        password=device.password,
+        known_hosts=None,
+        client_keys=None,
+        agent_path=None,
+        connect_timeout=timeout,
+        login_timeout=timeout,
+        keepalive_interval=engine.ssh_keepalive,
+    ) as conn:
+        def run(command, encoding="utf-8"):
+            return conn.run(command, check=False, timeout=COMMAND_TIMEOUT, encoding=encoding, errors="ignore")
+
+        rauc, arpversion, timezone, plc_date, services = await asyncio.gather(
+            run(RAUC_STATUS_COMMAND),
+            run(ARPVERSION_COMMAND),
+            run("cat /etc/timezone"),
+            run(PLC_DATE_COMMAND),
+            run(f"cat {SYSTEM_SERVICES_REMOTE_PATH}", encoding=None),
+        )
+
+    rauc_status = parse_rauc_status(rauc.stdout)
+    device.plc_model = rauc_status.model
+    device.rauc_slots = rauc_status.summary()
+    device.firmware_version = parse_arpversion(arpversion.stdout.strip())
+    device.timezone = timezone.stdout.strip()
+
+    plc_time_str = plc_date.stdout.strip()
+    try:
+        _, _, time_diff = plc_time_offset(plc_time_str)
+        device.plc_time = plc_time_str
+        device.time_sync_error = time_diff >= TIME_SYNC_TOLERANCE
+    except ValueError:
+        device.plc_time = ""
+        device.time_sync_error = True
+
+    if local_services is None:
+        device.system_services_ok = "Brak lokalnego"
+    elif services.exit_status != 0:
+        stderr = services.stderr.decode(errors="ignore") if services.stderr else ""
+        device.system_services_ok = "Brak" if "No such file" in stderr else "Błąd"
+    else:
+        device.system_services_ok = "OK" if services.stdout == local_services else "Niezgodność"
+
+    device.last_check = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+async def read_with_retry(asyncssh, engine, device, local_services):
+    """Odczyt z ponawianiem błędów tymczasowych - (status, komunikat) jak process_single_device."""
+    loop = asyncio.get_running_loop()
+    device.status = "W trakcie"
+    device.error_log = ""
+    engine.after(0, lambda d=device: engine.update_device_row(d))
+
+    for attempt in range(1, engine.retry_attempts + 1):
+        if not engine.processing:
+            return "not_processed", "Operacja zatrzymana"
+        if attempt > 1:
+            await asyncio.sleep(engine.retry_delay)
+        try:
+            if device.install_state == "W toku":
+                # Stan instalacji w tle sprawdza zwykła ścieżka odczytu (rzadki przypadek)
+                await loop.run_in_executor(None, engine.read_single_device, device)
+            else:
+                await asyncio.wait_for(read_device(asyncssh, engine, device, local_services),
+                                       engine.ssh_timeout + 2 * COMMAND_TIMEOUT)
+        except Exception as e:
+            if isinstance(e, (asyncssh.Error, OSError, asyncio.TimeoutError)):
+                reason, transient = classify_error(asyncssh, e)
+                error_msg = f"{reason}: {str(e)}" if str(e) else reason
+            else:
+                transient = engine.is_transient_error(e)
+                error_msg = str(e)
+            device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {error_msg}"
+            if transient and attempt < engine.retry_attempts:
+                engine.log(f"[{device.name}] Błąd tymczasowy (próba {attempt}/{engine.retry_attempts}): {error_msg}")
+                continue
+            device.status = "Błąd"
+            engine.log(f"[{device.name}] Odczyt nieudany: {error_msg}")
+            engine.after(0, lambda d=device: engine.update_device_row(d))
+            return "failed", error_msg
+
+        device.status = "OK"
+        engine.log(f"[{device.name}] AXC F {device.plc_model}, firmware {device.firmware_version}, "
+                   f"czas {device.plc_time or '?'}, strefa {device.timezone or '?'}, "
+                   f"System Services {device.system_services_ok}")
+        engine.after(0, lambda d=device: engine.update_device_row(d))
+        return "success", ""
+
+    return "failed", device.error_log
+
+
+async def _read_all(engine, devices, concurrency, on_done):
+    """Stała liczba workerów pobiera kolejne sterowniki z jednego iteratora (jak plc_netscan._sweep)."""
+    import asyncssh
+
+    local_services = load_local_services()
+    pending = iter(devices)
+
+    async def worker():
+        for device in pending:
+            result_status, error_msg = await read_with_retry(asyncssh, engine, device, local_services)
+            on_done(device, result_status, error_msg)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(devices)))))
+
+
+def read_devices(engine, devices, concurrency, on_done):
+    """
+    Odczytuje sterowniki w jednej pętli zdarzeń (do concurrency sesji naraz).
+    on_done(device, status, komunikat) wywoływane po każdym sterowniku.
+    Blokuje wywołujący wątek - uruchamiać poza wątkiem GUI.
+    """
+    devices = list(devices)
+    if devices:
+        asyncio.run(_read_all(engine, devices, max(1, concurrency), on_done))
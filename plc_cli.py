@@ -0,0 +1,262 @@
+"""
+Operacje wsadowe na sterownikach PLC z wiersza poleceń (bez GUI, np. z crona).
+
+Przykłady:
+    python plc_cli.py sterowniki.xlsx --operation read --report raport.json
+    python plc_cli.py sterowniki.xlsx -o firmware --firmware update.raucb --workers 3 --yes --report raport.xlsx
+    python plc_cli.py --query below_version 24.0.8
+    python plc_cli.py --discover 10.20.0.0/20 --password haslo --report sterowniki.csv
+    python plc_cli.py --query failure_rate 2026-01-01
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+from datetime import datetime
+
+from plc_engine import (
+    DEFAULT_DISCOVERY_CONCURRENCY,
+    BatchEngine,
+    FleetStateStore,
+    autosave_path_for,
+    load_inventory,
+    write_report_csv,
+    write_report_json,
+    write_report_xlsx,
+)
+
+# Ustawienia przekazywane usłudze w tle (z opcji wiersza poleceń)
+DAEMON_SETTINGS = ["parallel_workers", "ssh_timeout", "retry_attempts", "retry_delay", "pause_between_devices",
+                   "upload_timeout", "update_command_timeout", "detached_update", "http_install",
+                   "skip_unreachable", "async_read", "async_read_concurrency", "predial_ahead"]
+OPERATIONS = ["read", "system_services", "timezone", "firmware", "all", "prestage", "activate", "switch_slot"]
+FIRMWARE_OPERATIONS = ("firmware", "all", "prestage", "activate")
+
+
+class HeadlessEngine(BatchEngine):
+    """Silnik wypisujący logi na stderr zamiast do okna logów."""
+
+    def __init__(self, quiet=False):
+        super().__init__()
+        self.quiet = quiet
+
+    def log(self, message):
+        if self.quiet:
+            return
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        for line in str(message).split("\n"):
+            print(f"[{timestamp}] {line}", file=sys.stderr, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="PLC Batch Updater - operacje wsadowe bez GUI",
+    )
+    parser.add_argument("inventory", nargs="?", help="Lista sterowników: Excel, CSV lub JSON (Nazwa, IP, Hasło)")
+    parser.add_argument("-o", "--operation", choices=OPERATIONS, default="read",
+                        help="Operacja wsadowa (domyślnie: read)")
+    parser.add_argument("--firmware", help="Plik firmware (.raucb) dla operacji firmware/all/prestage")
+    parser.add_argument("--firmware-catalog", help="Katalog z bundle firmware (wybór per model sterownika)")
+    parser.add_argument("-r", "--report", help="Plik raportu: .json, .xlsx lub .csv")
+    parser.add_argument("-w", "--workers", type=int, help="Liczba równoległych workerów (1-5) w każdym procesie")
+    parser.add_argument("-p", "--processes", type=int,
+                        help="Podział partii na procesy (duże floty, każdy proces z własnymi workerami)")
+    parser.add_argument("--ssh-timeout", type=int, help="Timeout połączenia SSH [s]")
+    parser.add_argument("--retry-attempts", type=int, help="Liczba prób na sterownik")
+    parser.add_argument("--retry-delay", type=int, help="Przerwa między próbami [s]")
+    parser.add_argument("--pause", type=int, help="Przerwa między kolejnymi sterownikami [s]")
+    parser.add_argument("--upload-timeout", type=int, help="Minimalny deadline uploadu [s]")
+    parser.add_argument("--update-timeout", type=int, help="Timeout komendy aktualizacji [s]")
+    parser.add_argument("--detached", action="store_true", help="Instalacja firmware w tle (update-axcf odłączony od SSH)")
+    parser.add_argument("--http-install", action="store_true", help="Instalacja strumieniowa z lokalnego serwera HTTP")
+    parser.add_argument("--skip-unreachable", action="store_true",
+                        help="Pomiń sterowniki bez portu 22 w pre-flight (domyślnie: na koniec kolejki)")
+    parser.add_argument("--predial", type=int,
+                        help="Z iloma kolejnymi sterownikami łączyć się w tle, zanim trafią do workerów (0 = wyłączone)")
+    parser.add_argument("--async-read", action="store_true",
+                        help="Odczyt (read) w jednej pętli asyncio - setki sesji SSH naraz (wymaga asyncssh)")
+    parser.add_argument("--async-concurrency", type=int, help="Liczba sesji SSH naraz przy --async-read")
+    parser.add_argument("-y", "--yes", action="store_true",
+                        help="Potwierdzenie operacji zmieniających sterowniki (wymagane poza 'read')")
+    parser.add_argument("--autosave", action="store_true",
+                        help="Dopisuj wyniki zakończonych sterowników na bieżąco do <lista>.autosave.jsonl")
+    parser.add_argument("-q", "--quiet", action="store_true", help="Bez logów na stderr")
+    parser.add_argument("--query", nargs="+", metavar=("NAZWA", "PARAMETR"),
+                        help="Zapytanie do historii floty zamiast operacji: "
+                             + ", ".join(FleetStateStore.QUERIES))
+    parser.add_argument("--discover", nargs="+", metavar="PODSIEĆ",
+                        help="Wykryj sterowniki w podsieciach/zakresach (port 22) i zapisz listę do --report")
+    parser.add_argument("--password", default="",
+                        help="Z --discover: hasło do identyfikacji wykrytych hostów (rauc status)")
+    parser.add_argument("--discovery-concurrency", type=int, default=DEFAULT_DISCOVERY_CONCURRENCY,
+                        help="Z --discover: liczba połączeń TCP naraz")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Wykonaj przez usługę w tle (plc_daemon.py) - ciepłe sesje SSH i cache")
+    parser.add_argument("--daemon-port", type=int, help="Port usługi w tle")
+    parser.add_argument("--max-age", type=int, default=0,
+                        help="Z --daemon: odczyt pomija sterowniki odczytane w ciągu N sekund")
+    return parser
+
+
+def apply_options(engine, args):
+    """Przenosi opcje z wiersza poleceń do ustawień silnika."""
+    if args.workers is not None:
+        engine.parallel_workers = max(1, min(5, args.workers))
+    if args.processes is not None:
+        engine.shard_processes = max(1, args.processes)
+    if args.ssh_timeout is not None:
+        engine.ssh_timeout = args.ssh_timeout
+    if args.retry_attempts is not None:
+        engine.retry_attempts = max(1, args.retry_attempts)
+    if args.retry_delay is not None:
+        engine.retry_delay = args.retry_delay
+    if args.pause is not None:
+        engine.pause_between_devices = args.pause
+    if args.upload_timeout is not None:
+        engine.upload_timeout = args.upload_timeout
+    if args.update_timeout is not None:
+        engine.update_command_timeout = args.update_timeout
+    engine.detached_update = args.detached
+    engine.http_install = args.http_install
+    engine.skip_unreachable = args.skip_unreachable
+    engine.async_read = args.async_read
+    if args.predial is not None:
+        engine.predial_ahead = max(0, args.predial)
+    if args.async_concurrency:
+        engine.async_read_concurrency = args.async_concurrency
+
+
+def write_report(engine, path, summary):
+    if path.lower().endswith(".xlsx"):
+        write_report_xlsx(engine.devices, path)
+    elif path.lower().endswith(".csv"):
+        write_report_csv(engine.devices, path)
+    else:
+        write_report_json(engine.devices, path, summary)
+
+
+def run_via_daemon(engine, args):
+    """Zleca operację usłudze w tle i wypisuje jej zdarzenia. Zwraca podsumowanie."""
+    from plc_daemon import DaemonClient, DEFAULT_DAEMON_PORT
+
+    client = DaemonClient(args.daemon_port or DEFAULT_DAEMON_PORT)
+    request = {
+        "operation": args.operation,
+        "devices": [{"name": d.name, "ip": d.ip, "password": d.password} for d in engine.devices],
+        "firmware": args.firmware or "",
+        "firmware_catalog": args.firmware_catalog or "",
+        "settings": {name: getattr(engine, name) for name in DAEMON_SETTINGS},
+        "max_age": args.max_age,
+    }
+    job = client.submit(request)
+    engine.log(f"Zadanie {job['id']} przyjęte przez usługę")
+    by_ip = {device.ip: device for device in engine.devices}
+    summary = None
+    stop_sent = False
+    engine.processing = True
+    for event in client.events(job["id"]):
+        if not engine.processing and not stop_sent:
+            client.post(f"/jobs/{job['id']}/stop")
+            stop_sent = True
+        if event["type"] == "log":
+            engine.log(event["message"])
+        elif event["type"] == "device" and event["device"]["ip"] in by_ip:
+            by_ip[event["device"]["ip"]].apply_state(event["device"])
+        elif event["type"] == "done":
+            summary = event["summary"]
+    if not summary or "error" in summary:
+        raise SystemExit(f"Zadanie zakończone błędem: {(summary or {}).get('error', '?')}")
+    return summary
+
+
+def run_discovery(parser, args):
+    """Wykrywa sterowniki w podsieciach i zapisuje listę (.csv/.xlsx zawierają hasło - do ponownego wczytania)."""
+    engine = HeadlessEngine(quiet=args.quiet)
+    apply_options(engine, args)
+    try:
+        engine.devices = engine.discover_devices(
+            args.discover, password=args.password, concurrency=max(1, args.discovery_concurrency)
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    for device in engine.devices:
+        print(f"{device.ip}\t{device.name}\t{device.plc_model}\t{device.status}\t{device.ssh_banner}")
+    if args.report:
+        write_report(engine, args.report, None)
+        engine.log(f"Zapisano listę do: {args.report}")
+    return 0
+
+
+def run_query(parser, args):
+    """Wypisuje wynik zapytania do historii floty jako tabelę (kolumny rozdzielone tabulatorem)."""
+    name, argument = args.query[0], " ".join(args.query[1:])
+    if name not in FleetStateStore.QUERIES:
+        parser.error(f"Nieznane zapytanie '{name}' - dostępne: {', '.join(FleetStateStore.QUERIES)}")
+    engine = HeadlessEngine(quiet=args.quiet)
+    try:
+        columns, rows = engine.fleet_state.query(name, argument)
+    except ValueError as e:
+        parser.error(str(e))
+    print("\t".join(columns))
+    for row in rows:
+        print("\t".join("" if value is None else str(value) for value in row))
+    engine.log(f"{len(rows)} wierszy")
+    return 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.query:
+        return run_query(parser, args)
+    if args.discover:
+        return run_discovery(parser, args)
+    if not args.inventory:
+        parser.error("Podaj listę sterowników lub --query")
+    if not os.path.exists(args.inventory):
+        parser.error(f"Plik nie istnieje: {args.inventory}")
+    if args.operation != "read" and not args.yes:
+        parser.error(f"Operacja '{args.operation}' zmienia sterowniki - potwierdź opcją --yes")
+
+    engine = HeadlessEngine(quiet=args.quiet)
+    apply_options(engine, args)
+
+    if args.firmware_catalog:
+        engine.load_firmware_catalog(args.firmware_catalog)
+    elif args.firmware:
+        engine.firmware_path.set(args.firmware)
+        engine.prefetch_firmware_digest(args.firmware)
+    if args.operation in FIRMWARE_OPERATIONS and not engine.has_firmware_source():
+        parser.error("Operacja wymaga --firmware lub --firmware-catalog")
+
+    engine.devices = load_inventory(args.inventory, engine.inventory_cache)
+    if args.autosave:
+        engine.autosave_path = autosave_path_for(args.inventory)
+    engine.log(f"Wczytano {len(engine.devices)} sterowników z {args.inventory}")
+    if not engine.devices:
+        return 0
+
+    def stop(_signum, _frame):
+        engine.log("Przerwanie - kończę rozpoczęte sterowniki, kolejne nie będą przetwarzane")
+        engine.processing = False
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    if args.daemon:
+        summary = run_via_daemon(engine, args)
+    else:
+        summary = engine.run_batch(args.operation)
+
+    if args.report:
+        write_report(engine, args.report, summary)
+        engine.log(f"Zapisano raport do: {args.report}")
+
+    return 0 if summary["failed"] == 0 and summary["not_processed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,571 @@
+"""
+Silnik jako usługa w tle: ciepłe sesje SSH do ostatnio używanych sterowników,
+cache sum firmware i stan sterowników w pamięci, lokalne API HTTP (127.0.0.1)
+z postępem strumieniowanym jako NDJSON. GUI, CLI i skrypty mogą korzystać
+z jednego, rozgrzanego procesu zamiast za każdym razem startować od zera.
+
+    python plc_daemon.py [--port 8650]
+
+API (nagłówek X-Auth-Token z pliku ~/.plc_batch_updater/daemon.token):
+    GET  /status                 stan usługi (sesje, zadanie w toku)
+    GET  /devices                ostatni znany stan sterowników
+    POST /jobs                   {"operation", "devices": [{name, ip, password}] | "inventory",
+                                  "firmware", "firmware_catalog", "settings": {...}, "max_age": s}
+    GET  /jobs/<id>              stan zadania i podsumowanie
+    GET  /jobs/<id>/events       strumień zdarzeń (log/device/progress/upload/done), jedna linia JSON na zdarzenie;
+                                 ?from=N wznawia od zdarzenia o numerze N (pole "seq")
+    POST /jobs/<id>/stop         zatrzymanie zadania
+"""
+import argparse
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import islice
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import parse_qs
+from urllib.request import Request, urlopen
+
+from plc_engine import (
+    APP_DATA_DIR,
+    BatchEngine,
+    PLCDevice,
+    SHARD_SETTINGS,
+    load_inventory,
+)
+
+DEFAULT_DAEMON_PORT = 8650
+DAEMON_TOKEN_FILE = os.path.join(APP_DATA_DIR, "daemon.token")
+DEVICE_STATE_FILE = os.path.join(APP_DATA_DIR, "device_state.json")
+SESSION_IDLE_TIMEOUT = 300  # s bez użycia, po których sesja SSH jest zamykana
+MAX_POOLED_SESSIONS = 64
+MAX_JOB_EVENTS = 5000  # zdarzeń zadania w buforze (starsze odrzucane, numeracja "seq" ciągła)
+JOB_RETENTION = 3600  # s, po których zakończone zadanie jest usuwane
+MAX_FINISHED_JOBS = 50
+# Pola stanu sterownika przechowywane między zadaniami (bez hasła)
+DEVICE_FACT_FIELDS = [
+    "name", "ip", "firmware_version", "timezone", "system_services_ok", "last_check", "last_update",
+    "status", "error_log", "plc_model", "plc_time", "time_sync_error", "install_state", "install_detail",
+    "staged_digest", "staged_path", "rauc_slots",
+]
+
+
+def load_daemon_token(create=False):
+    """Token API z pliku (tworzony przy starcie usługi, tylko dla właściciela)."""
+    try:
+        with open(DAEMON_TOKEN_FILE, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        if not create:
+            raise
+    os.makedirs(APP_DATA_DIR, exist_ok=True)
+    token = secrets.token_hex(16)
+    fd = os.open(DAEMON_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(token)
+    return token
+
+
+class SessionPool:
+    """
+    Otwarte sesje SSH+SFTP per IP. Sesja wypożyczana na czas operacji na wyłączność;
+    po błędzie zamykana, po SESSION_IDLE_TIMEOUT bez użycia zamykana przez wątek sprzątający.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._sessions = {}
+        threading.Thread(target=self._reap_idle, daemon=True).start()
+
+    def acquire(self, device):
+        with self._lock:
+            entry = self._sessions.get(device.ip)
+            if entry and not entry["in_use"] and entry["password"] == device.password and self._alive(entry):
+                entry["in_use"] = True
+                entry["uses"] += 1
+                return entry["ssh"], entry["sftp"], True
+            if entry and not entry["in_use"]:
+                self._close(self._sessions.pop(device.ip))
+
+        ssh = self.engine.create_ssh_client(device.ip, device.password)
+        try:
+            sftp = ssh.open_sftp()
+        except Exception:
+            ssh.close()
+            raise
+        with self._lock:
+            if device.ip not in self._sessions:
+                self._evict_if_full()
+                self._sessions[device.ip] = {
+                    "ssh": ssh, "sftp": sftp, "password": device.password,
+                    "in_use": True, "last_used": time.time(), "uses": 1,
+                }
+        return ssh, sftp, False
+
+    def release(self, device, ssh, reusable):
+        with self._lock:
+            entry = self._sessions.get(device.ip)
+            if entry and entry["ssh"] is ssh:
+                if reusable:
+                    entry["in_use"] = False
+                    entry["last_used"] = time.time()
+                    return
+                self._sessions.pop(device.ip)
+                self._close(entry)
+                return
+        # Sesja spoza puli (równoległe użycie tego samego IP)
+        try:
+            ssh.close()
+        except Exception:
+            pass
+
+    def summary(self):
+        with self._lock:
+            return [
+                {"ip": ip, "in_use": entry["in_use"], "uses": entry["uses"],
+                 "idle_s": round(time.time() - entry["last_used"], 1)}
+                for ip, entry in self._sessions.items()
+            ]
+
+    def close_all(self):
+        with self._lock:
+            for entry in self._sessions.values():
+                self._close(entry)
+            self._sessions.clear()
+
+    @staticmethod
+    def _alive(entry):
+        transport = entry["ssh"].get_transport()
+        return bool(transport and transport.is_active())
+
+    @staticmethod
+    def _close(entry):
+        for resource in (entry["sftp"], entry["ssh"]):
+            try:
+                resource.close()
+            except Exception:
+                pass
+
+    def _evict_if_full(self):
+        idle = sorted((entry["last_used"], ip) for ip, entry in self._sessions.items() if not entry["in_use"])
+        while len(self._sessions) >= MAX_POOLED_SESSIONS and idle:
+            _, ip = idle.pop(0)
+            self._close(self._sessions.pop(ip))
+
+    def _reap_idle(self):
+        while True:
+            time.sleep(30)
+            now = time.time()
+            with self._lock:
+                for ip in [ip for ip, entry in self._sessions.items()
+                           if not entry["in_use"] and now - entry["last_used"] > SESSION_IDLE_TIMEOUT]:
+                    self._close(self._sessions.pop(ip))
+
+
+class Job:
+    """
+    Zadanie wsadowe usługi z buforem ostatnich MAX_JOB_EVENTS zdarzeń dla subskrybentów
+    strumienia. Zdarzenia numerowane polem "seq" - klient wznawia strumień od numeru.
+    """
+    def __init__(self, job_id, operation, devices):
+        self.id = job_id
+        self.operation = operation
+        self.devices = devices
+        self.state = "queued"
+        self.summary = None
+        self.created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.finished_at = None
+        self.events = deque(maxlen=MAX_JOB_EVENTS)
+        self.next_seq = 0
+        self.condition = threading.Condition()
+
+    def emit(self, event):
+        with self.condition:
+            self._append(event)
+            self.condition.notify_all()
+
+    def finish(self, state, summary=None):
+        with self.condition:
+            self.state = state
+            self.summary = summary
+            self.finished_at = time.time()
+            self._append({"type": "done", "state": state, "summary": summary})
+            self.condition.notify_all()
+
+    def _append(self, event):
+        self.events.append(dict(event, seq=self.next_seq))
+        self.next_seq += 1
+
+    def stream(self, start=0):
+        """
+        Zdarzenia od numeru start aż do zakończenia zadania. Gdy część zdarzeń wypadła
+        już z bufora, najpierw zdarzenie 'gap' z liczbą pominiętych.
+        """
+        index = start
+        while True:
+            with self.condition:
+                while index >= self.next_seq and self.state in ("queued", "running"):
+                    self.condition.wait(timeout=15)
+                    if index >= self.next_seq:
+                        break
+                first = self.next_seq - len(self.events)
+                batch = list(islice(self.events, max(0, index - first), None))
+                finished = self.state not in ("queued", "running")
+            if index < first:
+                yield {"type": "gap", "missed": first - index}
+            for event in batch:
+                yield event
+            index = max(index, first) + len(batch)
+            if finished and index >= self.next_seq:
+                return
+            if not batch:
+                yield {"type": "heartbeat"}
+
+    def describe(self):
+        return {"id": self.id, "operation": self.operation, "state": self.state,
+                "created": self.created, "devices": len(self.devices), "summary": self.summary}
+
+
+class DaemonEngine(BatchEngine):
+    """
+    Silnik usługi: sesje SSH z puli zamiast nowego połączenia na każdą operację,
+    stan sterowników zachowywany między zadaniami, zdarzenia do bieżącego zadania.
+    """
+    UPLOAD_EVENT_INTERVAL = 0.25
+
+    def __init__(self):
+        super().__init__()
+        self.sessions = SessionPool(self)
+        self.facts = self._load_facts()
+        self.facts_lock = threading.Lock()
+        self.job = None
+        self.max_age = 0
+        self._last_upload_event = 0.0
+
+    # --- zdarzenia ---
+
+    def emit(self, event):
+        job = self.job
+        if job:
+            job.emit(event)
+
+    def log(self, message):
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        print(f"[{timestamp}] {message}", flush=True)
+        self.emit({"type": "log", "time": timestamp, "message": message})
+
+    def update_device_row(self, device):
+        self.emit({"type": "device", "device": self.device_facts(device)})
+
+    def show_batch_progress(self, percent, text, color):
+        self.emit({"type": "progress", "percent": round(percent, 1), "text": text})
+
+    def show_upload_progress(self, percent, text, color):
+        now = time.time()
+        if percent not in (0, 100) and now - self._last_upload_event < self.UPLOAD_EVENT_INTERVAL:
+            return
+        self._last_upload_event = now
+        self.emit({"type": "upload", "percent": round(percent, 1), "text": text})
+
+    # --- ciepłe sesje ---
+
+    @contextmanager
+    def ssh_connection(self, device):
+        """Jak BatchEngine.ssh_connection, ale sesja wraca do puli zamiast być zamykana."""
+        ssh, sftp, reused = self.sessions.acquire(device)
+        self.log(f"  {'Sesja SSH z puli' if reused else 'Nowa sesja SSH'}: {device.ip}")
+        reusable = False
+        try:
+            yield ssh, sftp
+            reusable = True
+        except Exception as e:
+            self.log(f"  Błąd połączenia SSH: {str(e)}")
+            raise
+        finally:
+            self.sessions.release(device, ssh, reusable)
+
+    # --- stan sterowników ---
+
+    @staticmethod
+    def device_facts(device):
+        return {field: getattr(device, field) for field in DEVICE_FACT_FIELDS}
+
+    def read_single_device(self, device):
+        """Odczyt z pominięciem sterowników odczytanych w ciągu max_age sekund."""
+        if self.max_age > 0:
+            with self.facts_lock:
+                cached = self.facts.get(device.ip)
+            # Wpis zapisany przed dodaniem pola do DEVICE_FACT_FIELDS - jak brak w cache
+            if (cached and all(field in cached for field in DEVICE_FACT_FIELDS)
+                    and time.time() - cached.get("read_at", 0) <= self.max_age):
+                for field in DEVICE_FACT_FIELDS:
+                    if field not in ("name", "ip"):
+                        setattr(device, field, cached[field])
+                self.log(f"  Dane z cache usługi (odczyt {int(time.time() - cached['read_at'])} s temu)")
+                self.after(0, lambda d=device: self.update_device_row(d))
+                return
+        super().read_single_device(device)
+        with self.facts_lock:
+            self.facts[device.ip] = dict(self.device_facts(device), read_at=time.time())
+
+    def remember_devices(self, devices):
+        with self.facts_lock:
+            for device in devices:
+                previous = self.facts.get(device.ip, {})
+                self.facts[device.ip] = dict(self.device_facts(device), read_at=previous.get("read_at", 0))
+            self._save_facts()
+
+    def _load_facts(self):
+        try:
+            with open(DEVICE_STATE_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_facts(self):
+        try:
+            os.makedirs(APP_DATA_DIR, exist_ok=True)
+            tmp_path = f"{DEVICE_STATE_FILE}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.facts, f, ensure_ascii=False)
+            os.replace(tmp_path, DEVICE_STATE_FILE)
+        except OSError:
+            pass
+
+
+class PLCDaemon:
+    """Kolejka zadań usługi (jedno zadanie naraz) nad wspólnym DaemonEngine."""
+    def __init__(self):
+        self.engine = DaemonEngine()
+        # Ustawienia startowe - każde zadanie zaczyna od nich, nadpisując tylko podane w żądaniu
+        self.default_settings = {name: getattr(self.engine, name) for name in SHARD_SETTINGS}
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def submit(self, request):
+        operation = request.get("operation", "read")
+        if request.get("inventory"):
+            devices = load_inventory(request["inventory"], self.engine.inventory_cache)
+        else:
+            devices = [PLCDevice(d["name"], d["ip"], d.get("password", "")) for d in request.get("devices", [])]
+        if not devices:
+            raise ValueError("Brak sterowników w zadaniu")
+
+        with self.lock:
+            if self.engine.job and self.engine.job.state in ("queued", "running"):
+                raise RuntimeError(f"Zadanie {self.engine.job.id} w toku")
+            self._prune_jobs()
+            job = Job(secrets.token_hex(4), operation, devices)
+            self.jobs[job.id] = job
+            self.engine.job = job
+
+        engine = self.engine
+        settings = dict(self.default_settings)
+        settings.update((name, value) for name, value in request.get("settings", {}).items()
+                        if name in SHARD_SETTINGS)
+        for name, value in settings.items():
+            setattr(engine, name, value)
+        engine.max_age = float(request.get("max_age", 0) or 0)
+        if request.get("firmware_catalog"):
+            engine.load_firmware_catalog(request["firmware_catalog"])
+        else:
+            engine.firmware_catalog = None
+            engine.firmware_path.set(request.get("firmware", "") or "")
+            if engine.firmware_path.get():
+                engine.prefetch_firmware_digest(engine.firmware_path.get())
+        engine.devices = devices
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job
+
+    def _run(self, job):
+        job.state = "running"
+        try:
+            summary = self.engine.run_batch(job.operation)
+            self.engine.remember_devices(job.devices)
+            job.finish("finished", summary)
+        except Exception as e:
+            self.engine.log(f"Błąd zadania: {str(e)}")
+            job.finish("error", {"error": str(e)})
+
+    def _prune_jobs(self):
+        """Usuwa zakończone zadania starsze niż JOB_RETENTION i ponad MAX_FINISHED_JOBS najnowszych."""
+        now = time.time()
+        finished = sorted((job.finished_at, job_id) for job_id, job in self.jobs.items() if job.finished_at)
+        for index, (finished_at, job_id) in enumerate(finished):
+            if now - finished_at > JOB_RETENTION or index < len(finished) - MAX_FINISHED_JOBS:
+                del self.jobs[job_id]
+
+    def get_job(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def stop(self, job_id):
+        job = self.get_job(job_id)
+        if job and self.engine.job is job:
+            self.engine.processing = False
+        return job
+
+    def status(self):
+        job = self.engine.job
+        return {
+            "uptime_s": round(time.time() - self.started),
+            "current_job": job.describe() if job else None,
+            "sessions": self.engine.sessions.summary(),
+            "known_devices": len(self.engine.facts),
+            "cached_digests": len(self.engine.digest_cache),
+        }
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """Lokalne API usługi (JSON / NDJSON)."""
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        daemon = self.server.plc_daemon
+        path, _, query = self.path.partition('?')
+        parts = [part for part in path.split('/') if part]
+        job = daemon.get_job(parts[1]) if len(parts) in (2, 3) and parts[0] == "jobs" else None
+        if parts == ["status"]:
+            self._send_json(daemon.status())
+        elif parts == ["devices"]:
+            with daemon.engine.facts_lock:
+                self._send_json(list(daemon.engine.facts.values()))
+        elif job and len(parts) == 2:
+            self._send_json(job.describe())
+        elif job and parts[2] == "events":
+            try:
+                start = int(parse_qs(query).get("from", ["0"])[0])
+            except ValueError:
+                self._send_json({"error": "invalid from"}, status=400)
+                return
+            self._stream(job, start)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        daemon = self.server.plc_daemon
+        parts = [part for part in self.path.split('?', 1)[0].split('/') if part]
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json({"error": "invalid JSON"}, status=400)
+            return
+        if parts == ["jobs"]:
+            try:
+                job = daemon.submit(body)
+            except RuntimeError as e:
+                self._send_json({"error": str(e)}, status=409)
+                return
+            except (ValueError, KeyError, OSError) as e:
+                self._send_json({"error": str(e)}, status=400)
+                return
+            self._send_json(job.describe(), status=201)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "stop":
+            job = daemon.stop(parts[1])
+            if job:
+                self._send_json(job.describe())
+            else:
+                self._send_json({"error": "not found"}, status=404)
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def _authorized(self):
+        if secrets.compare_digest(self.headers.get("X-Auth-Token", ""), self.server.token):
+            return True
+        self._send_json({"error": "unauthorized"}, status=401)
+        return False
+
+    def _send_json(self, payload, status=200):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, job, start=0):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for event in job.stream(start):
+                self.wfile.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DaemonServer(ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port, daemon, token):
+        super().__init__(("127.0.0.1", port), DaemonRequestHandler)
+        self.plc_daemon = daemon
+        self.token = token
+
+
+class DaemonClient:
+    """Klient lokalnego API usługi (dla CLI i skryptów)."""
+    def __init__(self, port=DEFAULT_DAEMON_PORT, token=None):
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.token = token or load_daemon_token()
+
+    def _request(self, method, path, payload=None, timeout=30):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        request = Request(self.base_url + path, data=data, method=method,
+                          headers={"X-Auth-Token": self.token, "Content-Type": "application/json"})
+        return urlopen(request, timeout=timeout)
+
+    def get(self, path):
+        with self._request("GET", path) as response:
+            return json.loads(response.read())
+
+    def post(self, path, payload=None):
+        with self._request("POST", path, payload or {}) as response:
+            return json.loads(response.read())
+
+    def submit(self, request):
+        return self.post("/jobs", request)
+
+    def events(self, job_id, start=0):
+        """Generator zdarzeń zadania od numeru start (kończy się po zdarzeniu 'done')."""
+        with self._request("GET", f"/jobs/{job_id}/events?from={start}", timeout=None) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PLC Batch Updater - usługa w tle z lokalnym API")
+    parser.add_argument("--port", type=int, default=DEFAULT_DAEMON_PORT)
+    args = parser.parse_args(argv)
+
+    token = load_daemon_token(create=True)
+    daemon = PLCDaemon()
+    server = DaemonServer(args.port, daemon, token)
+    print(f"Usługa PLC nasłuchuje na 127.0.0.1:{args.port} (token: {DAEMON_TOKEN_FILE})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        daemon.engine.sessions.close_all()
+
+
+if __name__ == "__main__":
+    main()
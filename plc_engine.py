@@ -0,0 +1,4377 @@
+"""
+Silnik operacji wsadowych na sterownikach PLC (SSH/SFTP, RAUC, firmware) bez zależności od GUI.
+Używany przez aplikację Qt (FirmwareUpdater_listaExcel.py) i wiersz poleceń (plc_cli.py).
+Ciężkie moduły (paramiko, openpyxl, pytz) ładowane są dopiero przy pierwszym użyciu.
+"""
+import threading
+import os
+import re
+import hashlib
+import json
+import mmap
+import time
+import statistics
+import heapq
+import socket
+import subprocess
+from datetime import datetime
+import sys
+import queue
+import multiprocessing
+import configparser
+import sqlite3
+import zlib
+from collections import deque
+from contextlib import closing, contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait, Future
+
+# Import paramiko trwa kilkaset ms (cryptography) - ładowany przy pierwszym połączeniu
+paramiko = None
+
+
+def load_paramiko():
+    """Zwraca moduł paramiko, importując go przy pierwszym wywołaniu."""
+    global paramiko
+    if paramiko is None:
+        import paramiko as paramiko_module
+        paramiko = paramiko_module
+    return paramiko
+
+
+# Konfiguracja hardcoded (nie zmienia się)
+PLC_USER = "admin"
+ROOT_PASS = "12345"
+TIMEZONE = "Europe/Warsaw"
+SYSTEM_SERVICES_FILE = "Default.scm.config"
+SYSTEM_SERVICES_REMOTE_PATH = "/opt/plcnext/config/System/Scm/Default.scm.config"
+
+# Domyślne wartości (będą w GUI)
+DEFAULT_SSH_TIMEOUT = 30
+DEFAULT_SSH_KEEPALIVE = 30
+DEFAULT_RETRY_ATTEMPTS = 3
+DEFAULT_RETRY_DELAY = 10
+DEFAULT_PAUSE_BETWEEN = 5
+DEFAULT_UPLOAD_TIMEOUT = 120  # minimalny deadline uploadu; właściwy liczony z przepustowości
+DEFAULT_UPLOAD_SAFETY_FACTOR = 3  # deadline = rozmiar / przepustowość * współczynnik
+DEFAULT_STALL_WINDOW = 30  # s, okno pomiaru przepustowości
+DEFAULT_STALL_MIN_RATE = 16  # KB/s, poniżej tego w całym oknie = transfer zawieszony
+DEFAULT_UPDATE_COMMAND_TIMEOUT = 600  # 10 minut dla update-axcf
+DEFAULT_IDLE_TIMEOUT = 60
+DEFAULT_POST_REBOOT_WAIT = 60
+DEFAULT_POST_REBOOT_TIMEOUT = 300
+DEFAULT_POST_REBOOT_POLL = 5
+DEFAULT_PARALLEL_WORKERS = 1
+DEFAULT_DETACHED_UPDATE = False
+DEFAULT_DETACHED_POLL = 15
+DEFAULT_HTTP_INSTALL = False
+DEFAULT_HTTP_INSTALL_PORT = 8642
+DEFAULT_PRESTAGE_RATE_LIMIT = 0  # KB/s, 0 = bez limitu
+DEFAULT_CLEANUP_STALE_BUNDLES = False
+DEFAULT_SHARD_PROCESSES = 1  # >1 = partia dzielona na procesy (każdy z własnymi workerami)
+DEFAULT_DISCOVERY_TIMEOUT = 1.5  # s na połączenie TCP przy wykrywaniu w podsieci
+DEFAULT_DISCOVERY_CONCURRENCY = 512  # połączeń TCP naraz w pętli zdarzeń
+DISCOVERY_PROBE_WORKERS = 16  # równoległe logowania SSH przy identyfikacji wykrytych hostów
+DEFAULT_SKIP_UNREACHABLE = False  # True = sterowniki bez portu 22 w pre-flight pomijane, False = na koniec kolejki
+PREFLIGHT_TIMEOUT = 3.0  # s na połączenie TCP w pre-flight partii
+REACHABILITY_TTL = 120  # s ważności wyniku sprawdzenia portu 22 (pre-flight / diagnostyka)
+DIAGNOSIS_TTL = 30  # s ważności diagnozy błędu SSH dla pary (IP, klasa błędu)
+DEFAULT_PREDIAL_AHEAD = 2  # sterowników z kolejki, z którymi łączymy się w tle (0 = wyłączone)
+DEFAULT_ASYNC_READ = False  # True = odczyt w jednej pętli asyncio (wymaga asyncssh)
+DEFAULT_ASYNC_READ_CONCURRENCY = 256  # sesji SSH naraz przy odczycie asynchronicznym
+TIME_SYNC_TOLERANCE = 60  # s różnicy czasu sterownika uznawanej za synchronizację
+RAUC_STATUS_COMMAND = "rauc status --detailed --output-format=shell 2>/dev/null || rauc status --detailed 2>/dev/null || rauc status"
+ARPVERSION_COMMAND = "grep Arpversion /etc/plcnext/arpversion"
+PLC_DATE_COMMAND = "date '+%Y-%m-%d %H:%M:%S'"
+
+# Przepustowość zakładana, gdy brak pomiaru dla sterownika i floty (bajty/s)
+ASSUMED_UPLOAD_THROUGHPUT = 512 * 1024
+# Po ilu sekundach transferu deadline liczony jest z bieżącego pomiaru
+UPLOAD_RATE_WARMUP = 5
+
+# Planowanie partii: wartości przyjmowane, gdy brak profilu sieci sterownika
+ASSUMED_HANDSHAKE_MS = 1500
+ASSUMED_RTT_MS = 200
+ASSUMED_INSTALL_SECONDS = 300
+ESTIMATED_COMMANDS_PER_JOB = 20
+PROFILE_SMOOTHING = 0.3  # waga nowego pomiaru (średnia wykładnicza)
+PROFILE_FLUSH_INTERVAL = 30  # s między zapisami profili sieci na dysk w trakcie partii
+RTT_PROBE_TIMEOUT = 5  # s oczekiwania na wynik komendy pomiaru RTT
+RTT_SAMPLE_INTERVAL = 3600  # s - RTT sterownika mierzony ponownie dopiero, gdy profil starszy
+
+# Instalacja firmware w tle (update-axcf odłączony od sesji SSH)
+DETACHED_UPDATE_LOG = "/opt/plcnext/update-axcf.log"
+DETACHED_PID_FILE = "/opt/plcnext/update-axcf.pid"
+DETACHED_EXIT_MARKER = "__UPDATE_EXIT__:"
+DETACHED_RUNNING_MARKER = "__UPDATE_RUNNING__"
+
+# Katalogi na sterowniku, w których można przygotować bundle (pierwszy = domyślny dla update-axcf)
+FIRMWARE_STAGING_PATHS = ["/opt/plcnext", "/media/rfs/externalsd"]
+STAGING_SPACE_MARGIN = 16 * 1024 * 1024
+
+# Lokalne dane aplikacji (cache sum kontrolnych itp.)
+APP_DATA_DIR = os.path.join(os.path.expanduser("~"), ".plc_batch_updater")
+DIGEST_CACHE_FILE = os.path.join(APP_DATA_DIR, "firmware_digests.json")
+DIGEST_BLOCK_SIZE = 4 * 1024 * 1024
+NETWORK_PROFILES_FILE = os.path.join(APP_DATA_DIR, "network_profiles.json")
+INVENTORY_CACHE_FILE = os.path.join(APP_DATA_DIR, "inventory_cache.sqlite")
+FLEET_STATE_FILE = os.path.join(APP_DATA_DIR, "fleet_state.sqlite")
+
+def resource_path(relative_path):
+    """Zwraca absolutną ścieżkę do pliku, działa również w exe PyInstaller."""
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+def clean_ip_address(text):
+    """
+    Ekstraktuje adres IP z różnych formatów:
+    - https://192.168.1.100/config → 192.168.1.100
+    - 192.168.1.100:8080 → 192.168.1.100
+    - [192.168.1.100] → 192.168.1.100
+    """
+    import re
+    if not text:
+        return ""
+    
+    # Znajdź wzorzec IP (4 liczby oddzielone kropkami)
+    match = re.search(r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})', text)
+    if match:
+        ip = match.group(1)
+        # Walidacja zakresów (0-255)
+        try:
+            parts = ip.split('.')
+            if all(0 <= int(p) <= 255 for p in parts):
+                return ip
+        except:
+            pass
+    
+    return text.strip()  # Fallback - zwróć oczyszczony tekst
+
+class FatalUpdateError(Exception):
+    """Błąd krytyczny - operacja nie powinna być ponawiana (bez retry)."""
+    pass
+
+class InsufficientSpaceError(FatalUpdateError):
+    """Za mało miejsca na sterowniku na przygotowanie bundle w żadnym ze skonfigurowanych katalogów."""
+    pass
+
+class InstallFailedError(FatalUpdateError):
+    """Instalacja firmware zakończona błędem zgłoszonym przez update-axcf / RAUC."""
+    def __init__(self, message, exit_code=None):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+class BundleIncompatibleError(InstallFailedError):
+    """RAUC odrzucił bundle - niezgodny 'compatible' sterownika."""
+    pass
+
+class BundleVerificationError(InstallFailedError):
+    """Bundle uszkodzony lub błędny podpis / weryfikacja."""
+    pass
+
+class InstallNoSpaceError(InstallFailedError):
+    """Brak miejsca na sterowniku podczas instalacji."""
+    pass
+
+INSTALL_PERCENT_RE = re.compile(r'(\d{1,3})\s*%')
+# Strukturalne linie 'rauc install': postęp "NN% Krok [done.|failed.]", "LastError: ..." i wynik końcowy
+RAUC_PROGRESS_RE = re.compile(r'^(\d{1,3})%\s+(.*)$')
+RAUC_LAST_ERROR_RE = re.compile(r'^LastError:\s*(.*)$')
+RAUC_RESULT_RE = re.compile(r'^Installing\s+`?(.*?)`?\s+(succeeded|failed)\b')
+# Kod wyjścia paramiko, gdy kanał zamknięto bez statusu (restart sterownika w trakcie update-axcf)
+EXIT_CODE_DISCONNECTED = -1
+INSTALL_STEP_KEYWORDS = ("installing", "updating", "checking", "copying", "writing", "verifying", "reboot", "done", "success")
+INSTALL_ERROR_TYPES = [
+    (("compatible",), BundleIncompatibleError),
+    (("signature", "verification failed", "verify", "invalid bundle", "squashfs"), BundleVerificationError),
+    (("no space left", "not enough space"), InstallNoSpaceError),
+]
+
+def classify_install_failure(exit_code, parser, reboots_itself=False):
+    """
+    Mapuje kod wyjścia i strukturalne linie RAUC (InstallProgressParser) na typowany wyjątek.
+    Błąd: wynik/krok RAUC 'failed', LastError albo niezerowy kod wyjścia bez wyniku 'succeeded'.
+    Bez błędu: kod 0, kanał zamknięty bez statusu (restart przez update-axcf), timeout
+    oczekiwania (None) lub - dla update-axcf (reboots_itself) - dowolny niezerowy kod bez błędu
+    RAUC (proces bywa zabijany przy zamykaniu systemu). O wyniku rozstrzyga wtedy weryfikacja
+    wersji po restarcie (BatchEngine.verify_installed_version).
+    Zwraca instancję InstallFailedError lub None.
+    """
+    errors = parser.errors
+    if not errors and parser.result != "failed":
+        if exit_code in (0, None, EXIT_CODE_DISCONNECTED) or parser.result == "succeeded" or reboots_itself:
+            return None
+        return InstallFailedError(
+            f"Instalacja nieudana (exit: {exit_code}) bez komunikatu RAUC: {parser.step[:200] or 'brak wyjścia'}",
+            exit_code
+        )
+    text = "\n".join(errors) or f"Instalacja RAUC zakończona niepowodzeniem ({parser.step})"
+    lowered = text.lower()
+    message = f"Instalacja nieudana (exit: {exit_code}): {text[:300]}"
+    for keywords, error_cls in INSTALL_ERROR_TYPES:
+        if any(keyword in lowered for keyword in keywords):
+            return error_cls(message, exit_code)
+    return InstallFailedError(message, exit_code)
+
+class InstallProgressParser:
+    """
+    Przyrostowy parser wyjścia update-axcf / rauc install.
+    Przetwarza tylko nowe fragmenty (trzyma jedynie niedokończoną ostatnią linię),
+    wyciąga procent, nazwę kroku, błędy ze strukturalnych linii RAUC (krok 'failed.',
+    'LastError:') i wynik końcowy ('Installing ... succeeded/failed') oraz szacuje czas do końca.
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.finished = None
+        self.percent = None
+        self.step = ""
+        self.errors = []
+        self.result = None
+        self._partial = ""
+
+    def feed(self, chunk):
+        """Dodaje fragment wyjścia. Zwraca listę linii, które zmieniły postęp/krok lub są błędami."""
+        data = self._partial + chunk.replace('\r', '\n')
+        lines = data.split('\n')
+        self._partial = lines.pop()
+        return [line.strip() for line in lines if self.parse_line(line)]
+
+    def finish(self):
+        """Przetwarza pozostałą niedokończoną linię po zakończeniu procesu."""
+        self.finished = time.time()
+        events = [self._partial.strip()] if self.parse_line(self._partial) else []
+        self._partial = ""
+        return events
+
+    def parse_line(self, line):
+        line = line.strip()
+        if not line:
+            return False
+
+        match = RAUC_LAST_ERROR_RE.match(line)
+        if match:
+            self.errors.append(match.group(1) or line)
+            return True
+
+        match = RAUC_RESULT_RE.match(line)
+        if match:
+            self.result = match.group(2)
+            return True
+
+        match = RAUC_PROGRESS_RE.match(line)
+        if match and match.group(2).rstrip().endswith("failed."):
+            self.errors.append(line)
+            self.percent = min(100, int(match.group(1)))
+            return True
+
+        lowered = line.lower()
+        match = INSTALL_PERCENT_RE.search(line)
+        if match:
+            percent = min(100, int(match.group(1)))
+            step = (line[:match.start()] + line[match.end():]).strip(" :-") or self.step
+            changed = percent != self.percent or step != self.step
+            self.percent = percent
+            self.step = step
+            return changed
+
+        if any(keyword in lowered for keyword in INSTALL_STEP_KEYWORDS) and line != self.step:
+            self.step = line
+            return True
+        return False
+
+    def describe(self):
+        if self.percent is None:
+            return self.step[:40]
+        return f"{self.percent}% {self.step}"[:40]
+
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def eta_seconds(self):
+        """Szacowany pozostały czas instalacji (liniowo z tempa procentów) lub None."""
+        if not self.percent or self.percent >= 100 or self.finished:
+            return None
+        return self.elapsed() * (100 - self.percent) / self.percent
+
+
+class RaucSlot:
+    """Jeden slot z 'rauc status' (stan, bootname, status bootowania, wersja bundle)."""
+    def __init__(self, name):
+        self.name = name
+        self.slot_class = name.split('.')[0]
+        self.state = ""
+        self.bootname = ""
+        self.boot_status = ""
+        self.bundle_version = ""
+        self.bundle_compatible = ""
+        self.installed_timestamp = ""
+
+    def summary(self):
+        parts = [self.bootname or self.name]
+        parts.append(self.bundle_version or "?")
+        flags = [flag for flag in (self.state, self.boot_status) if flag]
+        if flags:
+            parts.append(f"({', '.join(flags)})")
+        return " ".join(parts)
+
+class RaucStatus:
+    """Sparsowane wyjście 'rauc status --detailed' (format shell lub tekstowy)."""
+    def __init__(self):
+        self.compatible = ""
+        self.booted = ""
+        self.primary = ""
+        self.slots = []
+
+    @property
+    def model(self):
+        if 'axcf' in self.compatible:
+            return self.compatible.replace('axcf', '').split('_')[0]
+        return None
+
+    def rootfs_slots(self):
+        return [slot for slot in self.slots if slot.bootname]
+
+    def booted_slot(self):
+        for slot in self.rootfs_slots():
+            if slot.state == "booted" or (self.booted and slot.bootname == self.booted):
+                return slot
+        return None
+
+    def other_slot(self):
+        """Nieaktywny slot systemowy (cel rollbacku / ponownej aktywacji)."""
+        booted = self.booted_slot()
+        for slot in self.rootfs_slots():
+            if slot is not booted:
+                return slot
+        return None
+
+    def summary(self):
+        return " | ".join(slot.summary() for slot in self.rootfs_slots())
+
+RAUC_SHELL_SLOT_FIELDS = {
+    "STATE": "state",
+    "CLASS": "slot_class",
+    "BOOTNAME": "bootname",
+    "BOOT_STATUS": "boot_status",
+    "STATUS_BUNDLE_VERSION": "bundle_version",
+    "STATUS_BUNDLE_COMPATIBLE": "bundle_compatible",
+    "STATUS_INSTALLED_TIMESTAMP": "installed_timestamp",
+}
+RAUC_TEXT_SLOT_RE = re.compile(r'^\s*[xo]?\s*\[([\w.-]+)\]\s*\(([^)]*)\)')
+
+def parse_rauc_status(output):
+    """Parsuje 'rauc status --detailed' w formacie shell (RAUC_*=...) lub tekstowym. Zwraca RaucStatus."""
+    status = RaucStatus()
+    if "RAUC_" in output:
+        slots = {}
+        names = {}
+        for line in output.splitlines():
+            if '=' not in line:
+                continue
+            key, value = line.strip().split('=', 1)
+            value = value.strip().strip("'\"")
+            if key == "RAUC_SYSTEM_COMPATIBLE":
+                status.compatible = value
+            elif key == "RAUC_SYSTEM_BOOTED_BOOTNAME":
+                status.booted = value
+            elif key == "RAUC_BOOT_PRIMARY":
+                status.primary = value
+            elif key.startswith("RAUC_SLOT_"):
+                field, _, index = key[len("RAUC_SLOT_"):].rpartition('_')
+                if field == "NAME":
+                    names[index] = value
+                elif field in RAUC_SHELL_SLOT_FIELDS:
+                    slots.setdefault(index, {})[RAUC_SHELL_SLOT_FIELDS[field]] = value
+        for index in sorted(set(names) | set(slots), key=lambda i: int(i) if i.isdigit() else 0):
+            slot = RaucSlot(names.get(index, f"slot.{index}"))
+            for attr, value in slots.get(index, {}).items():
+                setattr(slot, attr, value)
+            status.slots.append(slot)
+        return status
+
+    slot = None
+    section = ""
+    for raw_line in output.splitlines():
+        line = raw_line.strip()
+        match = RAUC_TEXT_SLOT_RE.match(raw_line)
+        if match:
+            slot = RaucSlot(match.group(1))
+            details = [part.strip() for part in match.group(2).split(',')]
+            slot.state = details[-1] if len(details) > 1 else ""
+            status.slots.append(slot)
+            section = ""
+            continue
+        if ':' in line and '=' not in line:
+            key, value = [part.strip() for part in line.split(':', 1)]
+            key = key.lower()
+            if slot is None:
+                if key == "compatible":
+                    status.compatible = value
+                elif key == "booted from":
+                    status.booted = value.split('(')[-1].rstrip(')') if '(' in value else value
+                elif key == "activated":
+                    status.primary = value.split()[0] if value else ""
+            elif key == "bootname":
+                slot.bootname = value
+            elif key == "boot status":
+                slot.boot_status = value
+            elif not value:
+                section = key
+        elif '=' in line and slot is not None:
+            key, value = [part.strip() for part in line.split('=', 1)]
+            if section == "bundle" and key == "version":
+                slot.bundle_version = value
+            elif section == "bundle" and key == "compatible":
+                slot.bundle_compatible = value
+            elif section == "installed" and key == "timestamp":
+                slot.installed_timestamp = value
+    return status
+
+RAUC_MANIFEST_SCAN_SIZE = 1024 * 1024
+
+def parse_arpversion(output):
+    """Wersja firmware z wyniku ARPVERSION_COMMAND ('?', gdy nie da się jej odczytać)."""
+    output = output.replace('Arpversion', '').strip()
+    if ":" in output:
+        version = output.split(':', 1)[1].strip()
+    elif "=" in output:
+        version = output.split("=")[-1].strip()
+    else:
+        version = output
+    return version if version and version[0].isdigit() else "?"
+
+
+def detached_poll_command(log_path=DETACHED_UPDATE_LOG, pid_file=DETACHED_PID_FILE):
+    """
+    Komenda kontrolna instalacji w tle: koniec logu i DETACHED_RUNNING_MARKER, gdy proces
+    z pid_file nadal działa i w swoim cmdline ma ścieżkę logu (PID po restarcie może być zajęty).
+    """
+    return (
+        f"tail -n 20 {log_path} 2>/dev/null; "
+        f"pid=$(cat {pid_file} 2>/dev/null); "
+        f"[ -n \"$pid\" ] && grep -qF {log_path} /proc/$pid/cmdline 2>/dev/null "
+        f"&& echo {DETACHED_RUNNING_MARKER}"
+    )
+
+
+def parse_detached_poll(output):
+    """
+    Wynik komendy kontrolnej instalacji w tle (koniec DETACHED_UPDATE_LOG + znacznik działania).
+    Zwraca (state, exit_code, last_line, parser), gdzie state to "running", "finished"
+    (jest znacznik kodu wyjścia), "interrupted" (restart przed zapisaniem znacznika)
+    lub "missing" (brak logu).
+    """
+    running = False
+    exit_code = None
+    last_line = ""
+    log_lines = 0
+    parser = InstallProgressParser()
+    for line in output.replace('\r', '\n').split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        if line == DETACHED_RUNNING_MARKER:
+            running = True
+        elif line.startswith(DETACHED_EXIT_MARKER):
+            log_lines += 1
+            try:
+                exit_code = int(line[len(DETACHED_EXIT_MARKER):])
+            except ValueError:
+                exit_code = -1
+        else:
+            log_lines += 1
+            last_line = line
+            parser.parse_line(line)
+
+    if parser.errors:
+        last_line = parser.errors[-1]
+
+    if exit_code is not None:
+        state = "finished"
+    elif running:
+        state = "running"
+    elif log_lines:
+        state = "interrupted"
+    else:
+        state = "missing"
+    return state, exit_code, last_line, parser
+
+
+def plc_time_offset(plc_time_str):
+    """
+    Porównuje czas sterownika (wynik PLC_DATE_COMMAND) z lokalnym czasem TIMEZONE.
+    Zwraca (czas sterownika, czas lokalny, różnica w sekundach); ValueError przy złym formacie.
+    """
+    import pytz
+    plc_time = datetime.strptime(plc_time_str, "%Y-%m-%d %H:%M:%S")
+    local_time = datetime.now(pytz.timezone(TIMEZONE)).replace(tzinfo=None)
+    return plc_time, local_time, abs((local_time - plc_time).total_seconds())
+
+
+def parse_rauc_manifest(text):
+    """Parsuje manifest.raucm (INI). Zwraca słownik z sekcji [update] (compatible, version, ...)."""
+    parser = configparser.ConfigParser(strict=False, interpolation=None)
+    try:
+        parser.read_string(text)
+    except configparser.Error:
+        return {}
+    if not parser.has_section("update"):
+        return {}
+    return dict(parser.items("update"))
+
+def read_bundle_manifest(path):
+    """
+    Odczytuje manifest z bundle RAUC bez rozpakowywania całego pliku:
+    1. bundle 'verity' - manifest jest jawnym tekstem wewnątrz podpisu CMS na końcu pliku,
+    2. manifest nieskompresowany na początku obrazu squashfs,
+    3. 'unsquashfs -cat', jeśli narzędzie jest dostępne.
+    Zwraca słownik [update] lub {} gdy nie udało się odczytać.
+    """
+    size = os.path.getsize(path)
+    blobs = []
+    with open(path, 'rb') as f:
+        if size > 8:
+            f.seek(size - 8)
+            signature_size = int.from_bytes(f.read(8), 'big')
+            if 0 < signature_size < min(size - 8, RAUC_MANIFEST_SCAN_SIZE):
+                f.seek(size - 8 - signature_size)
+                blobs.append(f.read(signature_size))
+        f.seek(0)
+        blobs.append(f.read(RAUC_MANIFEST_SCAN_SIZE))
+
+    for blob in blobs:
+        start = blob.find(b"[update]")
+        if start < 0:
+            continue
+        end = start
+        while end < len(blob) and end - start < 8192 and (blob[end] in (9, 10, 13) or 32 <= blob[end] < 127):
+            end += 1
+        manifest = parse_rauc_manifest(blob[start:end].decode("ascii", errors="ignore"))
+        if manifest:
+            return manifest
+
+    try:
+        result = subprocess.run(
+            ["unsquashfs", "-cat", path, "manifest.raucm"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=30,
+            check=False
+        )
+        if result.returncode == 0:
+            return parse_rauc_manifest(result.stdout.decode(errors="ignore"))
+    except (OSError, subprocess.SubprocessError):
+        pass
+    return {}
+
+def version_sort_key(version):
+    return tuple(int(part) for part in re.findall(r'\d+', version or ""))
+
+class FirmwareBundle:
+    """
+    Jeden plik firmware: model i wersja z manifestu (fallback: nazwa pliku).
+    source - skąd pochodzi wersja, warnings - niezgodności manifestu z nazwą pliku.
+    """
+    def __init__(self, path, size, mtime):
+        self.path = path
+        self.size = size
+        self.mtime = mtime
+        self.compatible = ""
+        self.manifest_version = ""
+        self.model = None
+        self.version = ""
+        self.source = "nazwa pliku"
+        self.warnings = []
+
+    def load(self):
+        filename = os.path.basename(self.path)
+        filename_model = filename.split('-')[0].replace('axcf', '') if filename.startswith('axcf') else None
+        parts = filename[:-6].split('-') if filename.endswith('.raucb') else filename.split('-')
+        filename_version = parts[-1] if len(parts) >= 3 else ""
+
+        manifest = read_bundle_manifest(self.path)
+        self.compatible = manifest.get("compatible", "")
+        self.manifest_version = manifest.get("version", "")
+        manifest_model = self.compatible.replace('axcf', '').split('_')[0] if 'axcf' in self.compatible else None
+
+        self.model = manifest_model or filename_model
+        self.version = self.manifest_version or filename_version
+        self.source = "manifest" if self.manifest_version else "nazwa pliku"
+        self.warnings = []
+        if manifest_model and filename_model and manifest_model != filename_model:
+            self.warnings.append(f"model w manifeście (AXC F {manifest_model}) różni się od nazwy pliku (AXC F {filename_model})")
+        if self.manifest_version and filename_version and self.manifest_version != filename_version:
+            self.warnings.append(f"wersja w manifeście ({self.manifest_version}) różni się od nazwy pliku ({filename_version})")
+        return self
+
+class FirmwareCatalog:
+    """
+    Katalog plików firmware (*.raucb) indeksowany raz. refresh() ponownie czyta manifest
+    tylko dla nowych lub zmienionych (rozmiar/mtime) plików.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.bundles = {}
+
+    def refresh(self):
+        found = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith('.raucb'):
+                continue
+            stat = entry.stat()
+            cached = self.bundles.get(entry.path)
+            if cached and cached.size == stat.st_size and cached.mtime == stat.st_mtime:
+                found[entry.path] = cached
+            else:
+                found[entry.path] = FirmwareBundle(entry.path, stat.st_size, stat.st_mtime).load()
+        self.bundles = found
+        return list(found.values())
+
+    def bundle_for(self, path):
+        return self.bundles.get(path)
+
+    def select(self, model):
+        """Najnowszy bundle dla modelu sterownika lub None."""
+        candidates = [bundle for bundle in self.bundles.values() if bundle.model == model]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda bundle: (version_sort_key(bundle.version), bundle.mtime))
+
+    def models(self):
+        return sorted({bundle.model for bundle in self.bundles.values() if bundle.model})
+
+
+class FirmwareDigestCache:
+    """
+    SHA-256 plików firmware liczone w tle przez mmap (bez kopiowania do bufora Pythona),
+    razem z sumami bloków DIGEST_BLOCK_SIZE do weryfikacji wznawianych transferów.
+    Wyniki zapisywane na dysku, klucz: ścieżka + rozmiar + mtime - ponowny wybór tego
+    samego pliku lub restart aplikacji nic nie kosztuje.
+    """
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = {}
+        self._entries = {}
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+
+    @staticmethod
+    def cache_key(path):
+        stat = os.stat(path)
+        return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def peek(self, path):
+        """Gotowy wynik z cache lub None (nie blokuje)."""
+        try:
+            key = self.cache_key(path)
+        except OSError:
+            return None
+        with self._lock:
+            return self._entries.get(key)
+
+    def prefetch(self, path):
+        """Zleca liczenie w tle (jeśli nie ma w cache). Zwraca Future z wynikiem."""
+        key = self.cache_key(path)
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None and future.done() and future.exception() is not None:
+                future = None  # poprzednia próba nieudana (np. plik w trakcie kopiowania)
+            if future is None:
+                future = Future()
+                if key in self._entries:
+                    future.set_result(self._entries[key])
+                else:
+                    future = self._executor.submit(self._compute_and_store, key, path)
+                self._futures[key] = future
+            return future
+
+    def get(self, path):
+        """Wynik {'sha256', 'block_size', 'blocks'} - czeka na obliczenia w tle, jeśli trwają."""
+        return self.prefetch(path).result()
+
+    def _compute_and_store(self, key, path):
+        entry = self.compute(path)
+        with self._lock:
+            self._entries[key] = entry
+            self._save()
+        return entry
+
+    @staticmethod
+    def compute(path, block_size=None):
+        block_size = block_size or DIGEST_BLOCK_SIZE
+        digest = hashlib.sha256()
+        blocks = []
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        for offset in range(0, len(mapped), block_size):
+                            block = view[offset:offset + block_size]
+                            digest.update(block)
+                            blocks.append(hashlib.sha256(block).hexdigest())
+                            block.release()
+                    finally:
+                        view.release()
+        return {"sha256": digest.hexdigest(), "block_size": block_size, "blocks": blocks}
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_path = f"{self.cache_file}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
+
+class NetworkProfileStore:
+    """
+    Profil jakości łącza per sterownik (IP): czas handshake SSH, RTT komend,
+    przepustowość uploadu i czas instalacji. Pomiary wygładzane średnią wykładniczą
+    i zapisywane lokalnie - kolejne uruchomienia planują partię na ich podstawie.
+    Zapis na dysk najwyżej co PROFILE_FLUSH_INTERVAL s oraz przez flush() na końcu partii.
+    """
+    METRICS = ("handshake_ms", "rtt_ms", "upload_bps", "install_s")
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                self._profiles = json.load(f)
+        except (OSError, ValueError):
+            self._profiles = {}
+
+    def get(self, ip):
+        with self._lock:
+            return dict(self._profiles.get(ip, {}))
+
+    def all(self):
+        with self._lock:
+            return {ip: dict(profile) for ip, profile in self._profiles.items()}
+
+    def record(self, ip, name=None, **metrics):
+        """Dodaje pomiar (np. record(ip, rtt_ms=42.0)); zapis na dysk najwyżej co PROFILE_FLUSH_INTERVAL s."""
+        with self._lock:
+            profile = self._profiles.setdefault(ip, {"samples": 0})
+            if name:
+                profile["name"] = name
+            for metric, value in metrics.items():
+                if value is None:
+                    continue
+                previous = profile.get(metric)
+                if previous is None:
+                    profile[metric] = value
+                else:
+                    profile[metric] = previous + PROFILE_SMOOTHING * (value - previous)
+                profile[f"{metric}_at"] = int(time.time())
+            profile["samples"] = profile.get("samples", 0) + 1
+            profile["updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            self._dirty = True
+            if time.monotonic() - self._last_save >= PROFILE_FLUSH_INTERVAL:
+                self._flush_locked()
+
+    def is_stale(self, ip, metric, max_age):
+        """Czy metryki brak w profilu lub ostatni pomiar jest starszy niż max_age s."""
+        with self._lock:
+            measured_at = self._profiles.get(ip, {}).get(f"{metric}_at")
+        return measured_at is None or time.time() - measured_at > max_age
+
+    def flush(self):
+        """Zapisuje niezapisane pomiary (koniec partii)."""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if self._dirty:
+            self._save()
+            self._dirty = False
+        self._last_save = time.monotonic()
+
+    def fleet_median(self, metric):
+        """Mediana metryki po wszystkich profilach lub None."""
+        with self._lock:
+            values = [p[metric] for p in self._profiles.values() if p.get(metric)]
+        return statistics.median(values) if values else None
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._profiles, f, indent=1)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+class SharedFileMaps:
+    """
+    Pliki firmware mapowane (mmap) raz i współdzielone przez równoległe workery uploadu.
+    Workery dostają memoryview i wysyłają jego wycinki bez kopiowania i bez osobnych
+    odczytów z dysku. Mapowanie zamykane, gdy zwolni je ostatni użytkownik.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._maps = {}
+
+    @staticmethod
+    def _key(path):
+        stat = os.stat(path)
+        return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+    def acquire(self, path):
+        key = self._key(path)
+        with self._lock:
+            entry = self._maps.get(key)
+            if entry is None:
+                with open(path, 'rb') as f:
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                entry = {"mmap": mapped, "view": memoryview(mapped), "refs": 0}
+                self._maps[key] = entry
+            entry["refs"] += 1
+            return key, entry["view"]
+
+    def release(self, key):
+        with self._lock:
+            entry = self._maps.get(key)
+            if entry is None:
+                return
+            entry["refs"] -= 1
+            if entry["refs"] > 0:
+                return
+            del self._maps[key]
+        try:
+            entry["view"].release()
+            entry["mmap"].close()
+        except BufferError:
+            # Wycinek wciąż gdzieś trzymany - mapowanie zwolni GC
+            pass
+
+    @contextmanager
+    def mapped(self, path):
+        """memoryview całego pliku na czas bloku with."""
+        key, view = self.acquire(path)
+        try:
+            yield view
+        finally:
+            self.release(key)
+
+
+# Flagi zgodności sterownika (PLCDevice.compliance)
+ISSUE_TIME_SYNC = 1
+ISSUE_SYSTEM_SERVICES = 2
+ISSUE_TIMEZONE = 4
+
+
+class PLCDevice:
+    """
+    Klasa reprezentująca jeden sterownik PLC. Pola w __slots__ (bez __dict__ na instancję -
+    floty liczone w tysiącach). Flagi zgodności i zapamiętany wiersz widoku są zerowane
+    przy zmianie pól, od których zależą, i liczone ponownie tylko raz po zmianie.
+    """
+    FIELDS = (
+        "name", "ip", "password", "firmware_version", "timezone", "system_services_ok", "last_check",
+        "last_update", "status", "error_log", "plc_model", "plc_time", "time_sync_error", "install_state",
+        "install_detail", "install_progress", "install_step", "staged_digest", "staged_path", "rauc_slots",
+        "upload_throughput", "ssh_banner",
+    )
+    # Pola, od których zależą flagi zgodności
+    COMPLIANCE_FIELDS = frozenset({"time_sync_error", "system_services_ok", "timezone"})
+    __slots__ = FIELDS + ("_compliance", "row_cache")
+
+    def __init__(self, name, ip, password):
+        self.name = name
+        self.ip = ip
+        self.password = password
+        self.firmware_version = ""
+        self.timezone = ""
+        self.system_services_ok = ""
+        self.last_check = ""
+        self.last_update = ""
+        self.status = "Oczekuje"
+        self.error_log = ""
+        self.plc_model = ""
+        self.plc_time = ""
+        self.time_sync_error = False
+        self.install_state = ""
+        self.install_detail = ""
+        self.install_progress = None
+        self.install_step = ""
+        self.staged_digest = ""
+        self.staged_path = ""
+        self.rauc_slots = ""
+        self.upload_throughput = None  # bajty/s zmierzone przy ostatnim uploadzie
+        self.ssh_banner = ""
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != "row_cache":
+            # Wiersz widoku (GUI) zależy od wszystkich pól
+            object.__setattr__(self, "row_cache", None)
+            if name in self.COMPLIANCE_FIELDS:
+                object.__setattr__(self, "_compliance", None)
+
+    @property
+    def compliance(self):
+        """Maska ISSUE_* - liczona raz po zmianie stanu sterownika."""
+        flags = self._compliance
+        if flags is None:
+            flags = 0
+            if self.time_sync_error:
+                flags |= ISSUE_TIME_SYNC
+            if self.system_services_ok not in ("OK", ""):
+                flags |= ISSUE_SYSTEM_SERVICES
+            if self.timezone and self.timezone.strip() != TIMEZONE.strip():
+                flags |= ISSUE_TIMEZONE
+            object.__setattr__(self, "_compliance", flags)
+        return flags
+
+    @property
+    def issues(self):
+        """Opisy problemów zgodności."""
+        flags = self.compliance
+        issues = []
+        if flags & ISSUE_TIME_SYNC:
+            issues.append("Desynchronizacja czasu")
+        if flags & ISSUE_SYSTEM_SERVICES:
+            issues.append("System Services")
+        if flags & ISSUE_TIMEZONE:
+            issues.append(f"Strefa czasowa ({self.timezone} ≠ {TIMEZONE})")
+        return issues
+
+    @property
+    def has_issues(self):
+        return bool(self.compliance) or self.status == "Błąd"
+
+    def state(self, include_password=False):
+        """Stan sterownika jako słownik pól (np. do przesłania między procesami)."""
+        return {field: getattr(self, field) for field in self.FIELDS if include_password or field != "password"}
+
+    def apply_state(self, state):
+        """Ustawia pola ze słownika (nieznane klucze pomijane)."""
+        for field, value in state.items():
+            if field in self.FIELDS:
+                setattr(self, field, value)
+
+
+class PlainVar:
+    """Wartość z interfejsem get/set jak StringVar/IntVar - dla trybu bez GUI."""
+    def __init__(self, value=None):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = value
+
+
+# Kolumny raportu (Excel/JSON) - kolejność jak w dotychczasowym raporcie
+REPORT_HEADERS = ["Nazwa Farmy", "IP", "Hasło", "Firmware", "Strefa czasowa",
+                  "System Services", "Ostatni odczyt", "Ostatnia aktualizacja", "Status", "Logi błędów"]
+REPORT_FIELDS = ["name", "ip", "password", "firmware_version", "timezone",
+                 "system_services_ok", "last_check", "last_update", "status", "error_log"]
+REPORT_COLUMN_MAX_WIDTH = 50
+# Stan sterownika w pliku autozapisu partii (bez hasła)
+AUTOSAVE_FIELDS = [field for field in REPORT_FIELDS if field != "password"] + [
+    "plc_model", "rauc_slots", "install_state", "install_detail", "staged_digest", "staged_path",
+]
+
+
+# Rozszerzenia list sterowników obsługiwane przez load_inventory/iter_inventory
+INVENTORY_EXTENSIONS = (".xlsx", ".xlsm", ".csv", ".json")
+# Opcjonalne kolumny listy (po Nazwa, IP, Hasło) - dane z poprzedniego raportu
+INVENTORY_EXTRA_FIELDS = ["firmware_version", "timezone", "system_services_ok", "last_check"]
+
+
+def device_from_row(row):
+    """PLCDevice z wiersza listy (Nazwa, IP, Hasło, [Firmware, Strefa, System Services, Odczyt]) lub None."""
+    if len(row) < 2 or not row[0] or not row[1]:  # Nazwa i IP muszą być wypełnione
+        return None
+    password = row[2] if len(row) > 2 else ""
+    device = PLCDevice(str(row[0]).strip(), str(row[1]).strip(), str(password).strip() if password else "")
+    for field, value in zip(INVENTORY_EXTRA_FIELDS, row[3:]):
+        if value:
+            setattr(device, field, str(value))
+    return device
+
+
+def _iter_inventory_xlsx(path):
+    import openpyxl
+    # read_only: wiersze parsowane strumieniowo, bez budowania obiektów wszystkich komórek
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            yield row
+    finally:
+        wb.close()
+
+
+def _iter_inventory_csv(path):
+    import csv
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=";,\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        next(reader, None)  # nagłówek
+        for row in reader:
+            yield row
+
+
+def _iter_inventory_json(path):
+    """Lista obiektów lub raport z write_report_json ({"devices": [...]}); klucze jak pola PLCDevice lub nagłówki raportu."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("devices", [])
+    columns = ["name", "ip", "password"] + INVENTORY_EXTRA_FIELDS
+    header_to_field = dict(zip(REPORT_HEADERS, REPORT_FIELDS))
+    for entry in data:
+        entry = {header_to_field.get(key, key): value for key, value in entry.items()}
+        yield [entry.get(column, "") for column in columns]
+
+
+def iter_inventory(path):
+    """
+    Strumieniowo zwraca sterowniki z listy: Excel (.xlsx), CSV (nagłówek w 1. wierszu,
+    separator ; lub ,) albo JSON. Kolejne PLCDevice są dostępne zanim cały plik zostanie przeczytany.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        rows = _iter_inventory_csv(path)
+    elif extension == ".json":
+        rows = _iter_inventory_json(path)
+    else:
+        rows = _iter_inventory_xlsx(path)
+    for row in rows:
+        device = device_from_row(row)
+        if device:
+            yield device
+
+
+def load_inventory(path, cache=None):
+    """
+    Wczytuje listę sterowników (Excel, CSV lub JSON): Nazwa, IP, Hasło i opcjonalnie
+    dane z poprzedniego raportu (Firmware, Strefa czasowa, System Services, Ostatni odczyt).
+    Z cache (InventoryCache) niezmieniony plik nie jest ponownie parsowany.
+    """
+    if cache is None:
+        return list(iter_inventory(path))
+    return list(cache.iter_inventory(path))
+
+
+class InventoryCache:
+    """
+    Sparsowane listy sterowników w lokalnej bazie SQLite, kluczem jest ścieżka pliku
+    z rozmiarem, czasem modyfikacji i sumą SHA-256 treści. Niezmieniona lista wczytuje się
+    bez openpyxl; po edycji pliku jest parsowana ponownie, a wpis zastępowany.
+    Wiersze zapisane jako skompresowana lista kolumn INVENTORY_COLUMNS.
+    """
+    INVENTORY_COLUMNS = ["name", "ip", "password"] + INVENTORY_EXTRA_FIELDS
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def iter_inventory(self, path):
+        """Jak iter_inventory(path), ale z cache; po pełnym odczycie pliku wynik trafia do cache."""
+        stat = os.stat(path)
+        source = os.path.abspath(path)
+        rows = self._lookup(source, stat)
+        if rows is not None:
+            for row in rows:
+                yield self._device(row)
+            return
+
+        digest = self._file_digest(path)
+        rows = self._lookup_digest(source, stat, digest)
+        if rows is not None:
+            for row in rows:
+                yield self._device(row)
+            return
+
+        rows = []
+        for device in iter_inventory(path):
+            rows.append([getattr(device, column) for column in self.INVENTORY_COLUMNS])
+            yield device
+        self._store(source, stat, digest, rows)
+
+    def _device(self, row):
+        device = PLCDevice(row[0], row[1], row[2])
+        for column, value in zip(self.INVENTORY_COLUMNS[3:], row[3:]):
+            setattr(device, column, value)
+        return device
+
+    @staticmethod
+    def _file_digest(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _connect(self):
+        if not os.path.exists(self.path):
+            # Listy zawierają hasła - plik tylko dla właściciela
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            os.close(os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600))
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS inventory ("
+            " source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT,"
+            " columns TEXT, rows BLOB, updated TEXT)"
+        )
+        return connection
+
+    def _rows(self, record):
+        columns, payload = record
+        if columns != ",".join(self.INVENTORY_COLUMNS):
+            return None
+        return json.loads(zlib.decompress(payload))
+
+    def _lookup(self, source, stat):
+        """Wpis dla ścieżki o niezmienionym rozmiarze i czasie modyfikacji (bez czytania pliku)."""
+        try:
+            with self._lock, closing(self._connect()) as connection:
+                record = connection.execute(
+                    "SELECT columns, rows FROM inventory WHERE source = ? AND size = ? AND mtime_ns = ?",
+                    (source, stat.st_size, stat.st_mtime_ns),
+                ).fetchone()
+        except (sqlite3.Error, OSError):
+            return None
+        return self._rows(record) if record else None
+
+    def _lookup_digest(self, source, stat, digest):
+        """Wpis o tej samej treści (plik dotknięty lub skopiowany) - aktualizuje klucz ścieżki."""
+        try:
+            with self._lock, closing(self._connect()) as connection:
+                record = connection.execute(
+                    "SELECT columns, rows FROM inventory WHERE sha256 = ? AND size = ?",
+                    (digest, stat.st_size),
+                ).fetchone()
+                rows = self._rows(record) if record else None
+                if rows is not None:
+                    self._write(connection, source, stat, digest, record[1])
+        except (sqlite3.Error, OSError):
+            return None
+        return rows
+
+    def _store(self, source, stat, digest, rows):
+        payload = zlib.compress(json.dumps(rows, ensure_ascii=False).encode("utf-8"))
+        try:
+            with self._lock, closing(self._connect()) as connection:
+                self._write(connection, source, stat, digest, payload)
+        except (sqlite3.Error, OSError):
+            pass
+
+    def _write(self, connection, source, stat, digest, payload):
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO inventory VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (source, stat.st_size, stat.st_mtime_ns, digest, ",".join(self.INVENTORY_COLUMNS),
+                 payload, datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            )
+
+
+def firmware_version_key(version):
+    """Wersja firmware jako tekst porównywalny w SQL ('24.0.8.183' -> '000024.000000.000008.000183')."""
+    return ".".join(f"{part:06d}" for part in version_sort_key(version))
+
+
+class FleetStateStore:
+    """
+    Historia floty w lokalnej bazie SQLite: każda partia (batches), wynik każdego
+    sterownika w partii (results) i ostatni znany stan sterownika (devices). Indeksy
+    po IP, nazwie, wersji firmware, czasie i statusie - zapytania po miesiącach
+    historii bez otwierania starych raportów Excel.
+    """
+    SCHEMA = [
+        "CREATE TABLE IF NOT EXISTS batches ("
+        " id INTEGER PRIMARY KEY, operation TEXT, started TEXT, finished TEXT,"
+        " total INTEGER, success INTEGER, failed INTEGER, not_processed INTEGER)",
+        "CREATE TABLE IF NOT EXISTS results ("
+        " id INTEGER PRIMARY KEY, batch_id INTEGER, ts TEXT, ip TEXT, name TEXT, operation TEXT,"
+        " outcome TEXT, status TEXT, firmware_version TEXT, firmware_key TEXT, timezone TEXT,"
+        " system_services_ok TEXT, plc_model TEXT, error TEXT)",
+        "CREATE TABLE IF NOT EXISTS devices ("
+        " ip TEXT PRIMARY KEY, name TEXT, status TEXT, firmware_version TEXT, firmware_key TEXT,"
+        " timezone TEXT, system_services_ok TEXT, plc_model TEXT, last_check TEXT, last_update TEXT,"
+        " error TEXT, updated TEXT)",
+        "CREATE INDEX IF NOT EXISTS results_ip_ts ON results (ip, ts)",
+        "CREATE INDEX IF NOT EXISTS results_name_ts ON results (name, ts, outcome)",
+        "CREATE INDEX IF NOT EXISTS results_ts ON results (ts)",
+        "CREATE INDEX IF NOT EXISTS results_status ON results (status, ts)",
+        "CREATE INDEX IF NOT EXISTS results_firmware ON results (firmware_key)",
+        "CREATE INDEX IF NOT EXISTS devices_firmware ON devices (firmware_key)",
+        "CREATE INDEX IF NOT EXISTS devices_status ON devices (status)",
+        "CREATE INDEX IF NOT EXISTS devices_updated ON devices (updated)",
+    ]
+    # Zapytania dostępne w GUI i CLI: nazwa -> (opis, opis parametru lub None, kolumny wyniku)
+    QUERIES = {
+        "devices": ("Aktualny stan floty", None,
+                    ["Nazwa", "IP", "Firmware", "Strefa czasowa", "System Services", "Status", "Aktualizacja stanu"]),
+        "below_version": ("Sterowniki z firmware starszym niż", "Wersja (np. 24.0.8)",
+                          ["Nazwa", "IP", "Firmware", "Model", "Status", "Aktualizacja stanu"]),
+        "changes_since": ("Zmiany od dnia", "Data (RRRR-MM-DD)",
+                          ["Nazwa", "IP", "Firmware wcześniej", "Firmware teraz", "Status wcześniej",
+                           "Status teraz", "Aktualizacja stanu"]),
+        "failure_rate": ("Odsetek błędów per farma", "Od dnia (RRRR-MM-DD, opcjonalnie)",
+                         ["Nazwa", "Operacje", "Błędy", "Błędy %", "Ostatni błąd"]),
+        "history": ("Historia sterownika", "IP lub nazwa",
+                    ["Czas", "Nazwa", "IP", "Operacja", "Wynik", "Status", "Firmware", "Błąd"]),
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+            self._connection = connection
+        return self._connection
+
+    @staticmethod
+    def _now():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def begin_batch(self, operation, total):
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    "INSERT INTO batches (operation, started, total) VALUES (?, ?, ?)",
+                    (operation, self._now(), total),
+                )
+            return cursor.lastrowid
+
+    def finish_batch(self, batch_id, summary):
+        summary = summary or {}
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "UPDATE batches SET finished = ?, success = ?, failed = ?, not_processed = ? WHERE id = ?",
+                    (self._now(), summary.get("success"), summary.get("failed"),
+                     summary.get("not_processed"), batch_id),
+                )
+
+    def record(self, batch_id, operation, device, outcome):
+        """Wynik sterownika w partii ("success"/"failed" wg process_batch) oraz jego ostatni znany stan."""
+        now = self._now()
+        error = device.error_log if outcome == "failed" else ""
+        firmware_key = firmware_version_key(device.firmware_version)
+        with self._lock:
+            connection = self._connect()
+            with connection:
+                connection.execute(
+                    "INSERT INTO results (batch_id, ts, ip, name, operation, outcome, status, firmware_version,"
+                    " firmware_key, timezone, system_services_ok, plc_model, error)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (batch_id, now, device.ip, device.name, operation, outcome, device.status,
+                     device.firmware_version, firmware_key, device.timezone, device.system_services_ok,
+                     device.plc_model, error),
+                )
+                connection.execute(
+                    "INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (device.ip, device.name, device.status, device.firmware_version, firmware_key,
+                     device.timezone, device.system_services_ok, device.plc_model, device.last_check,
+                     device.last_update, error, now),
+                )
+
+    def query(self, name, argument=""):
+        """Wykonuje zapytanie z QUERIES; zwraca (kolumny, wiersze)."""
+        if name not in self.QUERIES:
+            raise ValueError(f"Nieznane zapytanie: {name}")
+        _, parameter, columns = self.QUERIES[name]
+        argument = (argument or "").strip()
+        if parameter and not argument and name != "failure_rate":
+            raise ValueError(f"Zapytanie wymaga parametru: {parameter}")
+
+        if name == "devices":
+            sql = ("SELECT name, ip, firmware_version, timezone, system_services_ok, status, updated"
+                   " FROM devices ORDER BY name")
+            params = ()
+        elif name == "below_version":
+            sql = ("SELECT name, ip, firmware_version, plc_model, status, updated FROM devices"
+                   " WHERE firmware_key != '' AND firmware_key < ? ORDER BY firmware_key, name")
+            params = (firmware_version_key(argument),)
+        elif name == "changes_since":
+            sql = ("SELECT d.name, d.ip, p.firmware_version, d.firmware_version, p.status, d.status, d.updated"
+                   " FROM devices d LEFT JOIN results p ON p.id = ("
+                   "  SELECT r.id FROM results r WHERE r.ip = d.ip AND r.ts < ? ORDER BY r.ts DESC LIMIT 1)"
+                   " WHERE d.updated >= ? AND (p.id IS NULL OR p.firmware_version IS NOT d.firmware_version"
+                   "  OR p.timezone IS NOT d.timezone OR p.system_services_ok IS NOT d.system_services_ok"
+                   "  OR p.status IS NOT d.status)"
+                   " ORDER BY d.updated DESC")
+            params = (argument, argument)
+        elif name == "failure_rate":
+            sql = ("SELECT name, COUNT(*), SUM(outcome = 'failed'),"
+                   " ROUND(100.0 * SUM(outcome = 'failed') / COUNT(*), 1),"
+                   " MAX(CASE WHEN outcome = 'failed' THEN ts END)"
+                   " FROM results WHERE ts >= ? GROUP BY name ORDER BY 4 DESC, 3 DESC, name")
+            params = (argument,)
+        else:
+            sql = ("SELECT ts, name, ip, operation, outcome, status, firmware_version, error FROM results"
+                   " WHERE ip = ? UNION ALL"
+                   " SELECT ts, name, ip, operation, outcome, status, firmware_version, error FROM results"
+                   " WHERE name = ? AND ip != ? ORDER BY 1 DESC")
+            params = (argument, argument, argument)
+
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return columns, rows
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def write_report_xlsx(devices, path):
+    """
+    Zapisuje raport stanu sterowników do pliku Excel. Skoroszyt write_only zapisuje wiersze
+    strumieniowo; szerokości kolumn liczone w tym samym przejściu co wartości wierszy.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill, Font
+    from openpyxl.utils import get_column_letter
+
+    rows = []
+    widths = [len(header) for header in REPORT_HEADERS]
+    for device in devices:
+        row = [getattr(device, field) for field in REPORT_FIELDS]
+        for index, value in enumerate(row):
+            if value is not None and len(str(value)) > widths[index]:
+                widths[index] = len(str(value))
+        rows.append(row)
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Sterowniki PLC")
+    # W trybie write_only szerokości muszą być ustawione przed pierwszym wierszem
+    for index, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(index)].width = min(width + 2, REPORT_COLUMN_MAX_WIDTH)
+
+    header_fill = PatternFill(start_color="4CAF50", end_color="4CAF50", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header = []
+    for title in REPORT_HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.fill = header_fill
+        cell.font = header_font
+        header.append(cell)
+    ws.append(header)
+
+    for row in rows:
+        ws.append(row)
+
+    wb.save(path)
+
+
+def autosave_path_for(inventory_path):
+    """Plik autozapisu wyników partii obok listy sterowników."""
+    return f"{os.path.splitext(inventory_path)[0]}.autosave.jsonl"
+
+
+class BatchAutosave:
+    """
+    Przyrostowy zapis wyników partii (JSON Lines): nagłówek partii, stan każdego
+    zakończonego sterownika zaraz po zakończeniu i podsumowanie na końcu. Po awarii
+    plik bez podsumowania zawiera wszystko, co zdążyło się wykonać.
+    """
+    def __init__(self, path, operation):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'w', encoding='utf-8')
+        self._write({"started": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "operation": operation})
+
+    def record(self, device):
+        state = {field: getattr(device, field) for field in AUTOSAVE_FIELDS}
+        self._write({"device": state})
+
+    def finish(self, summary):
+        self._write({"finished": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "summary": summary})
+        with self._lock:
+            self._file.close()
+
+    def _write(self, entry):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+
+def load_autosave(path):
+    """
+    Odczyt pliku autozapisu: (operation, stany sterowników wg IP, summary lub None
+    jeśli partia nie została dokończona). Uszkodzona ostatnia linia jest pomijana.
+    """
+    operation, states, summary = "", {}, None
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if "device" in entry:
+                states[entry["device"]["ip"]] = entry["device"]
+            elif "started" in entry:
+                operation = entry.get("operation", "")
+            elif "finished" in entry:
+                summary = entry.get("summary")
+    return operation, states, summary
+
+
+def write_report_csv(devices, path):
+    """Zapisuje raport w CSV (kolumny jak w Excel, separator ;) - do ponownego wczytania jako lista."""
+    import csv
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(REPORT_HEADERS)
+        for device in devices:
+            writer.writerow([getattr(device, field) for field in REPORT_FIELDS])
+
+
+def write_report_json(devices, path, summary=None):
+    """Zapisuje raport stanu sterowników (i opcjonalnie podsumowanie operacji) do JSON."""
+    fields = [field for field in REPORT_FIELDS if field != "password"] + [
+        "plc_model", "rauc_slots", "install_state", "install_detail"
+    ]
+    report = {
+        "generated": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "summary": summary,
+        "devices": [{field: getattr(device, field) for field in fields} for device in devices],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+class BatchEngine:
+    """
+    Logika przetwarzania wsadowego sterowników bez GUI. Aplikacja Qt dziedziczy
+    z tej klasy i nadpisuje metody powiadomień (after, update_device_row, show_*);
+    w trybie bez GUI są one pustymi operacjami lub wywołaniami bezpośrednimi.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Zmienne stanu
+        self.firmware_path = PlainVar("")
+        self.firmware_catalog = None
+        self.firmware_file_bundle = None  # manifest pojedynczego pliku firmware (bez katalogu)
+        self.devices = []
+        self.processing = False
+        self.log_queue = queue.Queue()
+        self.upload_log_progress = {}
+        self.install_parsers = {}
+        self.install_durations = []
+        self.batch_pending_count = 0
+
+        # Konfigurowalne ustawienia (domyślne wartości)
+        self.ssh_timeout = DEFAULT_SSH_TIMEOUT
+        self.ssh_keepalive = DEFAULT_SSH_KEEPALIVE
+        self.retry_attempts = DEFAULT_RETRY_ATTEMPTS
+        self.retry_delay = DEFAULT_RETRY_DELAY
+        self.pause_between_devices = DEFAULT_PAUSE_BETWEEN
+        self.upload_timeout = DEFAULT_UPLOAD_TIMEOUT
+        self.update_command_timeout = DEFAULT_UPDATE_COMMAND_TIMEOUT
+        self.idle_timeout = DEFAULT_IDLE_TIMEOUT
+        self.upload_safety_factor = DEFAULT_UPLOAD_SAFETY_FACTOR
+        self.stall_window = DEFAULT_STALL_WINDOW
+        self.stall_min_rate = DEFAULT_STALL_MIN_RATE
+        self.network_profiles = NetworkProfileStore(NETWORK_PROFILES_FILE)
+        self.post_reboot_wait = DEFAULT_POST_REBOOT_WAIT
+        self.post_reboot_timeout = DEFAULT_POST_REBOOT_TIMEOUT
+        self.post_reboot_poll = DEFAULT_POST_REBOOT_POLL
+        self.parallel_workers = DEFAULT_PARALLEL_WORKERS
+        self.detached_update = DEFAULT_DETACHED_UPDATE
+        self.detached_poll_interval = DEFAULT_DETACHED_POLL
+        self.http_install = DEFAULT_HTTP_INSTALL
+        self.http_install_port = DEFAULT_HTTP_INSTALL_PORT
+        self.firmware_http_server = None
+        self.prestage_rate_limit = DEFAULT_PRESTAGE_RATE_LIMIT
+        self.cleanup_stale_bundles = DEFAULT_CLEANUP_STALE_BUNDLES
+        self.skip_unreachable = DEFAULT_SKIP_UNREACHABLE
+        self.predial_ahead = DEFAULT_PREDIAL_AHEAD
+        self.predial_executor = None
+        self.predialed = {}  # (ip, hasło) -> Future z klientem SSH połączonym w tle
+        self.predial_lock = threading.Lock()
+        self.async_read = DEFAULT_ASYNC_READ
+        self.async_read_concurrency = DEFAULT_ASYNC_READ_CONCURRENCY
+        self.reachability = {}  # ip -> (ProbeResult, czas sprawdzenia)
+        self.reachability_lock = threading.Lock()
+        self.reachability_probes = {}  # ip -> Lock; jedno sprawdzenie naraz na adres
+        self.diagnosis_cache = {}  # (ip, klasa błędu) -> (diagnoza, czas)
+        self.digest_cache = FirmwareDigestCache(DIGEST_CACHE_FILE)
+        self.firmware_maps = SharedFileMaps()
+        self.http_server_lock = threading.Lock()
+        self.shard_processes = DEFAULT_SHARD_PROCESSES
+        self.autosave_path = None  # plik autozapisu wyników partii (None - wyłączony)
+        self.inventory_cache = InventoryCache(INVENTORY_CACHE_FILE)
+        self.fleet_state = FleetStateStore(FLEET_STATE_FILE)
+        self.batch_id = None
+        self.batch_operation = None
+        self.batch_autosave = None
+
+    # ------------------------------------------------------------------
+    # Powiadomienia interfejsu - nadpisywane przez GUI
+    # ------------------------------------------------------------------
+
+    def after(self, delay_ms, callback):
+        """Bez pętli zdarzeń: callback wykonywany od razu (lub po opóźnieniu w wątku timera)."""
+        if delay_ms <= 0:
+            callback()
+        else:
+            threading.Timer(delay_ms / 1000, callback).start()
+
+    def update_device_row(self, device):
+        pass
+
+    def update_action_buttons_state(self):
+        pass
+
+    def refresh_network_profiles_view(self):
+        pass
+
+    def show_upload_progress(self, percent, text, color):
+        pass
+
+    def show_install_eta(self, text):
+        pass
+
+    def show_batch_progress(self, percent, text, color):
+        pass
+
+    def batch_finished(self, summary):
+        pass
+
+    # ------------------------------------------------------------------
+    # Operacje na sterownikach
+    # ------------------------------------------------------------------
+
+    def create_ssh_client(self, ip, password, timeout=None):
+        """Klient SSH: sesja połączona wcześniej w tle (pre-dial), a gdy jej brak - nowe połączenie."""
+        ssh = self.take_predialed(ip, password)
+        if ssh is not None:
+            return ssh
+        return self.dial_ssh_client(ip, password, timeout)
+
+    def dial_ssh_client(self, ip, password, timeout=None):
+        """Tworzy i konfiguruje klienta SSH z odpowiednimi timeoutami."""
+        if timeout is None:
+            timeout = self.ssh_timeout
+
+        load_paramiko()
+        try:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            connect_start = time.time()
+            ssh.connect(
+                ip,
+                username=PLC_USER,
+                password=password,
+                timeout=timeout,
+                banner_timeout=timeout,
+                auth_timeout=timeout,
+                allow_agent=False,
+                look_for_keys=False
+            )
+
+            handshake_ms = (time.time() - connect_start) * 1000
+            self.forget_diagnosis(ip)
+
+            transport = ssh.get_transport()
+            if transport:
+                transport.set_keepalive(self.ssh_keepalive)
+
+            rtt_ms = None
+            if self.network_profiles.is_stale(ip, "rtt_ms", RTT_SAMPLE_INTERVAL):
+                rtt_ms = self.measure_command_rtt(ssh)
+            self.network_profiles.record(ip, handshake_ms=handshake_ms, rtt_ms=rtt_ms)
+            return ssh
+        except paramiko.AuthenticationException as e:
+            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
+            raise Exception(f"{diagnosis}: {str(e)}") from e
+        except ConnectionRefusedError as e:
+            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
+            raise Exception(f"{diagnosis}: {str(e)}") from e
+        except socket.timeout as e:
+            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
+            raise Exception(f"{diagnosis}: {str(e)}") from e
+        except TimeoutError as e:
+            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
+            raise Exception(f"{diagnosis}: {str(e)}") from e
+        except Exception as e:
+            diagnosis = self.diagnose_ssh_error(ip, e, timeout)
+            raise Exception(f"{diagnosis}: {str(e)}") from e
+
+    def start_predial(self):
+        """Pula łącząca się w tle z kolejnymi sterownikami partii (predial_ahead = 0 wyłącza)."""
+        if self.predial_ahead > 0:
+            self.predial_executor = ThreadPoolExecutor(max_workers=self.predial_ahead,
+                                                       thread_name_prefix="predial")
+
+    def stop_predial(self):
+        """Kończy pre-dial partii i zamyka sesje, których nikt nie użył."""
+        with self.predial_lock:
+            executor, self.predial_executor = self.predial_executor, None
+            futures = list(self.predialed.values())
+            self.predialed.clear()
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                future.result().close()
+
+    def predial_sessions(self, devices):
+        """Łączy się w tle ze sterownikami, które za chwilę trafią do workerów."""
+        with self.predial_lock:
+            if self.predial_executor is None:
+                return
+            for device in devices:
+                key = (device.ip, device.password)
+                if key not in self.predialed:
+                    self.predialed[key] = self.predial_executor.submit(self.dial_ssh_client, device.ip, device.password)
+
+    def predial_failure(self, device):
+        """Błąd zakończonego łączenia w tle (None, gdy sesja gotowa, w toku lub jej nie było)."""
+        key = (device.ip, device.password)
+        with self.predial_lock:
+            future = self.predialed.get(key)
+            if future is None or not future.done() or future.exception() is None:
+                return None
+            del self.predialed[key]
+        return future.exception()
+
+    def take_predialed(self, ip, password):
+        """Sesja połączona w tle (czeka, jeśli łączenie trwa); None, gdy jej brak lub wygasła."""
+        with self.predial_lock:
+            future = self.predialed.pop((ip, password), None)
+        if future is None:
+            return None
+        try:
+            ssh = future.result()
+        except Exception:
+            return None  # worker łączy się od nowa i sam diagnozuje błąd
+        transport = ssh.get_transport()
+        if transport is None or not transport.is_active():
+            ssh.close()
+            return None
+        self.log(f"  Sesja SSH do {ip} przygotowana w tle")
+        return ssh
+
+    def measure_command_rtt(self, ssh):
+        """
+        RTT komendy w ms: czas wykonania 'true' (otwarcie kanału, exec, kod wyjścia),
+        najwyżej RTT_PROBE_TIMEOUT s. None, gdy pomiar się nie udał.
+        """
+        try:
+            start = time.time()
+            stdin, stdout, stderr = ssh.exec_command("true", timeout=RTT_PROBE_TIMEOUT)
+            try:
+                stdout.read()
+            finally:
+                stdout.channel.close()
+            return (time.time() - start) * 1000
+        except Exception:
+            return None
+
+    def check_reachability(self, ips, timeout=PREFLIGHT_TIMEOUT):
+        """
+        Sprawdza port 22 wielu sterowników naraz (połączenia TCP w jednej pętli asyncio, bez
+        procesów ping). Wyniki zapamiętywane na REACHABILITY_TTL dla diagnostyki błędów SSH.
+        Zwraca słownik ip -> ProbeResult.
+        """
+        from plc_netscan import sweep
+
+        results = sweep(sorted(set(ips)), timeout=timeout)
+        checked_at = time.time()
+        with self.reachability_lock:
+            for ip, result in results.items():
+                self.reachability[ip] = (result, checked_at)
+        return results
+
+    def probe_reachability(self, ip, timeout=PREFLIGHT_TIMEOUT, max_age=REACHABILITY_TTL):
+        """Wynik sprawdzenia portu 22 z pamięci (jeśli świeży) lub nowe pojedyncze sprawdzenie."""
+        with self.reachability_lock:
+            cached = self.reachability.get(ip)
+            probe_lock = self.reachability_probes.setdefault(ip, threading.Lock())
+        if cached and time.time() - cached[1] <= max_age:
+            return cached[0]
+        # Workery diagnozujące ten sam adres czekają na jedno sprawdzenie zamiast sprawdzać osobno
+        with probe_lock:
+            with self.reachability_lock:
+                cached = self.reachability.get(ip)
+            if cached and time.time() - cached[1] <= max_age:
+                return cached[0]
+            return self.check_reachability([ip], timeout=timeout)[ip]
+
+    def preflight_reachability(self, devices):
+        """Pre-flight partii: port 22 wszystkich sterowników naraz. Zwraca zbiór IP nieosiągalnych."""
+        started = time.time()
+        results = self.check_reachability([device.ip for device in devices],
+                                          timeout=min(self.ssh_timeout, PREFLIGHT_TIMEOUT))
+        unreachable = {ip for ip, result in results.items() if not result.reachable}
+        latencies = [result.latency_ms for result in results.values() if result.reachable]
+        median = f", mediana połączenia TCP {statistics.median(latencies):.0f} ms" if latencies else ""
+        self.log(f"Pre-flight (port 22): {len(results) - len(unreachable)}/{len(results)} osiągalnych "
+                 f"w {time.time() - started:.1f} s{median}")
+        for device in devices:
+            if device.ip in unreachable:
+                self.log(f"  Nieosiągalny: {device.name} ({device.ip}) - {results[device.ip].reason}")
+        return unreachable
+
+    def forget_diagnosis(self, ip):
+        """Po udanym połączeniu wcześniejsze diagnozy i wynik pre-flight dla adresu są nieaktualne."""
+        with self.reachability_lock:
+            self.reachability.pop(ip, None)
+            for key in [key for key in self.diagnosis_cache if key[0] == ip]:
+                del self.diagnosis_cache[key]
+
+    def diagnose_ssh_error(self, ip, error, timeout=None, max_age=REACHABILITY_TTL):
+        """
+        Diagnostyka błędów SSH z rozróżnieniem przyczyn. Wynik zapamiętywany na DIAGNOSIS_TTL
+        (lub max_age, jeśli krótsze) dla pary (IP, klasa błędu), wspólnie dla wszystkich workerów.
+        """
+        if timeout is None:
+            timeout = self.ssh_timeout
+
+        error_msg = str(error).lower()
+
+        if isinstance(error, load_paramiko().AuthenticationException) or "authentication failed" in error_msg:
+            return "Błędne hasło"
+
+        key = (ip, type(error).__name__)
+        with self.reachability_lock:
+            cached = self.diagnosis_cache.get(key)
+        if cached and time.time() - cached[1] <= min(DIAGNOSIS_TTL, max_age):
+            return cached[0]
+
+        probe = self.probe_reachability(ip, timeout=min(timeout, 5), max_age=max_age)
+        if not probe.reachable:
+            diagnosis = probe.reason
+        elif isinstance(error, socket.timeout) or "timed out" in error_msg or "timeout" in error_msg:
+            diagnosis = "Timeout połączenia"
+        else:
+            diagnosis = "Błąd połączenia SSH"
+
+        with self.reachability_lock:
+            self.diagnosis_cache[key] = (diagnosis, time.time())
+        return diagnosis
+
+    @contextmanager
+    def ssh_connection(self, device):
+        """
+        Context manager dla bezpiecznego zarządzania połączeniem SSH.
+        Automatycznie zamyka połączenie nawet przy błędach.
+        
+        Użycie:
+            with self.ssh_connection(device) as (ssh, sftp):
+                # ... operacje ...
+        """
+        ssh = None
+        sftp = None
+        
+        try:
+            self.log(f"  Otwieranie połączenia SSH do {device.ip}...")
+
+            ssh = self.create_ssh_client(device.ip, device.password)
+            
+            sftp = ssh.open_sftp()
+            
+            self.log(f"  Połączono z {device.ip}")
+            
+            yield ssh, sftp
+            
+        except Exception as e:
+            self.log(f"  Błąd połączenia SSH: {str(e)}")
+            raise
+            
+        finally:
+            # Zamknij SFTP
+            if sftp:
+                try:
+                    sftp.close()
+                    time.sleep(1)
+                    self.log(f"  Zamknięto SFTP")
+                    time.sleep(0.3)
+                except Exception as e:
+                    self.log(f"  UWAGA: Błąd zamykania SFTP: {str(e)}")
+            
+            # Zamknij SSH
+            if ssh:
+                try:
+                    transport = ssh.get_transport()
+                    if transport and transport.is_active():
+                        transport.close()
+                    ssh.close()
+                    time.sleep(1)
+                    self.log(f"  Zamknięto SSH")
+                    time.sleep(1) 
+                except Exception as e:
+                    self.log(f"  UWAGA: Błąd zamykania SSH: {str(e)}")
+
+    def wait_for_ssh_back(self, device):
+        """Po restarcie czeka aktywnie na ponowną dostępność SSH sterownika."""
+        max_attempts = max(1, int(self.post_reboot_timeout / self.post_reboot_poll))
+        self.log(
+            f"  Oczekiwanie po restarcie: start po {self.post_reboot_wait}s, "
+            f"timeout globalny {self.post_reboot_timeout}s, "
+            f"max prób reconnect: ~{max_attempts}"
+        )
+        time.sleep(self.post_reboot_wait)
+
+        load_paramiko()
+        start_time = time.time()
+        attempt = 0
+
+        while (time.time() - start_time) < self.post_reboot_timeout:
+            attempt += 1
+            test_ssh = None
+            try:
+                test_ssh = paramiko.SSHClient()
+                test_ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                test_ssh.connect(
+                    device.ip,
+                    username=PLC_USER,
+                    password=device.password,
+                    timeout=10,
+                    banner_timeout=10,
+                    auth_timeout=10,
+                    allow_agent=False,
+                    look_for_keys=False
+                )
+
+                transport = test_ssh.get_transport()
+                if transport:
+                    transport.set_keepalive(self.ssh_keepalive)
+
+                self.log(f"  Sterownik {device.ip} wrócił online (próba {attempt})")
+                return True
+            except (paramiko.AuthenticationException, ConnectionRefusedError, socket.timeout, TimeoutError, OSError) as e:
+                elapsed = int(time.time() - start_time)
+                reason = self.diagnose_ssh_error(device.ip, e, timeout=10, max_age=self.post_reboot_poll)
+                self.log(
+                    f"  Reconnect próba {attempt}/{max_attempts} nieudana "
+                    f"({elapsed}s/{self.post_reboot_timeout}s): {reason}"
+                )
+                time.sleep(self.post_reboot_poll)
+            except Exception as e:
+                elapsed = int(time.time() - start_time)
+                self.log(
+                    f"  Reconnect próba {attempt}/{max_attempts} nieudana "
+                    f"({elapsed}s/{self.post_reboot_timeout}s): {str(e)}"
+                )
+                time.sleep(self.post_reboot_poll)
+            finally:
+                if test_ssh:
+                    try:
+                        test_ssh.close()
+                    except:
+                        pass
+
+        raise Exception(
+            f"Sterownik nie wrócił online po {self.post_reboot_timeout}s "
+            f"od pierwszej próby połączenia (wykonano {attempt} prób reconnect)"
+        )
+
+    def is_transient_error(self, error):
+        """Błędy tymczasowe - można ponawiać."""
+        error_msg = str(error).lower()
+        transient_keywords = [
+            "timeout", "timed out", "eof", "socket", "connection reset",
+            "connection refused", "network", "host unreachable", "banner"
+        ]
+        return any(keyword in error_msg for keyword in transient_keywords)
+
+    def is_fatal_error(self, error):
+        """Błędy krytyczne - bez retry."""
+        return isinstance(error, FatalUpdateError)
+
+    def execute_firmware_update(self, device):
+        if self.detached_update:
+            return self.start_detached_firmware_update(device)
+
+        ssh = None
+        try:
+            device.status = "Aktualizacja firmware..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            self.log(f"  Nowe połączenie SSH dla firmware update...")
+
+            ssh = self.create_ssh_client(device.ip, device.password)
+            
+            install_command, reboots_itself = self.firmware_install_command(device)
+            update_command = f"sudo {install_command}"
+            self.log(f"  Uruchamiam: {update_command}")
+            self.log(f"  Czekam na zakończenie procesu update (może zająć kilka minut)...")
+            
+            exit_code = self.run_install_command(ssh, device, update_command, reboots_itself)
+            
+            if reboots_itself:
+                if exit_code == 0:
+                    self.log("  Aktualizacja firmware zakończona. Sterownik restartuje się")
+                else:
+                    self.log(f"  update-axcf zakończony kodem {exit_code} bez błędu RAUC "
+                             f"(może być normalne przy reboot) - wynik po weryfikacji wersji")
+                device.status = "Oczekiwanie na restart..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+                self.wait_for_ssh_back(device)
+                if exit_code != 0:
+                    self.verify_installed_version(device, exit_code)
+            else:
+                self.log("  Instalacja zakończona - restart sterownika")
+                self.execute_reboot(device)
+            
+        except Exception as e:
+            raise e
+        finally:
+            if ssh:
+                try:
+                    transport = ssh.get_transport()
+                    if transport and transport.is_active():
+                        transport.close()
+                    ssh.close()
+                    time.sleep(1)
+                    self.log("  Zamknięto SSH")
+                except:
+                    pass
+            
+            time.sleep(3)
+
+    def verify_installed_version(self, device, exit_code):
+        """
+        Po restarcie z niejednoznacznym wynikiem update-axcf (niezerowy kod, brak kodu, timeout)
+        odczytuje wersję firmware i porównuje z docelową. Rzuca InstallFailedError przy niezgodności.
+        """
+        with self.ssh_connection(device) as (ssh, sftp):
+            stdin, stdout, stderr = ssh.exec_command(ARPVERSION_COMMAND)
+            device.firmware_version = parse_arpversion(stdout.read().decode(errors="ignore").strip())
+        firmware_file = self.firmware_for_device(device)
+        if not self.compare_firmware_versions(device.firmware_version, firmware_file):
+            raise InstallFailedError(
+                f"Instalacja nieudana (exit: {exit_code}): po restarcie firmware {device.firmware_version}, "
+                f"docelowe {self.get_target_fw_version(firmware_file)}",
+                exit_code
+            )
+        self.log(f"  Firmware po restarcie: {device.firmware_version} - instalacja potwierdzona")
+
+    def firmware_install_command(self, device):
+        """
+        Komenda instalacji przygotowanego bundle (bez sudo). update-axcf bierze plik z domyślnego
+        katalogu i sam restartuje sterownik; bundle z innego katalogu instalowany przez 'rauc install'.
+        Zwraca (komenda, czy_restartuje_sam).
+        """
+        if device.staged_path and os.path.dirname(device.staged_path) != FIRMWARE_STAGING_PATHS[0]:
+            return f"rauc install {device.staged_path}", False
+        return f"update-axcf{device.plc_model}", True
+
+    def select_staging_path(self, ssh, local_path, device=None):
+        """
+        Przed uploadem: w jednym wywołaniu sprawdza wolne miejsce (df) we wszystkich
+        FIRMWARE_STAGING_PATHS, opcjonalnie usuwa stare *.raucb / *.partial i wybiera
+        pierwszy katalog z wystarczającą ilością miejsca (z uwzględnieniem już wysłanej części).
+        Rzuca InsufficientSpaceError (bez retry), gdy nigdzie nie ma miejsca. Zwraca pełną ścieżkę zdalną.
+        """
+        filename = os.path.basename(local_path)
+        local_size = os.path.getsize(local_path)
+
+        cleanup = ""
+        if self.cleanup_stale_bundles:
+            cleanup = (
+                f"find \"$d\" -maxdepth 1 \\( -name '*.raucb' -o -name '*.raucb.partial' \\) "
+                f"! -name '{filename}' ! -name '{filename}.partial' "
+                f"-exec rm -f {{}} \\; -exec echo DEL {{}} \\; 2>/dev/null; "
+            )
+        command = (
+            f"for d in {' '.join(FIRMWARE_STAGING_PATHS)}; do "
+            f"[ -d \"$d\" ] || continue; {cleanup}"
+            f"for f in \"$d/{filename}\" \"$d/{filename}.partial\"; do "
+            f"[ -f \"$f\" ] && echo HAVE $d $(stat -c %s \"$f\"); done; "
+            f"echo FREE $d $(df -Pk \"$d\" | tail -n 1 | awk '{{print $4}}'); done"
+        )
+        stdin, stdout, stderr = ssh.exec_command(command, timeout=60)
+        output = stdout.read().decode(errors="ignore")
+
+        free_space = {}
+        existing = {}
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) >= 2 and parts[0] == "DEL":
+                self.log(f"  Usunięto stary plik: {parts[1]}")
+            elif len(parts) == 3 and parts[0] == "FREE" and parts[2].isdigit():
+                free_space[parts[1]] = int(parts[2]) * 1024
+            elif len(parts) == 3 and parts[0] == "HAVE" and parts[2].isdigit():
+                existing[parts[1]] = max(existing.get(parts[1], 0), int(parts[2]))
+
+        summary = []
+        for directory in FIRMWARE_STAGING_PATHS:
+            if directory not in free_space:
+                continue
+            already = min(existing.get(directory, 0), local_size)
+            required = local_size - already + STAGING_SPACE_MARGIN
+            summary.append(f"{directory}: {free_space[directory]/1024/1024:.0f} MB wolne")
+            if free_space[directory] >= required:
+                remote_path = f"{directory}/{filename}"
+                if directory != FIRMWARE_STAGING_PATHS[0]:
+                    self.log(f"  UWAGA: Za mało miejsca w {FIRMWARE_STAGING_PATHS[0]} - używam {directory}")
+                self.log(f"  Miejsce na bundle: {free_space[directory]/1024/1024:.0f} MB wolne w {directory} "
+                         f"(potrzeba {required/1024/1024:.0f} MB)")
+                if device is not None:
+                    device.staged_path = remote_path
+                return remote_path
+
+        raise InsufficientSpaceError(
+            f"Brak miejsca na firmware ({local_size/1024/1024:.0f} MB): "
+            f"{', '.join(summary) or 'nie można odczytać wolnego miejsca'}"
+        )
+
+    def run_install_command(self, ssh, device, command, reboots_itself=False):
+        """
+        Wykonuje komendę instalacji (sudo, PTY) i śledzi postęp parserem InstallProgressParser.
+        Rzuca typowany InstallFailedError przy błędzie RAUC lub niezerowym kodzie wyjścia
+        (dla komendy restartującej sterownik - tylko przy błędzie RAUC, patrz classify_install_failure).
+        Zwraca kod wyjścia.
+        """
+        channel = None
+        parser = None
+        try:
+            channel = ssh.get_transport().open_session()
+            channel.get_pty()
+            channel.exec_command(command)
+            channel.send(device.password + "\n")
+            
+            parser = self.begin_install_tracking(device)
+            exit_code = None
+            start_time = time.time()
+            timeout = self.update_command_timeout
+            
+            while True:
+                if time.time() - start_time > timeout:
+                    self.log(f"  UWAGA: Timeout - przekroczono {timeout}s oczekiwania")
+                    break
+                
+                while channel.recv_ready():
+                    self.feed_install_output(device, parser, channel.recv(4096).decode(errors="ignore"))
+                
+                if channel.exit_status_ready():
+                    exit_code = channel.recv_exit_status()
+                    while channel.recv_ready():
+                        self.feed_install_output(device, parser, channel.recv(4096).decode(errors="ignore"))
+                    self.log(f"  Proces zakończony z kodem: {exit_code}")
+                    
+                    if exit_code == EXIT_CODE_DISCONNECTED:
+                        self.log(f"  Kanał zamknięty bez kodu wyjścia (restart sterownika w trakcie instalacji?)")
+                    break
+                
+                time.sleep(0.5)
+            
+            if channel.recv_stderr_ready():
+                errors = channel.recv_stderr(4096).decode(errors="ignore")
+                if errors.strip():
+                    self.log(f"  UWAGA: Stderr: {errors[:200]}")
+                    for line in errors.split('\n'):
+                        parser.parse_line(line)
+            
+            self.end_install_tracking(device, parser)
+            failure = classify_install_failure(exit_code, parser, reboots_itself)
+            if failure:
+                raise failure
+            return exit_code
+        finally:
+            if parser is not None and self.install_parsers.get(device.ip) is parser:
+                # Przerwane wyjątkiem przed end_install_tracking - parser nie może zostać w ETA floty
+                self.install_parsers.pop(device.ip, None)
+                self.update_install_eta()
+            if channel:
+                try:
+                    channel.close()
+                    self.log("  Zamknięto kanał SSH")
+                except:
+                    pass
+
+    def ensure_firmware_http_server(self, firmware_file):
+        """Uruchamia lokalny serwer HTTP z firmware (jeśli trzeba) i rejestruje w nim plik. Współdzielony przez workery."""
+        with self.http_server_lock:
+            server = self.firmware_http_server
+            if server and server.server_address[1] != self.http_install_port:
+                server.stop()
+                server = None
+            if server is None:
+                from firmware_http import FirmwareHttpServer
+                server = FirmwareHttpServer(self.http_install_port, log=self.log)
+                server.start()
+                self.firmware_http_server = server
+                self.log(f"Serwer HTTP firmware uruchomiony na porcie {self.http_install_port}")
+            server.add_file(firmware_file)
+            return server
+
+    def stop_firmware_http_server(self):
+        with self.http_server_lock:
+            if self.firmware_http_server:
+                served_mb = self.firmware_http_server.served_bytes / 1024 / 1024
+                self.firmware_http_server.stop()
+                self.firmware_http_server = None
+                self.log(f"Serwer HTTP firmware zatrzymany (wysłano {served_mb:.1f} MB)")
+
+    def execute_http_firmware_update(self, device, firmware_file):
+        """
+        Instalacja strumieniowa: sterownik pobiera bundle z lokalnego serwera HTTP
+        ('rauc install <url>'), bez zapisu pliku do /opt/plcnext. Transfer i instalacja
+        przebiegają jednocześnie. RAUC nie restartuje sterownika - restart przez execute_reboot().
+        """
+        server = self.ensure_firmware_http_server(firmware_file)
+        ssh = None
+        try:
+            device.status = "Instalacja strumieniowa (HTTP)..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            self.log(f"  Nowe połączenie SSH dla instalacji strumieniowej...")
+
+            ssh = self.create_ssh_client(device.ip, device.password)
+
+            # Lokalny adres, przez który widzimy sterownik - ten sam adres poda PLC do pobrania
+            host_ip = ssh.get_transport().sock.getsockname()[0]
+            url = server.url_for(host_ip, firmware_file)
+            install_command = f"sudo rauc install {url}"
+            self.log(f"  Uruchamiam: {install_command}")
+
+            self.run_install_command(ssh, device, install_command)
+            self.log("  Instalacja strumieniowa zakończona")
+        finally:
+            if ssh:
+                try:
+                    ssh.close()
+                    time.sleep(1)
+                    self.log("  Zamknięto SSH")
+                except:
+                    pass
+
+        self.execute_reboot(device)
+
+    def start_detached_firmware_update(self, device):
+        """
+        Uruchamia update-axcf w tle na sterowniku (setsid/nohup) i od razu zwalnia połączenie.
+        PID powłoki w tle trafia do DETACHED_PID_FILE, wyjście do DETACHED_UPDATE_LOG,
+        a na końcu dopisywany jest znacznik z kodem wyjścia.
+        Postęp i wynik sprawdza poll_detached_update() (odczyt lub monitor_detached_updates()).
+        """
+        ssh = None
+        try:
+            device.status = "Uruchamianie instalacji w tle..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            self.log(f"  Nowe połączenie SSH dla firmware update (tryb w tle)...")
+
+            ssh = self.create_ssh_client(device.ip, device.password)
+
+            install_command, reboots_itself = self.firmware_install_command(device)
+            if reboots_itself:
+                inner = (
+                    f"echo \\$\\$ > {DETACHED_PID_FILE}; "
+                    f"{install_command} > {DETACHED_UPDATE_LOG} 2>&1; "
+                    f"echo {DETACHED_EXIT_MARKER}\\$? >> {DETACHED_UPDATE_LOG}"
+                )
+            else:
+                inner = (
+                    f"echo \\$\\$ > {DETACHED_PID_FILE}; "
+                    f"{install_command} > {DETACHED_UPDATE_LOG} 2>&1; rc=\\$?; "
+                    f"echo {DETACHED_EXIT_MARKER}\\$rc >> {DETACHED_UPDATE_LOG}; "
+                    f"[ \\$rc -eq 0 ] && reboot"
+                )
+            command = f"sudo sh -c \"setsid nohup sh -c '{inner}' > /dev/null 2>&1 < /dev/null &\""
+            self.log(f"  Uruchamiam w tle: sudo {install_command} (log: {DETACHED_UPDATE_LOG})")
+
+            stdin, stdout, stderr = ssh.exec_command(command, get_pty=True)
+            stdin.write(device.password + "\n")
+            stdin.flush()
+            stdout.channel.recv_exit_status()
+            time.sleep(2)
+
+            state, exit_code, last_line = self.poll_detached_update(ssh, device)
+            if state == "missing":
+                raise Exception("Nie udało się uruchomić update-axcf w tle (brak pliku logu)")
+
+            device.install_state = "W toku"
+            device.status = "Instalacja w tle..."
+            self.log(f"  Instalacja uruchomiona w tle ({state}). Połączenie zostaje zwolnione")
+            self.after(0, lambda d=device: self.update_device_row(d))
+        finally:
+            if ssh:
+                try:
+                    ssh.close()
+                    self.log("  Zamknięto SSH")
+                except:
+                    pass
+
+    def poll_detached_update(self, ssh, device):
+        """
+        Jedna lekka komenda (detached_poll_command): koniec logu instalacji + sprawdzenie,
+        czy powłoka uruchomiona w tle (PID z DETACHED_PID_FILE) nadal działa. Nie pgrep -f -
+        dopasowałby powłokę samej komendy kontrolnej, która ma ścieżkę logu w argumentach.
+        Zwraca (state, exit_code, last_line) - stany jak w parse_detached_poll().
+        """
+        stdin, stdout, stderr = ssh.exec_command(detached_poll_command(), timeout=15)
+        output = stdout.read().decode(errors="ignore")
+        state, exit_code, last_line, parser = parse_detached_poll(output)
+
+        if parser.percent is not None or parser.step:
+            device.install_progress = parser.percent
+            device.install_step = parser.step
+        if last_line:
+            device.install_detail = last_line[:200]
+        return state, exit_code, last_line
+
+    def check_detached_update(self, device):
+        """Krótkie połączenie kontrolne dla instalacji w tle. Zwraca (state, exit_code, last_line)."""
+        ssh = None
+        try:
+            ssh = self.create_ssh_client(device.ip, device.password, timeout=10)
+            return self.poll_detached_update(ssh, device)
+        except Exception as e:
+            return "offline", None, str(e)
+        finally:
+            if ssh:
+                try:
+                    ssh.close()
+                except:
+                    pass
+
+    def monitor_detached_updates(self, devices):
+        """
+        Cyklicznie sprawdza instalacje uruchomione w tle aż do zakończenia lub timeoutu
+        (update_command_timeout + post_reboot_timeout). Wynik weryfikowany odczytem wersji.
+        Zwraca listę (device, ok, message).
+        """
+        pending = list(devices)
+        results = []
+        start_time = time.time()
+        timeout = self.update_command_timeout + self.post_reboot_timeout
+
+        self.log(f"\nMonitorowanie instalacji w tle: {len(pending)} sterownik(ów), "
+                 f"co {self.detached_poll_interval}s, timeout {timeout}s")
+
+        while pending and (time.time() - start_time) < timeout:
+            if not self.processing:
+                self.log("Monitorowanie instalacji przerwane przez użytkownika")
+                break
+
+            for device in list(pending):
+                state, exit_code, last_line = self.check_detached_update(device)
+
+                if state == "running":
+                    device.status = "Instalacja w tle..."
+                    if last_line:
+                        self.log(f"  [{device.name}] {last_line[:120]}")
+                elif state == "offline":
+                    device.status = "Restart po aktualizacji..."
+                else:
+                    # Zakończona, przerwana restartem lub log zniknął - weryfikacja wersji
+                    try:
+                        device.install_state = "Weryfikacja"
+                        self.read_single_device(device)
+                    except Exception as e:
+                        device.install_state = "W toku"
+                        self.log(f"  [{device.name}] Weryfikacja po instalacji nieudana, ponowię: {str(e)}")
+                        continue
+
+                    pending.remove(device)
+                    try:
+                        firmware_file = self.firmware_for_device(device)
+                    except FatalUpdateError:
+                        firmware_file = ""
+                    if firmware_file and self.compare_firmware_versions(device.firmware_version, firmware_file):
+                        device.install_state = "Zakończona"
+                        device.status = "OK"
+                        device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        results.append((device, True, ""))
+                        self.log(f"[{device.name}] Instalacja w tle zakończona (exit: {exit_code}), firmware {device.firmware_version}")
+                    else:
+                        message = (
+                            f"Instalacja w tle nieudana (exit: {exit_code}, wersja: {device.firmware_version}): "
+                            f"{device.install_detail}"
+                        )
+                        device.install_state = "Błąd"
+                        device.status = "Błąd"
+                        device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {message}"
+                        results.append((device, False, message))
+                        self.log(f"[{device.name}] {message}")
+
+                self.after(0, lambda d=device: self.update_device_row(d))
+
+            if pending:
+                time.sleep(self.detached_poll_interval)
+
+        for device in pending:
+            message = f"Brak potwierdzenia instalacji w tle po {int(time.time() - start_time)}s"
+            device.install_state = "Błąd"
+            device.status = "Błąd"
+            device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {message}"
+            results.append((device, False, message))
+            self.log(f"[{device.name}] {message}")
+            self.after(0, lambda d=device: self.update_device_row(d))
+
+        return results
+
+    def execute_reboot(self, device):
+        ssh = None
+        try:
+            device.status = "Oczekiwanie na restart..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            self.log(f"  Nowe połączenie SSH dla reboot...")
+
+            ssh = self.create_ssh_client(device.ip, device.password)
+            
+            self.log("  Uruchamiam 'sudo reboot'...")
+            
+            stdin, stdout, stderr = ssh.exec_command("sudo reboot", get_pty=True)
+            stdin.write(device.password + "\n")
+            stdin.flush()
+            time.sleep(2)
+            
+        except Exception as e:
+            # Ignoruj błędy zamknięcia - reboot ich powoduje
+            if "Socket is closed" in str(e) or "Timeout" in str(e) or "EOF" in str(e):
+                self.log("  Reboot zainicjowany (połączenie przerwane - oczekiwane)")
+            else:
+                raise e
+        finally:
+            if ssh:
+                try:
+                    ssh.close()
+                    time.sleep(1)
+                    self.log("  Zamknięto SSH po reboot")
+                except:
+                    pass
+            time.sleep(1)
+
+        self.wait_for_ssh_back(device)
+
+    def upload_callback(self, filename, transferred, total, device=None):
+        """
+        Callback wywoływany podczas uploadu pliku przez SFTP.
+        Aktualizuje progress bar i status.
+        """
+        if total > 0:
+            percent = (transferred / total) * 100
+            
+            # Oblicz rozmiary w MB
+            transferred_mb = transferred / 1024 / 1024
+            total_mb = total / 1024 / 1024
+            
+            # Formatuj status
+            status_text = f"{filename}: {transferred_mb:.1f} MB / {total_mb:.1f} MB ({percent:.1f}%)"
+
+            if device:
+                device.status = f"Wysyłanie pliku ({int(percent)}%)..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+            
+            # Aktualizuj progress bar i status (GUI - thread-safe przez after)
+            self.after(0, lambda p=percent, t=status_text: self.show_upload_progress(p, t, "#3B82F6"))
+            
+            # Log co 10%
+            progress_threshold = int(percent // 10) * 10
+            last_logged = self.upload_log_progress.get(filename, 0)
+
+            if progress_threshold >= 10 and progress_threshold > last_logged:
+                self.upload_log_progress[filename] = progress_threshold
+                self.log(f"  Upload: {progress_threshold}% ({transferred_mb:.1f}/{total_mb:.1f} MB)")
+
+    def upload_file_with_resume(self, sftp, local_path, remote_path, device=None, rate_limit=None):
+        """
+        Upload z obsługą .partial, wznowieniem i timeoutami postępu.
+        rate_limit - opcjonalny limit przepustowości w bajtach/s (pre-stage w tle).
+        """
+        filename = os.path.basename(local_path)
+        remote_partial_path = f"{remote_path}.partial"
+        local_size = os.path.getsize(local_path)
+
+        if local_size <= 0:
+            raise Exception(f"Nieprawidłowy rozmiar pliku: {filename}")
+
+        resume_offset = 0
+        try:
+            resume_offset = sftp.stat(remote_partial_path).st_size
+        except FileNotFoundError:
+            resume_offset = 0
+        except IOError:
+            resume_offset = 0
+
+        if resume_offset > local_size:
+            self.log(f"  UWAGA: Plik .partial większy niż lokalny. Usuwam i zaczynam od zera: {remote_partial_path}")
+            sftp.remove(remote_partial_path)
+            resume_offset = 0
+
+        if resume_offset > 0:
+            resume_offset = self.verify_partial_resume(sftp, local_path, remote_partial_path, resume_offset)
+
+        if resume_offset > 0:
+            self.log(
+                f"  Wznawianie transferu od {resume_offset/1024/1024:.1f} MB "
+                f"z {local_size/1024/1024:.1f} MB"
+            )
+        else:
+            self.log(f"  Start transferu: {filename} ({local_size/1024/1024:.1f} MB)")
+
+        transfer_start = time.time()
+        transferred = resume_offset
+        chunk_size = 64 * 1024
+        remaining = local_size - resume_offset
+        expected_rate = self.predict_upload_throughput(device)
+        if rate_limit:
+            expected_rate = min(expected_rate, rate_limit)
+        upload_timeout = self.upload_deadline(remaining, expected_rate)
+        self.log(
+            f"  Deadline uploadu: {upload_timeout}s "
+            f"(zakładane {expected_rate/1024:.0f} KB/s x{self.upload_safety_factor})"
+        )
+        stall_rate = self.stall_min_rate * 1024
+        if rate_limit:
+            stall_rate = min(stall_rate, rate_limit / 2)
+        window = deque([(transfer_start, transferred)])
+
+        channel = sftp.get_channel()
+        channel.settimeout(self.idle_timeout)
+
+        mode = 'ab' if resume_offset > 0 else 'wb'
+        try:
+            with self.firmware_maps.mapped(local_path) as local_view:
+                with sftp.open(remote_partial_path, mode) as remote_file:
+                    while transferred < local_size:
+                        now = time.time()
+                        elapsed = now - transfer_start
+                        if elapsed >= UPLOAD_RATE_WARMUP and transferred > resume_offset:
+                            # Re-estymacja: deadline z bieżącej przepustowości
+                            measured_rate = (transferred - resume_offset) / elapsed
+                            upload_timeout = self.upload_deadline(remaining, measured_rate)
+                        if elapsed > upload_timeout:
+                            raise TimeoutError(
+                                f"Timeout uploadu: przekroczono {upload_timeout}s "
+                                f"dla pliku {filename}"
+                            )
+
+                        window.append((now, transferred))
+                        while len(window) > 2 and now - window[1][0] >= self.stall_window:
+                            window.popleft()
+                        window_span = now - window[0][0]
+                        if window_span >= self.stall_window:
+                            window_rate = (transferred - window[0][1]) / window_span
+                            if window_rate < stall_rate:
+                                raise TimeoutError(
+                                    f"Transfer zawieszony: {window_rate/1024:.1f} KB/s przez ostatnie "
+                                    f"{window_span:.0f}s (próg {stall_rate/1024:.0f} KB/s)"
+                                )
+
+                        data = local_view[transferred:transferred + chunk_size]
+                        if not data:
+                            break
+
+                        try:
+                            remote_file.write(data)
+                            remote_file.flush()
+                        except socket.timeout as e:
+                            raise TimeoutError(
+                                f"Brak postępu transferu przez {self.idle_timeout}s "
+                                f"(idle timeout)"
+                            ) from e
+
+                        transferred += len(data)
+                        self.upload_callback(filename, transferred, local_size, device=device)
+
+                        if rate_limit:
+                            ahead = (transferred - resume_offset) / rate_limit - (time.time() - transfer_start)
+                            if ahead > 0:
+                                time.sleep(ahead)
+        finally:
+            channel.settimeout(None)
+
+        elapsed = time.time() - transfer_start
+        if not rate_limit and elapsed > 0 and remaining >= chunk_size:
+            self.record_upload_throughput(device, remaining / elapsed)
+
+        remote_partial_size = sftp.stat(remote_partial_path).st_size
+        if remote_partial_size != local_size:
+            raise Exception(
+                f"Transfer niepełny! Lokalny: {local_size}, Zdalny .partial: {remote_partial_size}"
+            )
+
+        try:
+            sftp.remove(remote_path)
+        except FileNotFoundError:
+            pass
+        except IOError:
+            pass
+
+        sftp.rename(remote_partial_path, remote_path)
+
+        remote_size = sftp.stat(remote_path).st_size
+        if remote_size != local_size:
+            raise Exception(f"Weryfikacja po rename nieudana! Lokalny: {local_size}, Zdalny: {remote_size}")
+
+        self.log(f"  Transfer ukończony: {filename}")
+        return remote_size
+
+    def predict_upload_throughput(self, device):
+        """
+        Przewidywana przepustowość uploadu (bajty/s): ostatni pomiar dla sterownika,
+        potem zapisany profil sieci, w przeciwnym razie mediana floty.
+        """
+        if device is not None and device.upload_throughput:
+            return device.upload_throughput
+        if device is not None:
+            stored = self.network_profiles.get(device.ip).get("upload_bps")
+            if stored:
+                return stored
+        return self.network_profiles.fleet_median("upload_bps") or ASSUMED_UPLOAD_THROUGHPUT
+
+    def record_upload_throughput(self, device, rate):
+        """Zapamiętuje zmierzoną przepustowość uploadu dla kolejnych deadline'ów."""
+        if device is None:
+            return
+        device.upload_throughput = rate
+        self.network_profiles.record(device.ip, name=device.name, upload_bps=rate)
+
+    def upload_deadline(self, remaining_bytes, rate):
+        """Deadline (s) dla pozostałych bajtów przy danej przepustowości, nie krótszy niż upload_timeout."""
+        return max(self.upload_timeout, int(remaining_bytes / max(rate, 1) * self.upload_safety_factor))
+
+    def verify_partial_resume(self, sftp, local_path, remote_partial_path, resume_offset):
+        """
+        Przed wznowieniem porównuje ostatni pełny blok pliku .partial z sumą bloku z cache
+        (tylko gdy suma lokalna jest już gotowa - nie blokuje uploadu). Przy niezgodności
+        obcina .partial do początku tego bloku. Zwraca offset, od którego wznowić.
+        """
+        entry = self.digest_cache.peek(local_path)
+        if not entry:
+            return resume_offset
+        block_size = entry["block_size"]
+        block_index = resume_offset // block_size - 1
+        if block_index < 0:
+            return resume_offset
+
+        channel = None
+        try:
+            channel = sftp.get_channel().get_transport().open_session()
+            channel.settimeout(60)
+            channel.exec_command(
+                f"dd if='{remote_partial_path}' bs={block_size} skip={block_index} count=1 2>/dev/null | sha256sum"
+            )
+            output = b""
+            while True:
+                data = channel.recv(4096)
+                if not data:
+                    break
+                output += data
+            remote_block = output.decode(errors="ignore").split()[0].lower() if output.strip() else ""
+        except Exception as e:
+            self.log(f"  UWAGA: Nie można zweryfikować pliku .partial ({str(e)}) - wznawiam bez weryfikacji")
+            return resume_offset
+        finally:
+            if channel:
+                channel.close()
+
+        if remote_block == entry["blocks"][block_index]:
+            return resume_offset
+
+        truncated = block_index * block_size
+        self.log(
+            f"  UWAGA: Blok {block_index} pliku .partial niezgodny z lokalnym - "
+            f"obcinam do {truncated/1024/1024:.1f} MB"
+        )
+        sftp.truncate(remote_partial_path, truncated)
+        return truncated
+
+    def reset_upload_progress(self):
+        """Resetuje progress bar po zakończeniu uploadu."""
+        self.upload_log_progress.clear()
+        self.after(0, lambda: self.show_upload_progress(0, "Oczekiwanie na transfer...", "#64748B"))
+
+    def begin_install_tracking(self, device):
+        """Rejestruje parser postępu instalacji dla sterownika (kolumna Instalacja + ETA floty)."""
+        parser = InstallProgressParser()
+        self.install_parsers[device.ip] = parser
+        device.install_progress = None
+        device.install_step = ""
+        return parser
+
+    def feed_install_output(self, device, parser, chunk):
+        """Przekazuje nowy fragment wyjścia instalacji do parsera i odświeża postęp."""
+        events = parser.feed(chunk)
+        for line in events:
+            self.log(f"    {line}")
+        if events:
+            self.apply_install_progress(device, parser)
+
+    def apply_install_progress(self, device, parser):
+        device.install_progress = parser.percent
+        device.install_step = parser.step
+        self.after(0, lambda d=device: self.update_device_row(d))
+        self.update_install_eta()
+
+    def end_install_tracking(self, device, parser):
+        for line in parser.finish():
+            self.log(f"    {line}")
+        self.apply_install_progress(device, parser)
+        self.install_durations.append(parser.elapsed())
+        if parser.finished:
+            self.network_profiles.record(device.ip, name=device.name, install_s=parser.elapsed())
+        self.install_parsers.pop(device.ip, None)
+        self.update_install_eta()
+
+    def estimate_fleet_install_eta(self):
+        """
+        Szacuje czas do końca instalacji w całej partii: najdłuższa trwająca instalacja
+        plus oczekujące sterowniki rozłożone na workery, ze średnim zmierzonym czasem instalacji.
+        Zwraca sekundy lub None, gdy brak danych.
+        """
+        etas = [eta for eta in (p.eta_seconds() for p in list(self.install_parsers.values())) if eta is not None]
+        active_eta = max(etas) if etas else 0
+        durations = list(self.install_durations)
+        if not durations:
+            return active_eta or None
+        average = sum(durations) / len(durations)
+        workers = max(1, min(5, int(self.parallel_workers)))
+        rounds = -(-self.batch_pending_count // workers)
+        return active_eta + rounds * average
+
+    def update_install_eta(self):
+        eta = self.estimate_fleet_install_eta()
+        if eta is None:
+            text = "ETA instalacji: --"
+        else:
+            text = f"ETA instalacji (flota): ~{int(eta // 60)} min {int(eta % 60)} s"
+        self.after(0, lambda: self.show_install_eta(text))
+
+    def expected_firmware_size(self, device):
+        """Rozmiar bundle, który dostanie sterownik (0, gdy nieznany)."""
+        path = self.firmware_path.get()
+        if self.firmware_catalog:
+            bundle = self.firmware_catalog.select(device.plc_model)
+            path = bundle.path if bundle else ""
+        try:
+            return os.path.getsize(path) if path else 0
+        except OSError:
+            return 0
+
+    def estimate_device_job(self, device, operation):
+        """
+        Szacowany czas (s) operacji dla sterownika z jego profilu sieci:
+        handshake + komendy x RTT, upload bundle przy zmierzonej przepustowości,
+        instalacja i restart.
+        """
+        profile = self.network_profiles.get(device.ip)
+        handshake_ms = (profile.get("handshake_ms") or self.network_profiles.fleet_median("handshake_ms")
+                        or ASSUMED_HANDSHAKE_MS)
+        rtt_ms = profile.get("rtt_ms") or self.network_profiles.fleet_median("rtt_ms") or ASSUMED_RTT_MS
+        seconds = (handshake_ms + ESTIMATED_COMMANDS_PER_JOB * rtt_ms) / 1000
+
+        if operation in ("firmware", "all", "prestage"):
+            rate = self.predict_upload_throughput(device)
+            if operation == "prestage" and self.prestage_rate_limit:
+                rate = min(rate, self.prestage_rate_limit * 1024)
+            seconds += self.expected_firmware_size(device) / rate
+        if operation in ("firmware", "all", "activate"):
+            install_s = (profile.get("install_s") or self.network_profiles.fleet_median("install_s")
+                         or ASSUMED_INSTALL_SECONDS)
+            seconds += install_s + self.post_reboot_wait
+        return seconds
+
+    def plan_batch_order(self, operation, max_workers):
+        """
+        Kolejność partii: najdłuższe oczekiwane zadania najpierw (LPT), co skraca czas
+        całej partii przy kilku workerach. Zwraca (lista sterowników, szacowany czas w s)
+        z symulacji przydziału do workerów z uwzględnieniem pauzy między sterownikami.
+        """
+        estimates = [(self.estimate_device_job(device, operation), device) for device in self.devices]
+        ordered = sorted(estimates, key=lambda item: item[0], reverse=True)
+        worker_free = [0.0] * max_workers
+        finish = 0.0
+        for index, (seconds, _) in enumerate(ordered):
+            start = max(heapq.heappop(worker_free), index * self.pause_between_devices)
+            heapq.heappush(worker_free, start + seconds)
+            finish = max(finish, start + seconds)
+        return [device for _, device in ordered], finish
+
+    def process_batch(self, operation):
+        """
+        Główna metoda przetwarzania wsadowego.
+        operation: "read", "system_services", "timezone", "firmware", "all", "prestage", "activate", "switch_slot"
+        """
+        self.processing = True
+        self.after(0, self.update_action_buttons_state)
+        
+        total = len(self.devices)
+        success_count = 0
+        failed_count = 0
+        failed_devices = []
+        max_workers = max(1, min(5, int(self.parallel_workers)))
+
+        def process_single_device(idx, device):
+            if not self.processing:
+                return "not_processed", "Operacja zatrzymana"
+
+            self.log(f"\n{'='*60}")
+            self.log(f"[{idx}/{total}] Przetwarzanie: {device.name} ({device.ip})")
+            self.log(f"{'='*60}")
+
+            device.status = "W trakcie"
+            device.error_log = ""
+            self.after(0, lambda d=device: self.update_device_row(d))
+
+            attempt = 0
+            success = False
+            last_error = ""
+
+            while attempt < self.retry_attempts and not success:
+                if not self.processing:
+                    return "not_processed", "Operacja zatrzymana"
+
+                attempt += 1
+
+                if attempt > 1:
+                    self.log(
+                        f"Retry próba {attempt}/{self.retry_attempts} "
+                        f"(pozostało {self.retry_attempts - attempt + 1} prób)"
+                    )
+                    time.sleep(self.retry_delay)
+
+                try:
+                    if operation == "read":
+                        self.read_single_device(device)
+                        success = True
+
+                    elif operation == "system_services":
+                        self.update_system_services_only(device)
+                        success = True
+
+                    elif operation == "timezone":
+                        self.update_timezone_only(device)
+                        success = True
+
+                    elif operation == "firmware":
+                        self.update_firmware_only_operation(device)
+                        success = True
+
+                    elif operation == "all":
+                        self.update_all_operations(device)
+                        success = True
+
+                    elif operation == "prestage":
+                        self.prestage_firmware_operation(device)
+                        success = True
+
+                    elif operation == "activate":
+                        self.activate_staged_firmware_operation(device)
+                        success = True
+
+                    elif operation == "switch_slot":
+                        self.switch_rauc_slot_operation(device)
+                        success = True
+
+                    if success:
+                        if device.install_state == "W toku":
+                            self.log(f"[{device.name}] Instalacja firmware trwa w tle - worker zwolniony")
+                            return "detached", ""
+                        device.status = "OK"
+                        self.log(f"[{device.name}] Operacja zakończona sukcesem")
+                        return "success", ""
+
+                except Exception as e:
+                    error_msg = str(e)
+                    last_error = error_msg
+                    device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {error_msg}"
+
+                    if self.is_fatal_error(e):
+                        device.status = "Błąd"
+                        self.log(f"[{device.name}] Błąd krytyczny (bez retry): {error_msg}")
+                        return "failed", error_msg
+
+                    if self.is_transient_error(e) and attempt < self.retry_attempts:
+                        self.log(
+                            f"Błąd tymczasowy (próba {attempt}/{self.retry_attempts}): {error_msg}"
+                        )
+                        self.log(
+                            f"  Kolejny retry za {self.retry_delay}s "
+                            f"(pozostało {self.retry_attempts - attempt} prób)"
+                        )
+                    else:
+                        device.status = "Błąd"
+                        if self.is_transient_error(e):
+                            self.log(f"[{device.name}] Operacja nieudana po {self.retry_attempts} próbach: {error_msg}")
+                        else:
+                            self.log(f"[{device.name}] Błąd nienaprawialny (bez retry): {error_msg}")
+                        return "failed", error_msg
+                finally:
+                    self.after(0, lambda d=device: self.update_device_row(d))
+
+            if not success:
+                device.status = "Błąd"
+                return "failed", last_error or "Nieznany błąd"
+
+            return "success", ""
+        
+        self.log(f"{'='*60}")
+        self.log(f"START OPERACJI WSADOWEJ: {operation.upper()}")
+        self.log(f"Liczba sterowników: {total}")
+        self.log(f"Tryb równoległy: {max_workers} worker(ów)")
+        self.log(f"{'='*60}")
+
+        self.after(0, lambda: self.show_batch_progress(
+            0, f"Start operacji {operation.upper()} (0/{total})", "#3B82F6"
+        ))
+        
+        completed = 0
+        detached_devices = []
+        self.install_durations.clear()
+        pinned_maps = self.pin_firmware_maps(operation)
+        ordered_devices, estimated_total = self.plan_batch_order(operation, max_workers)
+        self.log(f"Szacowany czas operacji: ~{int(estimated_total // 60)} min {int(estimated_total % 60)} s "
+                 f"(kolejność: najdłuższe zadania najpierw)")
+        unreachable = self.preflight_reachability(ordered_devices) if ordered_devices else set()
+        if unreachable:
+            reachable = [device for device in ordered_devices if device.ip not in unreachable]
+            skipped = [device for device in ordered_devices if device.ip in unreachable]
+            if self.skip_unreachable:
+                for device in skipped:
+                    reason = self.reachability[device.ip][0].reason
+                    device.status = "Błąd"
+                    device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: Pre-flight: {reason}"
+                    failed_count += 1
+                    failed_devices.append((device.name, f"Pre-flight: {reason}"))
+                    completed += 1
+                    self.record_device_result(device, "failed")
+                    self.after(0, lambda d=device: self.update_device_row(d))
+                self.log(f"Pominięto {len(skipped)} nieosiągalnych sterowników")
+                ordered_devices = reachable
+            else:
+                self.log(f"{len(skipped)} nieosiągalnych sterowników przeniesiono na koniec kolejki")
+                ordered_devices = reachable + skipped
+
+        def finish_device(device, result_status, error_msg):
+            nonlocal success_count, failed_count, completed
+            if result_status == "success":
+                success_count += 1
+            elif result_status == "detached":
+                detached_devices.append(device)
+            elif result_status == "failed":
+                failed_count += 1
+                failed_devices.append((device.name, error_msg))
+            if result_status in ("success", "failed"):
+                self.record_device_result(device, result_status)
+
+            completed += 1
+            progress_after = (completed / total) * 100 if total else 0
+            self.after(0, lambda p=progress_after, c=completed, t=total: self.show_batch_progress(
+                p, f"Postęp: {c}/{t} sterowników", "#3B82F6"
+            ))
+
+        if operation == "read" and self.async_read and ordered_devices:
+            import plc_asyncread
+            if plc_asyncread.available():
+                concurrency = max(1, int(self.async_read_concurrency))
+                self.log(f"Odczyt asynchroniczny: do {concurrency} sesji SSH naraz w jednej pętli zdarzeń")
+                plc_asyncread.read_devices(self, ordered_devices, concurrency, finish_device)
+                ordered_devices = []
+            else:
+                self.log("Odczyt asynchroniczny niedostępny (brak pakietu asyncssh) - odczyt pulą wątków")
+
+        # Kolejka sterowników: worker dostaje kolejny sterownik dopiero, gdy się zwolni, a w tym
+        # czasie w tle łączymy się z następnymi predial_ahead sterownikami (pre-dial).
+        waiting = deque(ordered_devices)
+        rescheduled = set()
+        self.start_predial()
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                running = {}
+                idx = 0
+                while waiting or running:
+                    while waiting and len(running) < max_workers:
+                        if not self.processing:
+                            self.log("Operacja zatrzymana przez użytkownika")
+                            waiting.clear()
+                            break
+                        device = waiting.popleft()
+
+                        error = self.predial_failure(device)
+                        if error is not None and not self.is_transient_error(error):
+                            device.status = "Błąd"
+                            device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {str(error)}"
+                            self.log(f"[{device.name}] Błąd nienaprawialny przy łączeniu w tle (bez retry): {str(error)}")
+                            self.after(0, lambda d=device: self.update_device_row(d))
+                            finish_device(device, "failed", str(error))
+                            continue
+                        if error is not None and waiting and id(device) not in rescheduled:
+                            rescheduled.add(id(device))
+                            waiting.append(device)
+                            self.log(f"[{device.name}] Łączenie w tle nieudane ({str(error)}) - sterownik przeniesiony na koniec kolejki")
+                            continue
+
+                        idx += 1
+                        if idx > 1 and self.pause_between_devices > 0:
+                            self.log(f"\nCzekam {self.pause_between_devices} sekund przed kolejnym sterownikiem...")
+                            time.sleep(self.pause_between_devices)
+
+                        running[executor.submit(process_single_device, idx, device)] = device
+                        self.predial_sessions([waiting[i] for i in range(min(self.predial_ahead, len(waiting)))])
+                    self.batch_pending_count = len(waiting)
+
+                    if not running:
+                        break
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        device = running.pop(future)
+                        try:
+                            result_status, error_msg = future.result()
+                        except Exception as e:
+                            result_status, error_msg = "failed", str(e)
+                        finish_device(device, result_status, error_msg)
+        finally:
+            self.stop_predial()
+
+        if detached_devices:
+            for device, ok, error_msg in self.monitor_detached_updates(detached_devices):
+                self.record_device_result(device, "success" if ok else "failed")
+                if ok:
+                    success_count += 1
+                else:
+                    failed_count += 1
+                    failed_devices.append((device.name, error_msg))
+
+        self.stop_firmware_http_server()
+        for key in pinned_maps:
+            self.firmware_maps.release(key)
+
+        processed_count = success_count + failed_count
+        not_processed_count = max(0, total - processed_count)
+
+        recommendations = []
+        if failed_devices:
+            failed_text = "\n".join(msg for _, msg in failed_devices).lower()
+            if "niezgodność" in failed_text or "kompatybil" in failed_text:
+                recommendations.append("- Sprawdź zgodność modelu firmware (axcf2152/axcf3152).")
+            if any(word in failed_text for word in ["timeout", "timed out", "connection", "socket", "eof"]):
+                recommendations.append("- Sprawdź łączność sieciową i dostęp SSH do sterowników.")
+            if "nie istnieje" in failed_text:
+                recommendations.append("- Zweryfikuj obecność wymaganych plików lokalnych (firmware/System Services).")
+        
+        # Podsumowanie
+        self.log(f"\n{'='*60}")
+        self.log(f"PODSUMOWANIE OPERACJI: {operation.upper()}")
+        self.log(f"{'='*60}")
+        self.log(f"Sukces: {success_count}/{total}")
+        self.log(f"Błędy: {failed_count}/{total}")
+        self.log(f"Nieprzetworzone: {not_processed_count}/{total}")
+        if failed_devices:
+            self.log("Lista nieudanych sterowników:")
+            for name, err in failed_devices[:10]:
+                self.log(f"   - {name}: {err[:120]}")
+            if len(failed_devices) > 10:
+                self.log(f"   ... i {len(failed_devices) - 10} więcej")
+
+        if recommendations:
+            self.log("Rekomendacje:")
+            for recommendation in recommendations:
+                self.log(f"   {recommendation}")
+        self.log(f"{'='*60}\n")
+        
+        self.processing = False
+        self.after(0, self.update_action_buttons_state)
+        self.after(0, self.refresh_network_profiles_view)
+
+        # Pokaż podsumowanie
+        summary = {
+            "operation": operation,
+            "total": total,
+            "success": success_count,
+            "failed": failed_count,
+            "not_processed": not_processed_count,
+            "failed_devices": failed_devices,
+            "recommendations": recommendations,
+        }
+        self.after(0, lambda: self.batch_finished(summary))
+        return summary
+
+    def discover_devices(self, targets, password="", timeout=DEFAULT_DISCOVERY_TIMEOUT,
+                         concurrency=DEFAULT_DISCOVERY_CONCURRENCY):
+        """
+        Wykrywa sterowniki w podanych podsieciach/zakresach (np. "10.20.0.0/20"):
+        1. połączenia TCP na port 22 do wszystkich adresów naraz (jedna pętla asyncio) + banner SSH,
+        2. z hasłem - logowanie i 'rauc status' na hostach z otwartym SSH; hosty bez
+           'compatible' sterownika AXC F są pomijane.
+        Zwraca listę PLCDevice posortowaną po adresie IP.
+        """
+        import ipaddress
+        from plc_netscan import expand_targets, sweep
+
+        addresses = expand_targets(targets)
+        self.log(f"Wykrywanie: {len(addresses)} adresów, do {concurrency} połączeń naraz")
+        started = time.time()
+
+        def progress(done, total):
+            self.after(0, lambda: self.show_batch_progress(
+                done / total * (50 if password else 100), f"Skanowanie portu 22: {done}/{total}", "#3B82F6"
+            ))
+
+        results = sweep(addresses, timeout=timeout, concurrency=concurrency, read_banner=True, progress=progress)
+        hosts = [result for result in results.values() if result.reachable]
+        self.log(f"  Otwarty port 22: {len(hosts)} host(ów) ({time.time() - started:.1f} s)")
+
+        devices = []
+        for result in hosts:
+            device = PLCDevice(f"PLC {result.ip}", result.ip, password)
+            device.ssh_banner = result.banner
+            device.status = "Wykryty"
+            devices.append(device)
+
+        if password and devices:
+            identified = []
+
+            def identify(device):
+                ssh = self.create_ssh_client(device.ip, device.password, timeout=max(timeout, 5))
+                try:
+                    rauc_status = self.read_rauc_status(ssh)
+                    stdin, stdout, stderr = ssh.exec_command("hostname", timeout=10)
+                    hostname = stdout.read().decode(errors="ignore").strip()
+                finally:
+                    ssh.close()
+                device.plc_model = rauc_status.model or ""
+                device.rauc_slots = rauc_status.summary()
+                if hostname:
+                    device.name = hostname
+                return rauc_status.compatible
+
+            with ThreadPoolExecutor(max_workers=DISCOVERY_PROBE_WORKERS) as executor:
+                futures = {executor.submit(identify, device): device for device in devices}
+                for done, future in enumerate(as_completed(futures), 1):
+                    device = futures[future]
+                    try:
+                        compatible = future.result()
+                    except Exception as e:
+                        device.status = "Błąd"
+                        device.error_log = f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}: {str(e)}"
+                        identified.append(device)
+                        continue
+                    if device.plc_model:
+                        device.status = "OK"
+                        identified.append(device)
+                        self.log(f"  {device.ip}: {device.name}, AXC F {device.plc_model} ({compatible})")
+                    else:
+                        self.log(f"  {device.ip}: pominięty - to nie sterownik AXC F ({compatible or device.ssh_banner})")
+                    self.after(0, lambda c=done, t=len(devices): self.show_batch_progress(
+                        50 + c / t * 50, f"Identyfikacja: {c}/{t}", "#3B82F6"
+                    ))
+            devices = identified
+
+        devices.sort(key=lambda d: ipaddress.ip_address(d.ip))
+        self.log(f"Wykryto {len(devices)} sterowników w {time.time() - started:.1f} s")
+        self.after(0, lambda: self.show_batch_progress(100, f"Wykryto {len(devices)} sterowników", "#10B981"))
+        return devices
+
+    def read_single_device(self, device):
+        """
+        Odczytuje dane z pojedynczego sterownika.
+        """
+        try:
+            device.status = "Łączenie SSH..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            
+            with self.ssh_connection(device) as (ssh, sftp):
+                
+                # 0. Instalacja firmware uruchomiona wcześniej w tle
+                detached_state = None
+                if device.install_state == "W toku":
+                    detached_state, exit_code, last_line = self.poll_detached_update(ssh, device)
+                    self.log(f"  Instalacja w tle: {detached_state} (exit: {exit_code}) {last_line[:120]}")
+                    if detached_state == "finished":
+                        device.install_state = "Zakończona" if exit_code == 0 else "Błąd"
+                        if exit_code == 0:
+                            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                
+                # 1. Wykryj model PLC
+                device.status = "Wykrywanie modelu..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+                device.plc_model = self.detect_plc_model(ssh, device)
+                
+                # 2. Wersja Firmware
+                device.status = "Odczyt firmware..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+                stdin, stdout, stderr = ssh.exec_command(ARPVERSION_COMMAND)
+                fw_output = stdout.read().decode().strip()
+                
+                self.log(f"  Surowy output wersji firmware: '{fw_output}'")
+                
+                device.firmware_version = parse_arpversion(fw_output)
+                if device.firmware_version == "?":
+                    self.log(f"  UWAGA: Nie można odczytać poprawnej wersji firmware!")
+                else:
+                    self.log(f"  Sparsowana wersja: '{device.firmware_version}'")
+                
+                # Instalacja przerwana restartem bez znacznika kodu wyjścia - wynik tylko z wersji
+                if detached_state == "interrupted":
+                    if self.detached_update_confirmed(device):
+                        device.install_state = "Zakończona"
+                        device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                    else:
+                        device.install_state = "Przerwana"
+                        self.log(f"  UWAGA: Instalacja w tle przerwana - wynik nieznany (wersja {device.firmware_version})")
+                
+                # 3. Strefa czasowa
+                device.status = "Sprawdzanie strefy czasowej..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+                stdin, stdout, stderr = ssh.exec_command("cat /etc/timezone")
+                device.timezone = stdout.read().decode(errors="ignore").strip()
+                
+                # 4. Sprawdzenie synchronizacji czasu
+                device.status = "Sprawdzanie synchronizacji czasu..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+                plc_time_obj, plc_time_str, is_synced = self.check_time_sync(ssh)
+                device.plc_time = plc_time_str
+                device.time_sync_error = not is_synced
+                
+                # 5. System Services - porównanie zawartości pliku
+                device.status = "Sprawdzanie System Services..."
+                self.after(0, lambda d=device: self.update_device_row(d))
+                try:
+                    remote_path = SYSTEM_SERVICES_REMOTE_PATH
+                    
+                    local_file = resource_path(SYSTEM_SERVICES_FILE)
+                    if os.path.exists(local_file):
+                        # Odczytaj lokalny plik
+                        with open(local_file, 'rb') as f:
+                            local_content = f.read()
+                        
+                        # Pobierz zawartość zdalnego pliku
+                        with sftp.open(remote_path, 'r') as remote_file:
+                            remote_content = remote_file.read()
+                        
+                        # Porównaj zawartość (jako bytes)
+                        if local_content == remote_content:
+                            device.system_services_ok = "OK"
+                            self.log(f"  System Services - zawartość zgodna")
+                        else:
+                            device.system_services_ok = "Niezgodność"
+                            self.log(f"  UWAGA: System Services - zawartość różni się od wzorcowej")
+                    else:
+                        device.system_services_ok = "Brak lokalnego"
+                        self.log(f"  UWAGA: Brak lokalnego pliku wzorcowego: {SYSTEM_SERVICES_FILE}")
+                        
+                except FileNotFoundError:
+                    device.system_services_ok = "Brak"
+                    self.log(f"  UWAGA: Plik System Services nie istnieje na sterowniku")
+                except Exception as e:
+                    device.system_services_ok = "Błąd"
+                    self.log(f"  UWAGA: Błąd sprawdzania System Services: {str(e)}")
+                
+                # 6. Znacznik czasowy odczytu
+                device.last_check = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                
+                # Logowanie podsumowania
+                self.log(f"  Model: AXC F {device.plc_model}")
+                self.log(f"  Firmware: {device.firmware_version}")
+                self.log(f"  Czas PLC: {device.plc_time}")
+                self.log(f"  Strefa czasowa: {device.timezone}")
+                self.log(f"  System Services: {device.system_services_ok}")
+                
+            # Context manager automatycznie zamknie SSH/SFTP tutaj
+            
+        except Exception as e:
+            raise e
+
+    def read_rauc_status(self, ssh):
+        """Odczytuje pełną tabelę slotów RAUC (format shell, z fallbackiem na tekstowy)."""
+        stdin, stdout, stderr = ssh.exec_command(RAUC_STATUS_COMMAND, timeout=30)
+        return parse_rauc_status(stdout.read().decode(errors="ignore"))
+
+    def detect_plc_model(self, ssh, device=None):
+        """
+        Wykrywa model sterownika PLC za pomocą komendy 'rauc status'.
+        Zwraca numer modelu (np. "2152", "3152", "1152") lub None w przypadku błędu.
+        Jeśli podano device, zapisuje też podsumowanie slotów RAUC (device.rauc_slots).
+        """
+        try:
+            rauc_status = self.read_rauc_status(ssh)
+            if device is not None:
+                device.rauc_slots = rauc_status.summary()
+                if device.rauc_slots:
+                    self.log(f"  Sloty RAUC: {device.rauc_slots}")
+            
+            model = rauc_status.model
+            if model:
+                self.log(f"  Wykryty model PLC: AXC F {model}")
+                return model
+            
+            self.log(f"  UWAGA: Nie można wykryć modelu z 'rauc status'")
+            return None
+            
+        except Exception as e:
+            self.log(f"  UWAGA: Błąd wykrywania modelu: {str(e)}")
+            return None
+
+    def extract_model_from_firmware(self, firmware_path):
+        """
+        Wyciąga numer modelu z nazwy pliku firmware.
+        Przykład: 'axcf2152-2024.0.8_LTS-24.0.8.183.raucb' -> '2152'
+        Gdy manifest bundle zawiera 'compatible', używa modelu z manifestu.
+        """
+        bundle = self.firmware_bundle(firmware_path)
+        if bundle and bundle.model:
+            return bundle.model
+        filename = os.path.basename(firmware_path)
+        if filename.startswith('axcf'):
+            model = filename.split('-')[0].replace('axcf', '')
+            return model
+        return None
+
+    def validate_firmware_compatibility(self, device, firmware_path):
+        """
+        Sprawdza czy firmware jest kompatybilny z modelem sterownika.
+        Zwraca (True, message) jeśli kompatybilny, (False, message) jeśli nie.
+        """
+        fw_model = self.extract_model_from_firmware(firmware_path)
+        
+        if not fw_model:
+            return False, "Nie można odczytać modelu z nazwy firmware"
+        
+        if not device.plc_model:
+            return False, "Model sterownika nie został wykryty"
+        
+        if fw_model != device.plc_model:
+            return False, f"NIEZGODNOŚĆ: Firmware dla {fw_model}, sterownik to {device.plc_model}"
+        
+        return True, f"Firmware kompatybilny z modelem {device.plc_model}"
+
+    def check_time_sync(self, ssh):
+        """
+        Sprawdza czy czas sterownika jest zsynchronizowany z czasem systemowym.
+        Zwraca (datetime_object, time_string, is_synced).
+        """
+        try:
+            # Pobierz czas z sterownika z timeoutem
+            stdin, stdout, stderr = ssh.exec_command(PLC_DATE_COMMAND, timeout=10)
+            plc_time_str = stdout.read().decode(errors="ignore").strip()
+            
+            if not plc_time_str:
+                self.log(f"  UWAGA: Nie można odczytać czasu ze sterownika")
+                return None, "", False
+            
+            plc_time, local_time, time_diff = plc_time_offset(plc_time_str)
+            is_synced = time_diff < TIME_SYNC_TOLERANCE
+            
+            if not is_synced:
+                self.log(f"  UWAGA: DESYNCHRONIZACJA CZASU: różnica {time_diff:.0f}s")
+                self.log(f"    Sterownik: {plc_time_str}")
+                self.log(f"    Lokalny: {local_time.strftime('%Y-%m-%d %H:%M:%S')}")
+            
+            return plc_time, plc_time_str, is_synced
+            
+        except Exception as e:
+            self.log(f"  UWAGA: Błąd sprawdzania czasu: {str(e)}")
+            return None, "", False
+
+    def compare_firmware_versions(self, current_version, target_version):
+        """
+        Porównuje wersje firmware ze szczegółowym logowaniem.
+        Zwraca True jeśli wersje są IDENTYCZNE (nie trzeba aktualizować).
+        """
+        target_version_number = self.get_target_fw_version(target_version)
+        
+        self.log(f"  Porównanie wersji firmware:")
+        self.log(f"     Aktualna wersja na sterowniku: '{current_version}'")
+        self.log(f"     Wersja z pliku firmware: '{target_version_number}'")
+        
+        if not current_version or current_version == "?":
+            self.log(f"     UWAGA: Nie można odczytać aktualnej wersji - wymuszam aktualizację")
+            return False 
+        
+        if not target_version_number:
+            self.log(f"     UWAGA: Nie można odczytać wersji z pliku - wymuszam aktualizację")
+            return False
+        
+        # Normalizacja: usuń białe znaki i porównaj
+        current_clean = current_version.strip()
+        target_clean = target_version_number.strip()
+        
+        is_same = current_clean == target_clean
+        
+        if is_same:
+            self.log(f"     Wersje są IDENTYCZNE - aktualizacja NIE jest potrzebna")
+        else:
+            self.log(f"     UWAGA: Wersje są RÓŻNE - aktualizacja jest potrzebna")
+            self.log(f"        Różnica: '{current_clean}' != '{target_clean}'")
+        
+        return is_same
+
+    def firmware_bundle(self, firmware_path):
+        """
+        Bundle z katalogu lub - dla pojedynczego pliku - wczytany raz (ponownie po zmianie
+        rozmiaru/mtime). None, gdy pliku nie da się odczytać.
+        """
+        if self.firmware_catalog:
+            return self.firmware_catalog.bundle_for(firmware_path)
+        try:
+            stat = os.stat(firmware_path)
+        except OSError:
+            return None
+        bundle = self.firmware_file_bundle
+        if bundle is None or (bundle.path, bundle.size, bundle.mtime) != (firmware_path, stat.st_size, stat.st_mtime):
+            try:
+                bundle = FirmwareBundle(firmware_path, stat.st_size, stat.st_mtime).load()
+            except OSError:
+                return None
+            for warning in bundle.warnings:
+                self.log(f"  UWAGA: {os.path.basename(firmware_path)}: {warning} - używam danych z manifestu")
+            self.firmware_file_bundle = bundle
+        return bundle
+
+    def get_target_fw_version(self, firmware_path):
+        """Numer wersji firmware: z manifestu bundle, a gdy go brak - z nazwy pliku."""
+        # Przykład: 'axcf2152-2024.0.8_LTS-24.0.8.183.raucb' -> '24.0.8.183'
+        bundle = self.firmware_bundle(firmware_path)
+        if bundle and bundle.version:
+            self.log(f"  Wykryta wersja firmware ({bundle.source}): {bundle.version}")
+            return bundle.version
+        
+        filename = os.path.basename(firmware_path)
+        
+        # Usuń rozszerzenie .raucb
+        if filename.endswith('.raucb'):
+            filename = filename[:-6]
+        
+        # Podziel po myślniku
+        parts = filename.split('-')
+        
+        # Ostatnia część to wersja (np. '24.0.8.183')
+        if len(parts) >= 3:
+            version = parts[-1]
+            self.log(f"  Wykryta wersja firmware z pliku: {version}")
+            return version
+        
+        self.log(f"  UWAGA: Nie można odczytać wersji z nazwy pliku: {filename}")
+        return ""
+
+    def device_has_issues(self, device):
+        """Czy urządzenie ma problemy prezentowane w kolumnie Issues."""
+        return device.has_issues
+
+    def load_firmware_catalog(self, directory):
+        """Indeksuje katalog firmware (manifesty bundle) - raz, potem tylko zmienione pliki."""
+        try:
+            catalog = self.firmware_catalog
+            if catalog is None or catalog.directory != directory:
+                catalog = FirmwareCatalog(directory)
+            bundles = catalog.refresh()
+            self.firmware_catalog = catalog
+            self.log(f"Katalog firmware: {len(bundles)} plik(ów) w {directory}")
+            for bundle in sorted(bundles, key=lambda b: (b.model or "", version_sort_key(b.version))):
+                self.log(f"  AXC F {bundle.model or '?'}: {os.path.basename(bundle.path)} "
+                         f"(v.{bundle.version or '?'}, źródło: {bundle.source})")
+                for warning in bundle.warnings:
+                    self.log(f"    UWAGA: {warning} - używam danych z manifestu")
+            for model in catalog.models():
+                selected = catalog.select(model).path
+                self.log(f"  Wybrany dla AXC F {model}: {os.path.basename(selected)}")
+                self.prefetch_firmware_digest(selected)
+        except Exception as e:
+            self.log(f"Błąd indeksowania katalogu firmware: {str(e)}")
+        self.after(0, self.update_action_buttons_state)
+
+    def clear_firmware_catalog(self):
+        """Wyłącza katalog firmware - kolejne partie używają pojedynczego wybranego pliku."""
+        if self.firmware_catalog:
+            self.log(f"Katalog firmware wyłączony: {self.firmware_catalog.directory}")
+        self.firmware_catalog = None
+        self.after(0, self.update_action_buttons_state)
+
+    def update_firmware_only_operation(self, device):
+        """
+        Aktualizuje TYLKO firmware (z automatycznym wykrywaniem modelu i walidacją).
+        POPRAWIONA: Używa execute_firmware_update() dla bezpiecznego reebootu.
+        """
+        self.log(f"Aktualizacja Firmware...")
+        
+        # Odczyt danych (w tym model PLC) - PRZERWIJ jeśli błąd
+        try:
+            self.read_single_device(device)
+        except Exception as e:
+            error_msg = f"Nie można odczytać danych sterownika przed aktualizacją: {str(e)}"
+            self.log(f"  BŁĄD: {error_msg}")
+            raise Exception(error_msg)
+        
+        firmware_file = self.firmware_for_device(device)
+        
+        # Walidacja kompatybilności
+        is_compatible, compat_msg = self.validate_firmware_compatibility(device, firmware_file)
+        self.log(f"  {compat_msg}")
+        
+        if not is_compatible:
+            raise FatalUpdateError(compat_msg)
+        
+        # Sprawdź czy firmware jest aktualny
+        if self.compare_firmware_versions(device.firmware_version, firmware_file):
+            self.log(f"  Firmware już aktualny (v.{device.firmware_version}) - pomijam aktualizację")
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return True
+        
+        if self.http_install:
+            # Instalacja strumieniowa z lokalnego serwera HTTP - bez uploadu SFTP
+            self.execute_http_firmware_update(device, firmware_file)
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return True
+        
+        try:
+            # KROK 1: UPLOAD FIRMWARE (w context managerze)
+            with self.ssh_connection(device) as (ssh, sftp):
+                
+                remote_fw_path = self.select_staging_path(ssh, firmware_file, device)
+                
+                file_size = os.path.getsize(firmware_file)
+                self.log(f"  Wysyłanie firmware ({file_size/1024/1024:.1f} MB)...")
+                
+                self.upload_file_with_resume(
+                    sftp,
+                    firmware_file,
+                    remote_fw_path,
+                    device=device
+                )
+                
+                self.reset_upload_progress()
+                
+                self.log(f"  Firmware wysłany i zweryfikowany")
+            
+            # Context manager zamknął SSH/SFTP tutaj
+            
+            # KROK 2: WYKONAJ UPDATE (NOWE połączenie SSH)
+            self.execute_firmware_update(device)
+            
+            self.mark_updated(device)
+            return True
+            
+        except Exception as e:
+            self.reset_upload_progress()
+            raise e
+
+    def mark_updated(self, device):
+        """
+        Znacznik ostatniej aktualizacji. Pomijany, gdy instalacja trwa w tle - wtedy ustawia go
+        monitor_detached_updates (lub odczyt) dopiero po potwierdzeniu zakończenia.
+        """
+        if device.install_state != "W toku":
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    def detached_update_confirmed(self, device):
+        """Czy odczytana wersja firmware jest docelową (potwierdzenie przerwanej instalacji w tle)."""
+        if not self.has_firmware_source():
+            return False
+        try:
+            firmware_file = self.firmware_for_device(device)
+        except FatalUpdateError:
+            return False
+        return self.compare_firmware_versions(device.firmware_version, firmware_file)
+
+    def has_firmware_source(self):
+        """Czy wybrano plik firmware lub katalog firmware z co najmniej jednym bundle."""
+        if self.firmware_catalog and self.firmware_catalog.bundles:
+            return True
+        return bool(self.firmware_path.get() and os.path.exists(self.firmware_path.get()))
+
+    def firmware_for_device(self, device):
+        """
+        Plik firmware dla sterownika: z katalogu - najnowszy bundle dla wykrytego modelu,
+        w przeciwnym razie pojedynczy plik wybrany w GUI.
+        """
+        if not self.firmware_catalog:
+            return self.firmware_path.get()
+        bundle = self.firmware_catalog.select(device.plc_model)
+        if bundle is None:
+            raise FatalUpdateError(
+                f"Brak firmware dla modelu AXC F {device.plc_model or '?'} w katalogu {self.firmware_catalog.directory}"
+            )
+        self.log(f"  Firmware z katalogu dla AXC F {device.plc_model}: {os.path.basename(bundle.path)} (v.{bundle.version})")
+        return bundle.path
+
+    def pin_firmware_maps(self, operation):
+        """
+        Mapuje pliki firmware na czas całej operacji wsadowej - wszystkie workery
+        korzystają z jednego mapowania. Zwraca klucze do zwolnienia po operacji.
+        """
+        if operation not in ("firmware", "all", "prestage") or not self.has_firmware_source():
+            return []
+        if self.firmware_catalog and self.firmware_catalog.bundles:
+            paths = [self.firmware_catalog.select(model).path for model in self.firmware_catalog.models()]
+        else:
+            paths = [self.firmware_path.get()]
+        keys = []
+        for path in paths:
+            try:
+                key, _ = self.firmware_maps.acquire(path)
+                keys.append(key)
+            except (OSError, ValueError) as e:
+                self.log(f"UWAGA: Nie można zmapować {os.path.basename(path)}: {str(e)}")
+        return keys
+
+    def get_firmware_digest(self, firmware_file):
+        """SHA-256 pliku firmware z cache (liczone w tle od wyboru pliku, współdzielone przez workery)."""
+        if self.digest_cache.peek(firmware_file) is None:
+            self.log(f"  Oczekiwanie na SHA-256 pliku firmware ({os.path.getsize(firmware_file)/1024/1024:.1f} MB)...")
+        return self.digest_cache.get(firmware_file)["sha256"]
+
+    def prefetch_firmware_digest(self, firmware_file):
+        """Startuje liczenie SHA-256 w tle zaraz po wyborze pliku."""
+        try:
+            future = self.digest_cache.prefetch(firmware_file)
+        except OSError:
+            return
+        if not future.done():
+            filename = os.path.basename(firmware_file)
+            self.log(f"Liczenie SHA-256 w tle: {filename}")
+            future.add_done_callback(
+                lambda f: self.log(f"SHA-256 {filename}: {f.result()['sha256'][:16]}...") if not f.exception() else None
+            )
+
+    def read_remote_sha256(self, ssh, remote_path):
+        """SHA-256 pliku na sterowniku ('sha256sum') lub "" gdy plik nie istnieje."""
+        stdin, stdout, stderr = ssh.exec_command(f"sha256sum '{remote_path}' 2>/dev/null", timeout=300)
+        output = stdout.read().decode(errors="ignore").strip()
+        return output.split()[0].lower() if output else ""
+
+    def read_staged_digests(self, ssh, firmware_file):
+        """SHA-256 bundle we wszystkich FIRMWARE_STAGING_PATHS jednym wywołaniem. Zwraca {ścieżka: digest}."""
+        filename = os.path.basename(firmware_file)
+        paths = " ".join(f"'{directory}/{filename}'" for directory in FIRMWARE_STAGING_PATHS)
+        stdin, stdout, stderr = ssh.exec_command(f"sha256sum {paths} 2>/dev/null", timeout=300)
+        digests = {}
+        for line in stdout.read().decode(errors="ignore").splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                digests[parts[1]] = parts[0].lower()
+        return digests
+
+    def prestage_firmware_operation(self, device):
+        """
+        Faza 1 rolloutu: wysyła i weryfikuje (SHA-256) bundle na sterowniku, BEZ instalacji.
+        Transfer dławiony limitem prestage_rate_limit - do uruchomienia poza oknem serwisowym.
+        """
+        self.log(f"Pre-stage Firmware...")
+        
+        try:
+            self.read_single_device(device)
+        except Exception as e:
+            error_msg = f"Nie można odczytać danych sterownika przed pre-stage: {str(e)}"
+            self.log(f"  BŁĄD: {error_msg}")
+            raise Exception(error_msg)
+        
+        firmware_file = self.firmware_for_device(device)
+        local_digest = self.get_firmware_digest(firmware_file)
+        
+        is_compatible, compat_msg = self.validate_firmware_compatibility(device, firmware_file)
+        self.log(f"  {compat_msg}")
+        if not is_compatible:
+            raise FatalUpdateError(compat_msg)
+        
+        if self.compare_firmware_versions(device.firmware_version, firmware_file):
+            self.log(f"  Firmware już aktualny (v.{device.firmware_version}) - pre-stage niepotrzebny")
+            device.install_state = "Aktualny"
+            return True
+        
+        rate_limit = self.prestage_rate_limit * 1024 if self.prestage_rate_limit else None
+        try:
+            with self.ssh_connection(device) as (ssh, sftp):
+                staged = self.read_staged_digests(ssh, firmware_file)
+                matching = [path for path, digest in staged.items() if digest == local_digest]
+                
+                if matching:
+                    device.staged_path = matching[0]
+                    self.log(f"  Bundle już wysłany wcześniej (SHA-256 zgodny): {matching[0]} - pomijam transfer")
+                else:
+                    remote_fw_path = self.select_staging_path(ssh, firmware_file, device)
+                    if rate_limit:
+                        self.log(f"  Pre-stage z limitem {self.prestage_rate_limit} KB/s")
+                    self.upload_file_with_resume(sftp, firmware_file, remote_fw_path, device=device, rate_limit=rate_limit)
+                    self.reset_upload_progress()
+                    
+                    remote_digest = self.read_remote_sha256(ssh, remote_fw_path)
+                    if remote_digest != local_digest:
+                        try:
+                            sftp.remove(remote_fw_path)
+                        except IOError:
+                            pass
+                        raise Exception(f"Niezgodny SHA-256 po wysłaniu (zdalny: {remote_digest[:16]}..., lokalny: {local_digest[:16]}...)")
+                
+                device.staged_digest = local_digest
+                device.install_state = "Pre-stage OK"
+                self.log(f"  Bundle przygotowany i zweryfikowany (SHA-256 {local_digest[:16]}...)")
+            return True
+            
+        except Exception as e:
+            self.reset_upload_progress()
+            raise e
+
+    def activate_staged_firmware_operation(self, device):
+        """
+        Faza 2 rolloutu: uruchamia update-axcf tylko, gdy bundle na sterowniku ma zgodny SHA-256.
+        Jedno krótkie połączenie (model, wersja + sumy kontrolne w katalogach staging), bez odczytu pełnego stanu i bez transferu.
+        Sterownik z aktualnym firmware (np. już aktywowany wcześniej) kończy się sukcesem bez instalacji.
+        """
+        self.log(f"Aktywacja pre-stage firmware...")
+        
+        with self.ssh_connection(device) as (ssh, sftp):
+            device.plc_model = self.detect_plc_model(ssh, device)
+            stdin, stdout, stderr = ssh.exec_command(ARPVERSION_COMMAND)
+            device.firmware_version = parse_arpversion(stdout.read().decode(errors="ignore").strip())
+            firmware_file = self.firmware_for_device(device)
+            is_compatible, compat_msg = self.validate_firmware_compatibility(device, firmware_file)
+            if not is_compatible:
+                raise FatalUpdateError(compat_msg)
+            
+            if self.compare_firmware_versions(device.firmware_version, firmware_file):
+                self.log(f"  Firmware już aktualny (v.{device.firmware_version}) - aktywacja niepotrzebna")
+                return True
+            
+            local_digest = self.get_firmware_digest(firmware_file)
+            device.status = "Weryfikacja pre-stage..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            staged = self.read_staged_digests(ssh, firmware_file)
+        
+        if not staged:
+            raise FatalUpdateError(f"Brak przygotowanego bundle na sterowniku: {os.path.basename(firmware_file)}")
+        matching = [path for path, digest in staged.items() if digest == local_digest]
+        if not matching:
+            device.staged_digest = ""
+            raise FatalUpdateError(
+                f"SHA-256 bundle na sterowniku niezgodny z plikiem firmware - wykonaj ponownie pre-stage"
+            )
+        
+        device.staged_digest = local_digest
+        device.staged_path = matching[0]
+        self.execute_firmware_update(device)
+        self.mark_updated(device)
+        return True
+
+    def switch_rauc_slot_operation(self, device):
+        """
+        Przełącza sterownik na drugi slot RAUC (rollback lub ponowna aktywacja) bez transferu
+        firmware: mark-good + mark-active 'other', restart i weryfikacja uruchomionego slotu.
+        """
+        self.log(f"Przełączenie slotu RAUC...")
+        
+        with self.ssh_connection(device) as (ssh, sftp):
+            rauc_status = self.read_rauc_status(ssh)
+            device.plc_model = rauc_status.model or device.plc_model
+            device.rauc_slots = rauc_status.summary()
+            
+            booted = rauc_status.booted_slot()
+            target = rauc_status.other_slot()
+            if target is None:
+                raise FatalUpdateError("Brak drugiego slotu systemowego w 'rauc status'")
+            if not target.bundle_version:
+                raise FatalUpdateError(f"Slot {target.name} nie zawiera zainstalowanego firmware - przełączenie niemożliwe")
+            if target.boot_status == "bad":
+                self.log(f"  UWAGA: Slot {target.name} oznaczony jako 'bad' - ponowna aktywacja")
+            
+            self.log(f"  Przełączam: {booted.summary() if booted else '?'} -> {target.summary()}")
+            device.status = f"Przełączanie na slot {target.bootname or target.name}..."
+            self.after(0, lambda d=device: self.update_device_row(d))
+            
+            for command in ("sudo rauc status mark-good other", "sudo rauc status mark-active other"):
+                stdin, stdout, stderr = ssh.exec_command(command, get_pty=True)
+                stdin.write(device.password + "\n")
+                stdin.flush()
+                exit_code = stdout.channel.recv_exit_status()
+                output = stdout.read().decode(errors="ignore").strip()
+                if exit_code != 0:
+                    raise FatalUpdateError(f"'{command}' nieudane (exit {exit_code}): {output[-200:]}")
+                self.log(f"  {command}: OK")
+        
+        self.execute_reboot(device)
+        
+        with self.ssh_connection(device) as (ssh, sftp):
+            rauc_status = self.read_rauc_status(ssh)
+        device.rauc_slots = rauc_status.summary()
+        now_booted = rauc_status.booted_slot()
+        if now_booted is None or now_booted.name != target.name:
+            raise FatalUpdateError(
+                f"Sterownik nie uruchomił się ze slotu {target.name} "
+                f"(aktualnie: {now_booted.name if now_booted else '?'})"
+            )
+        
+        self.log(f"  Sterownik działa ze slotu {target.name} ({target.bundle_version})")
+        self.read_single_device(device)
+        device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return True
+
+    def update_system_services_only(self, device):
+        """
+        Wysyła System Services i restartuje sterownik. Pomija, jeśli jest już OK.
+        POPRAWIONA: Używa execute_reboot() dla bezpiecznego reebootu.
+        """
+        self.log(f"Aktualizacja System Services...")
+        
+        # Sprawdzenie statusu przed operacją
+        try:
+            self.read_single_device(device)
+        except Exception as e:
+            self.log(f"  UWAGA: Błąd odczytu przed aktualizacją SysServices: {str(e)}")
+        
+        # Logika pominięcia
+        if device.system_services_ok == "OK":
+            self.log(f"  INFO: System Services już aktualne - pomijam")
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return True
+        
+        try:
+            # KROK 1: UPLOAD SYSTEM SERVICES (w context managerze)
+            with self.ssh_connection(device) as (ssh, sftp):
+                
+                local_sys_file = resource_path(SYSTEM_SERVICES_FILE)
+                if not os.path.exists(local_sys_file):
+                    raise FatalUpdateError(f"Plik {SYSTEM_SERVICES_FILE} nie istnieje!")
+                
+                remote_sys_path = SYSTEM_SERVICES_REMOTE_PATH
+                filename = os.path.basename(local_sys_file)
+                file_size = os.path.getsize(local_sys_file)
+                
+                self.log(f"  Wysyłanie {filename} ({file_size/1024:.1f} KB)...")
+                
+                self.upload_file_with_resume(
+                    sftp,
+                    local_sys_file,
+                    remote_sys_path,
+                    device=device
+                )
+                
+                self.reset_upload_progress()
+                
+                device.system_services_ok = "OK"
+                self.log(f"  System Services wysłane i zweryfikowane")
+            
+            # Context manager zamknął SSH/SFTP tutaj
+            
+            # KROK 2: REBOOT (NOWE połączenie SSH)
+            self.execute_reboot(device)
+            
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return True
+            
+        except Exception as e:
+            self.reset_upload_progress()
+            raise e
+
+    def update_timezone_only(self, device):
+        """
+        Ustawia strefę czasową i restartuje. Pomija, jeśli już OK.
+        POPRAWIONA: Używa execute_reboot() dla bezpiecznego reebootu.
+        """
+        self.log(f"Aktualizacja strefy czasowej na {TIMEZONE}...")
+        
+        # Sprawdzenie statusu przed operacją
+        try:
+            self.read_single_device(device)
+        except Exception as e:
+            self.log(f"  UWAGA: Błąd odczytu przed aktualizacją Timezone: {str(e)}")
+        
+        # Logika pominięcia
+        if device.timezone.strip() == TIMEZONE.strip():
+            self.log(f"  INFO: Strefa czasowa już ustawiona na {TIMEZONE} - pomijam")
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return True
+        
+        try:
+            # KROK 1: USTAWIENIE TIMEZONE (w context managerze)
+            with self.ssh_connection(device) as (ssh, sftp):
+                
+                self.log(f"  Ustawianie strefy czasowej na {TIMEZONE}...")
+                
+                # Wpisanie TIMEZONE do /etc/timezone
+                stdin, stdout, stderr = ssh.exec_command(
+                    f"sudo sh -c 'echo {TIMEZONE} > /etc/timezone'", 
+                    get_pty=True
+                )
+                stdin.write(device.password + "\n")
+                stdin.flush()
+                time.sleep(1)
+                
+                # Użycie timedatectl
+                stdin, stdout, stderr = ssh.exec_command(
+                    f"sudo timedatectl set-timezone {TIMEZONE}", 
+                    get_pty=True
+                )
+                stdin.write(device.password + "\n")
+                stdin.flush()
+                time.sleep(1)
+                
+                device.timezone = TIMEZONE
+                self.log("  Strefa czasowa ustawiona")
+            
+            # Context manager zamknął SSH/SFTP tutaj
+            
+            # KROK 2: REBOOT (NOWE połączenie SSH)
+            self.execute_reboot(device)
+            
+            device.last_update = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            return True
+            
+        except Exception as e:
+            raise e
+
+    def update_all_operations(self, device):
+        """
+        Wykonuje wszystkie operacje: System Services, Firmware, Timezone.
+        Zoptymalizowane pod kątem restartów i pomijania.
+        
+        KOLEJNOŚĆ OPERACJI:
+        1. Połączenie SSH (przez context manager)
+        2. Wykrycie modelu PLC i walidacja kompatybilności firmware
+        3. Odczyt wstępny (stan SysServices, Timezone, Firmware)
+        4. Aktualizacja System Services (tylko jeśli jest różnica/brak)
+        5. Aktualizacja Firmware (tylko wysłanie pliku - jeśli konieczne i kompatybilne)
+        6. Ustawienie strefy czasowej (tylko jeśli konieczne)
+        7. ZAMKNIĘCIE SFTP przed rebootem/update
+        8. Wykonanie sudo update / sudo reboot (tylko jeśli FW lub SS było wgrywane)
+        """
+        self.log(f"PEŁNA AKTUALIZACJA: START")
+        
+        # Flagi kontrolujące potrzebę restartu/update
+        ss_updated = False
+        fw_needed = False
+        tz_updated = False
+        
+        try:
+            # UŻYJ CONTEXT MANAGERA dla bezpiecznego SSH/SFTP
+            with self.ssh_connection(device) as (ssh, sftp):
+                
+                # 1. Wykryj model PLC
+                device.plc_model = self.detect_plc_model(ssh, device)
+                
+                if not device.plc_model:
+                    raise Exception("Nie można wykryć modelu sterownika!")
+                
+                firmware_file = self.firmware_for_device(device)
+                
+                # 2. Walidacja kompatybilności firmware
+                is_compatible, compat_msg = self.validate_firmware_compatibility(device, firmware_file)
+                self.log(f"  {compat_msg}")
+                
+                if not is_compatible:
+                    raise FatalUpdateError(f"{compat_msg}\n\nZATRZYMANO AKTUALIZACJĘ!")
+                
+                # 3. Odczyt wstępny danych
+                self.log("  Wstępny odczyt danych...")
+                
+                # Firmware version
+                stdin, stdout, stderr = ssh.exec_command("grep Arpversion /etc/plcnext/arpversion")
+                fw_output = stdout.read().decode().strip()
+                
+                self.log(f"  Surowy output wersji firmware: '{fw_output}'")
+                
+                version_string = "?"
+                if fw_output:
+                    fw_output = fw_output.replace('Arpversion', '').strip()
+                    
+                    if ":" in fw_output:
+                        parts = fw_output.split(':', 1) 
+                        version_string = parts[1].strip() if len(parts) > 1 else "?"
+                    elif "=" in fw_output:
+                        version_string = fw_output.split("=")[-1].strip()
+                    else:
+                        version_string = fw_output.strip()
+                    
+                    self.log(f"  Sparsowana wersja: '{version_string}'")
+                
+                if version_string and version_string != "?" and version_string[0].isdigit():
+                    device.firmware_version = version_string
+                else:
+                    device.firmware_version = "?"
+                    self.log(f"  UWAGA: Nie można odczytać poprawnej wersji firmware!")
+                
+                # Timezone
+                stdin, stdout, stderr = ssh.exec_command("cat /etc/timezone")
+                device.timezone = stdout.read().decode(errors="ignore").strip()
+                
+                # System Services
+                try:
+                    remote_path = SYSTEM_SERVICES_REMOTE_PATH
+                    remote_stat = sftp.stat(remote_path)
+                    local_file = resource_path(SYSTEM_SERVICES_FILE)
+                    if os.path.exists(local_file):
+                        local_size = os.path.getsize(local_file)
+                        remote_size = remote_stat.st_size
+                        device.system_services_ok = "OK" if local_size == remote_size else "Różnica"
+                        if device.system_services_ok == "Różnica":
+                            self.log(f"  UWAGA: System Services - różnica rozmiaru: lokalny={local_size}, zdalny={remote_size}")
+                    else:
+                        device.system_services_ok = "Istnieje"
+                except FileNotFoundError:
+                    device.system_services_ok = "Brak"
+                except Exception as e:
+                    device.system_services_ok = "Błąd"
+                    self.log(f"  UWAGA: Błąd sprawdzania System Services: {str(e)}")
+                
+                self.log(f"  Status System Services: {device.system_services_ok}")
+                self.log(f"  Aktualna wersja FW: {device.firmware_version}")
+                self.log(f"  Aktualna strefa czasowa: {device.timezone}")
+                
+                # 4. System Services - TYLKO UPLOAD, REBOOT PÓŹNIEJ
+                if device.system_services_ok != "OK":
+                    self.log(f"  System Services: {device.system_services_ok}. Wymagana aktualizacja.")
+                    
+                    local_sys_file = resource_path(SYSTEM_SERVICES_FILE)
+                    if not os.path.exists(local_sys_file):
+                        raise FatalUpdateError(f"Plik {SYSTEM_SERVICES_FILE} nie istnieje lokalnie!")
+                    
+                    remote_sys_path = SYSTEM_SERVICES_REMOTE_PATH
+                    filename = os.path.basename(local_sys_file)
+                    
+                    self.log(f"  Wysyłanie {filename}...")
+                    
+                    self.upload_file_with_resume(
+                        sftp,
+                        local_sys_file,
+                        remote_sys_path,
+                        device=device
+                    )
+                    
+                    self.reset_upload_progress()
+                    device.system_services_ok = "OK"
+                    ss_updated = True
+                    self.log(f"  System Services wysłane i zweryfikowane")
+                else:
+                    self.log("  System Services OK - pomijam wysyłkę")
+                
+                # 5. Firmware - TYLKO UPLOAD, UPDATE PÓŹNIEJ
+                if not self.compare_firmware_versions(device.firmware_version, firmware_file):
+                    fw_needed = True
+                    target_fw_version = self.get_target_fw_version(firmware_file)
+                    self.log(f"  Firmware nieaktualne. Aktualna: {device.firmware_version}, Docelowa: {target_fw_version}")
+                
+                if fw_needed and self.http_install:
+                    self.log("  Firmware zostanie zainstalowane strumieniowo z serwera HTTP - pomijam wysyłkę SFTP")
+                elif fw_needed:
+                    self.log("  Wysyłanie Firmware...")
+                    remote_fw_path = self.select_staging_path(ssh, firmware_file, device)
+                    
+                    file_size = os.path.getsize(firmware_file)
+                    
+                    self.upload_file_with_resume(
+                        sftp,
+                        firmware_file,
+                        remote_fw_path,
+                        device=device
+                    )
+                    
+                    self.reset_upload_progress()
+                    self.log(f"  Plik firmware wysłany i zweryfikowany ({file_size/1024/1024:.1f} MB)")
+                else:
+                    self.log(f"  Firmware (v.{device.firmware_version}) jest aktualne - pomijam wysyłkę")
+
+                # 6. Timezone - TYLKO USTAWIENIE, REBOOT PÓŹNIEJ
+                if device.timezone.strip() != TIMEZONE.strip():
+                    self.log(f"  Strefa czasowa niepoprawna. Ustawianie na {TIMEZONE}...")
+                    
+                    stdin, stdout, stderr = ssh.exec_command(
+                        f"sudo sh -c 'echo {TIMEZONE} > /etc/timezone'", 
+                        get_pty=True
+                    )
+                    stdin.write(device.password + "\n")
+                    stdin.flush()
+                    time.sleep(1)
+                    
+                    stdin, stdout, stderr = ssh.exec_command(
+                        f"sudo timedatectl set-timezone {TIMEZONE}", 
+                        get_pty=True
+                    )
+                    stdin.write(device.password + "\n")
+                    stdin.flush()
+                    time.sleep(1)
+                    
+                    device.timezone = TIMEZONE
+                    tz_updated = True
+                    self.log("  Strefa czasowa ustawiona")
+                else:
+                    self.log("  Strefa czasowa OK - pomijam zmianę")
+                
+                self.log("  Wszystkie transfery zakończone")
+            
+            # Context manager zamknął SSH tutaj - wszystkie transfery zakończone!
+            
+            # 7. TERAZ WYKONAJ UPDATE/REBOOT (nowe połączenie SSH)
+            needs_reboot = ss_updated or tz_updated
+            
+            if fw_needed or needs_reboot:
+                self.log("  WYKONYWANIE AKTUALIZACJI / RESTART...")
+                
+                if fw_needed and self.http_install:
+                    # Instalacja strumieniowa + reboot
+                    self.execute_http_firmware_update(device, firmware_file)
+                    
+                elif fw_needed:
+                    # Firmware update - to robi automatyczny reboot
+                    self.execute_firmware_update(device)
+                    
+                elif needs_reboot:
+                    # Tylko reboot (SS lub TZ się zmieniły, ale nie FW)
+                    self.execute_reboot(device)
+            else:
+                self.log("  INFO: Wszystkie komponenty aktualne. Pomijam restart")
+
+            self.mark_updated(device)
+            return True
+            
+        except Exception as e:
+            self.reset_upload_progress()
+            raise e
+
+    def set_timezone_ssh(self, ssh, password):
+        """
+        Ustawia strefę czasową przez SSH (bez restartu).
+        Używa shell interaktywnego z sudo i su.
+        """
+        shell = ssh.invoke_shell()
+        
+        def send_cmd(cmd, wait=1):
+            shell.send(cmd + "\n")
+            time.sleep(wait)
+        
+        # Ustaw hasło root
+        send_cmd("sudo passwd root")
+        send_cmd(password)  # sudo password
+        send_cmd(ROOT_PASS)  # nowe hasło root
+        send_cmd(ROOT_PASS)  # potwierdzenie
+        
+        # Przełącz na root
+        send_cmd("su")
+        send_cmd(ROOT_PASS)
+        
+        # Ustaw strefę czasową
+        send_cmd(f"ln -sf /usr/share/zoneinfo/{TIMEZONE} /etc/localtime")
+        send_cmd(f"echo '{TIMEZONE}' > /etc/timezone")
+        
+        # Wyłącz hasło root
+        send_cmd("passwd -dl root")
+        send_cmd("exit")
+        
+        time.sleep(2)
+
+    def log(self, message):
+        """Dodaje wiadomość do kolejki logów."""
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.log_queue.put(f"[{timestamp}] {message}")
+
+    # ------------------------------------------------------------------
+    # Podział partii na procesy
+    # ------------------------------------------------------------------
+
+    def run_batch(self, operation):
+        """
+        Uruchamia operację wsadową - w procesach, jeśli ustawiono shard_processes > 1.
+        Przy ustawionym autosave_path wyniki zakończonych sterowników są dopisywane na bieżąco.
+        """
+        self.batch_autosave = None
+        if self.autosave_path:
+            try:
+                self.batch_autosave = BatchAutosave(self.autosave_path, operation)
+                self.log(f"Autozapis wyników: {self.autosave_path}")
+            except OSError as e:
+                self.log(f"Autozapis wyłączony: {str(e)}")
+        self.batch_operation = operation
+        try:
+            self.batch_id = self.fleet_state.begin_batch(operation, len(self.devices))
+        except sqlite3.Error as e:
+            self.batch_id = None
+            self.log(f"Historia floty niedostępna: {str(e)}")
+        summary = None
+        try:
+            if self.shard_processes > 1 and len(self.devices) > 1:
+                summary = self.process_batch_sharded(operation)
+            else:
+                summary = self.process_batch(operation)
+            return summary
+        finally:
+            self.network_profiles.flush()
+            if self.batch_autosave:
+                self.batch_autosave.finish(summary)
+                self.batch_autosave = None
+            if self.batch_id is not None:
+                try:
+                    self.fleet_state.finish_batch(self.batch_id, summary)
+                except sqlite3.Error as e:
+                    self.log(f"Błąd zapisu historii floty: {str(e)}")
+                self.batch_id = None
+
+    def record_device_result(self, device, outcome):
+        """Zapisuje stan zakończonego sterownika (outcome: "success"/"failed"): autozapis partii i historia floty."""
+        autosave = self.batch_autosave
+        if autosave:
+            try:
+                autosave.record(device)
+            except OSError as e:
+                self.log(f"Błąd autozapisu: {str(e)}")
+        batch_id = self.batch_id
+        if batch_id is not None:
+            try:
+                self.fleet_state.record(batch_id, self.batch_operation, device, outcome)
+            except sqlite3.Error as e:
+                self.log(f"Błąd zapisu historii floty: {str(e)}")
+
+    def shard_settings(self):
+        """Ustawienia przekazywane do procesów partii."""
+        settings = {name: getattr(self, name) for name in SHARD_SETTINGS}
+        settings["firmware_path"] = self.firmware_path.get()
+        settings["firmware_catalog_dir"] = self.firmware_catalog.directory if self.firmware_catalog else ""
+        return settings
+
+    def split_into_shards(self, operation, count):
+        """
+        Dzieli sterowniki na count części o zbliżonym szacowanym czasie (najdłuższe zadanie
+        do najmniej obciążonej części). Zwraca listy indeksów w self.devices.
+        """
+        estimates = sorted(
+            ((self.estimate_device_job(device, operation), index) for index, device in enumerate(self.devices)),
+            reverse=True,
+        )
+        shards = [[] for _ in range(count)]
+        loads = [(0.0, shard) for shard in range(count)]
+        for seconds, index in estimates:
+            load, shard = heapq.heappop(loads)
+            shards[shard].append(index)
+            heapq.heappush(loads, (load + seconds, shard))
+        return [sorted(shard) for shard in shards if shard]
+
+    def process_batch_sharded(self, operation):
+        """
+        Partia podzielona na procesy: każdy proces ma własny interpreter (bez wspólnego GIL)
+        i własną pulę workerów SSH. Logi, stany sterowników, postęp i pomiary łącza wracają
+        kolejką do tego procesu, który aktualizuje GUI/CLI jak przy zwykłym process_batch.
+        """
+        self.processing = True
+        self.after(0, self.update_action_buttons_state)
+        total = len(self.devices)
+        shards = self.split_into_shards(operation, min(self.shard_processes, total))
+
+        self.log(f"{'='*60}")
+        self.log(f"START OPERACJI WSADOWEJ: {operation.upper()} ({len(shards)} procesów)")
+        self.log(f"Liczba sterowników: {total}")
+        self.log(f"{'='*60}")
+        self.after(0, lambda: self.show_batch_progress(
+            0, f"Start operacji {operation.upper()} (0/{total})", "#3B82F6"
+        ))
+
+        # Suma firmware liczona raz tutaj - procesy czytają ją z cache na dysku
+        if operation in ("firmware", "all", "prestage", "activate") and self.has_firmware_source():
+            if self.firmware_catalog:
+                paths = [self.firmware_catalog.select(model).path for model in self.firmware_catalog.models()]
+            else:
+                paths = [self.firmware_path.get()]
+            for path in paths:
+                self.get_firmware_digest(path)
+
+        context = multiprocessing.get_context("spawn")
+        events = context.Queue()
+        stop_event = context.Event()
+        settings = self.shard_settings()
+        processes = []
+        for shard_index, indexes in enumerate(shards):
+            shard_settings = dict(settings, http_install_port=settings["http_install_port"] + shard_index)
+            process = context.Process(
+                target=run_shard,
+                args=(shard_index, shard_settings, [self.devices[i] for i in indexes], operation, events, stop_event),
+                daemon=True,
+            )
+            process.start()
+            processes.append(process)
+
+        progress = [0.0] * len(shards)
+        summaries = {}
+        while len(summaries) < len(shards):
+            if not self.processing and not stop_event.is_set():
+                stop_event.set()
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                for shard_index, process in enumerate(processes):
+                    if shard_index not in summaries and not process.is_alive():
+                        summaries[shard_index] = None
+                        self.log(f"[P{shard_index + 1}] Proces zakończył się bez podsumowania (kod {process.exitcode})")
+                continue
+
+            kind, shard_index = event[0], event[1]
+            if kind == "log":
+                self.log(f"[P{shard_index + 1}] {event[2]}")
+            elif kind in ("device", "finished"):
+                device = self.devices[shards[shard_index][event[2]]]
+                device.apply_state(event[3])
+                self.after(0, lambda d=device: self.update_device_row(d))
+                if kind == "finished":
+                    self.record_device_result(device, event[4])
+            elif kind == "progress":
+                progress[shard_index] = event[2] * len(shards[shard_index]) / 100
+                completed = int(round(sum(progress)))
+                self.after(0, lambda c=completed: self.show_batch_progress(
+                    c / total * 100, f"Postęp: {c}/{total} sterowników", "#3B82F6"
+                ))
+            elif kind == "upload":
+                self.after(0, lambda e=event: self.show_upload_progress(e[2], e[3], e[4]))
+            elif kind == "profile":
+                self.network_profiles.record(event[2], name=event[3], **event[4])
+            elif kind == "done":
+                summaries[shard_index] = event[2]
+
+        for process in processes:
+            process.join(timeout=5)
+
+        summary = {
+            "operation": operation,
+            "total": total,
+            "success": 0,
+            "failed": 0,
+            "not_processed": 0,
+            "failed_devices": [],
+            "recommendations": [],
+        }
+        for shard_index, shard_summary in sorted(summaries.items()):
+            if shard_summary is None:
+                summary["not_processed"] += len(shards[shard_index])
+                continue
+            for key in ("success", "failed", "not_processed"):
+                summary[key] += shard_summary[key]
+            summary["failed_devices"].extend(shard_summary["failed_devices"])
+            for recommendation in shard_summary["recommendations"]:
+                if recommendation not in summary["recommendations"]:
+                    summary["recommendations"].append(recommendation)
+
+        self.log(f"\n{'='*60}")
+        self.log(f"PODSUMOWANIE OPERACJI: {operation.upper()} ({len(shards)} procesów)")
+        self.log(f"Sukces: {summary['success']}/{total}")
+        self.log(f"Błędy: {summary['failed']}/{total}")
+        self.log(f"Nieprzetworzone: {summary['not_processed']}/{total}")
+        self.log(f"{'='*60}\n")
+
+        self.processing = False
+        self.after(0, self.update_action_buttons_state)
+        self.after(0, self.refresh_network_profiles_view)
+        self.after(0, lambda: self.batch_finished(summary))
+        return summary
+
+
+# Ustawienia silnika kopiowane do procesów partii
+SHARD_SETTINGS = [
+    "ssh_timeout", "ssh_keepalive", "retry_attempts", "retry_delay", "pause_between_devices",
+    "upload_timeout", "update_command_timeout", "idle_timeout", "upload_safety_factor",
+    "stall_window", "stall_min_rate", "post_reboot_wait", "post_reboot_timeout", "post_reboot_poll",
+    "parallel_workers", "detached_update", "detached_poll_interval", "http_install",
+    "http_install_port", "prestage_rate_limit", "cleanup_stale_bundles", "skip_unreachable", "predial_ahead",
+    "async_read", "async_read_concurrency",
+]
+
+
+class ForwardingProfileStore(NetworkProfileStore):
+    """Profile sieci w procesie partii: odczyt z pliku, pomiary wysyłane do procesu głównego."""
+    def __init__(self, path, events, shard_index):
+        super().__init__(path)
+        self.events = events
+        self.shard_index = shard_index
+
+    def record(self, ip, name=None, **metrics):
+        # Kopia lokalna też aktualizowana - is_stale() nie mierzy RTT ponownie w tej partii
+        super().record(ip, name, **metrics)
+        self.events.put(("profile", self.shard_index, ip, name, metrics))
+
+    def _save(self):
+        pass
+
+
+class ShardEngine(BatchEngine):
+    """
+    Silnik w procesie partii - powiadomienia interfejsu przekazywane kolejką.
+    Stan sterownika wysyłany tylko po zmianie, postęp uploadu najwyżej kilka razy na sekundę.
+    """
+    UPLOAD_EVENT_INTERVAL = 0.25
+
+    def __init__(self, shard_index, events):
+        super().__init__()
+        self.shard_index = shard_index
+        self.events = events
+        self.network_profiles = ForwardingProfileStore(NETWORK_PROFILES_FILE, events, shard_index)
+        self._sent_states = {}
+        self._positions = {}
+        self._last_upload_event = 0.0
+
+    def log(self, message):
+        self.events.put(("log", self.shard_index, message))
+
+    def update_device_row(self, device):
+        if len(self._positions) != len(self.devices):
+            self._positions = {id(d): index for index, d in enumerate(self.devices)}
+        position = self._positions[id(device)]
+        state = device.state()
+        if self._sent_states.get(position) == state:
+            return
+        self._sent_states[position] = state
+        self.events.put(("device", self.shard_index, position, state))
+
+    def record_device_result(self, device, outcome):
+        # Zapis wyniku (autozapis, historia floty) robi proces główny - tylko sterowniki
+        # zakończone w process_batch, bez ponowień i pozycji pominiętych przez zatrzymanie
+        self.update_device_row(device)
+        self.events.put(("finished", self.shard_index, self._positions[id(device)], device.state(), outcome))
+
+    def show_batch_progress(self, percent, text, color):
+        self.events.put(("progress", self.shard_index, percent))
+
+    def show_upload_progress(self, percent, text, color):
+        now = time.time()
+        if percent not in (0, 100) and now - self._last_upload_event < self.UPLOAD_EVENT_INTERVAL:
+            return
+        self._last_upload_event = now
+        self.events.put(("upload", self.shard_index, percent, text, color))
+
+
+def run_shard(shard_index, settings, devices, operation, events, stop_event):
+    """Punkt wejścia procesu partii: przetwarza swoją część sterowników i odsyła podsumowanie."""
+    engine = ShardEngine(shard_index, events)
+    for name in SHARD_SETTINGS:
+        setattr(engine, name, settings[name])
+    if settings["firmware_catalog_dir"]:
+        engine.load_firmware_catalog(settings["firmware_catalog_dir"])
+    engine.firmware_path.set(settings["firmware_path"])
+    engine.devices = devices
+
+    def watch_stop():
+        stop_event.wait()
+        engine.processing = False
+
+    threading.Thread(target=watch_stop, daemon=True).start()
+    if stop_event.is_set():
+        events.put(("done", shard_index, None))
+        return
+    summary = engine.process_batch(operation)
+    for device in devices:
+        engine.update_device_row(device)
+    events.put(("done", shard_index, summary))
@@ -0,0 +1,128 @@
+"""
+Szybkie sprawdzanie osiągalności portu SSH wielu hostów naraz: nieblokujące połączenia
+TCP multipleksowane w jednej pętli asyncio (bez wątku i procesu na host), opcjonalnie
+z odczytem bannera SSH. Używane przez wykrywanie sterowników w podsieciach.
+
+Moduł importowany leniwie - asyncio nie jest ładowane przy starcie GUI.
+"""
+import asyncio
+import ipaddress
+import time
+
+SSH_PORT = 22
+DEFAULT_SCAN_TIMEOUT = 1.5
+DEFAULT_SCAN_CONCURRENCY = 512
+BANNER_TIMEOUT = 2.0
+MAX_SCAN_HOSTS = 65536  # /16
+
+
+class ProbeResult:
+    """Wynik sprawdzenia jednego hosta."""
+    __slots__ = ("ip", "reachable", "latency_ms", "banner", "reason")
+
+    def __init__(self, ip, reachable, latency_ms=None, banner="", reason=""):
+        self.ip = ip
+        self.reachable = reachable
+        self.latency_ms = latency_ms
+        self.banner = banner
+        self.reason = reason
+
+    def __repr__(self):
+        return f"ProbeResult({self.ip!r}, reachable={self.reachable}, latency_ms={self.latency_ms}, reason={self.reason!r})"
+
+
+def expand_targets(specs):
+    """
+    Adresy z listy specyfikacji: '192.168.1.0/24', '10.0.0.5', '10.0.0.10-10.0.0.20'
+    (rozdzielone przecinkami lub spacjami). Dla sieci pomijany adres sieci i rozgłoszeniowy.
+    """
+    if isinstance(specs, str):
+        specs = [specs]
+    addresses = []
+    seen = set()
+    for spec in specs:
+        for part in spec.replace(",", " ").split():
+            if "-" in part:
+                first, last = (ipaddress.ip_address(value.strip()) for value in part.split("-", 1))
+                if int(last) < int(first):
+                    raise ValueError(f"Nieprawidłowy zakres: {part}")
+                hosts = (ipaddress.ip_address(value) for value in range(int(first), int(last) + 1))
+                count = int(last) - int(first) + 1
+            elif "/" in part:
+                network = ipaddress.ip_network(part, strict=False)
+                hosts = network.hosts() if network.num_addresses > 2 else iter(network)
+                count = network.num_addresses
+            else:
+                hosts = [ipaddress.ip_address(part)]
+                count = 1
+            if len(addresses) + count > MAX_SCAN_HOSTS:
+                raise ValueError(f"Za duży zakres (limit {MAX_SCAN_HOSTS} adresów): {part}")
+            for host in hosts:
+                text = str(host)
+                if text not in seen:
+                    seen.add(text)
+                    addresses.append(text)
+    return addresses
+
+
+async def probe_host(ip, port=SSH_PORT, timeout=DEFAULT_SCAN_TIMEOUT, read_banner=False):
+    """Nieblokujące połączenie TCP (i opcjonalnie odczyt bannera SSH) - ProbeResult."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+    except ConnectionRefusedError:
+        return ProbeResult(ip, False, reason="Port zamknięty (firewall)")
+    except asyncio.TimeoutError:
+        return ProbeResult(ip, False, reason="Timeout połączenia")
+    except OSError:
+        return ProbeResult(ip, False, reason="Host nieosiągalny")
+    latency_ms = (loop.time() - start) * 1000
+
+    banner = ""
+    try:
+        if read_banner:
+            try:
+                line = await asyncio.wait_for(reader.readline(), BANNER_TIMEOUT)
+                banner = line.decode("utf-8", errors="ignore").strip()
+            except (asyncio.TimeoutError, OSError):
+                pass
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+    return ProbeResult(ip, True, latency_ms=latency_ms, banner=banner)
+
+
+async def _sweep(addresses, port, timeout, concurrency, read_banner, progress):
+    """Stała liczba workerów pobiera kolejne adresy z jednego iteratora (bez korutyny na każdy adres)."""
+    pending = iter(addresses)
+    total = len(addresses)
+    results = {}
+    last_report = 0.0
+
+    async def worker():
+        nonlocal last_report
+        for ip in pending:
+            results[ip] = await probe_host(ip, port, timeout, read_banner)
+            if progress and (time.monotonic() - last_report >= 0.2 or len(results) == total):
+                last_report = time.monotonic()
+                progress(len(results), total)
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    return results
+
+
+def sweep(addresses, port=SSH_PORT, timeout=DEFAULT_SCAN_TIMEOUT, concurrency=DEFAULT_SCAN_CONCURRENCY,
+          read_banner=False, progress=None):
+    """
+    Sprawdza wszystkie adresy w jednej pętli zdarzeń (do concurrency połączeń naraz).
+    Zwraca słownik ip -> ProbeResult. progress(done, total) wywoływane okresowo.
+    Blokuje wywołujący wątek - uruchamiać poza wątkiem GUI.
+    """
+    addresses = list(addresses)
+    if not addresses:
+        return {}
+    return asyncio.run(_sweep(addresses, port, timeout, max(1, concurrency), read_banner, progress))
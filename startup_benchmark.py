@@ -0,0 +1,72 @@
+"""
+Pomiar czasu startu GUI (każdy pomiar w świeżym interpreterze, Qt offscreen):
+import modułu, utworzenie okna (leniwe zakładki), dobudowanie pozostałych zakładek
+oraz koszt modułów ładowanych teraz dopiero przy pierwszym użyciu.
+
+    python startup_benchmark.py [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import FirmwareUpdater_listaExcel as gui
+t1 = time.perf_counter()
+app = gui.BatchProcessorApp()
+t2 = time.perf_counter()
+deferred = [m for m in ("paramiko", "openpyxl", "pytz", "http.server") if m not in sys.modules]
+for tab in list(app.lazy_tabs):
+    app.build_lazy_tab(tab)
+t3 = time.perf_counter()
+import paramiko, openpyxl, pytz, http.server
+t4 = time.perf_counter()
+print(json.dumps({
+    "import_module": t1 - t0,
+    "create_window": t2 - t1,
+    "build_lazy_tabs": t3 - t2,
+    "deferred_imports": t4 - t3,
+    "deferred": deferred,
+}))
+"""
+
+STAGES = [
+    ("import_module", "Import FirmwareUpdater_listaExcel"),
+    ("create_window", "Utworzenie okna (zakładki leniwe)"),
+    ("build_lazy_tabs", "Konfiguracja + Ręczna obsługa (przy 1. otwarciu)"),
+    ("deferred_imports", "paramiko/openpyxl/pytz/http.server (przy 1. użyciu)"),
+]
+
+
+def run_once():
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"Mediana z {args.runs} uruchomień:")
+    for key, label in STAGES:
+        print(f"  {label:<55} {statistics.median(r[key] for r in runs) * 1000:8.1f} ms")
+    startup = statistics.median(r["import_module"] + r["create_window"] for r in runs)
+    eager = statistics.median(sum(r[key] for key, _ in STAGES) for r in runs)
+    print(f"  {'Start do pokazania okna':<55} {startup * 1000:8.1f} ms")
+    print(f"  {'Start przy ładowaniu wszystkiego od razu (szacunek)':<55} {eager * 1000:8.1f} ms")
+    print(f"  Moduły odroczone przy starcie: {', '.join(runs[-1]['deferred']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Stan instalacji w tle z wyniku komendy kontrolnej (parse_detached_poll, detached_poll_command)."""
+import os
+import signal
+import subprocess
+import time
+
+import pytest
+
+from plc_engine import (
+    DETACHED_EXIT_MARKER,
+    DETACHED_RUNNING_MARKER,
+    detached_poll_command,
+    parse_detached_poll,
+)
+
+LOG_LINES = "20% Checking bundle\n45% Copying image to rootfs.1\n"
+
+
+def test_running_marker_without_exit_marker_is_running():
+    state, exit_code, last_line, parser = parse_detached_poll(LOG_LINES + DETACHED_RUNNING_MARKER + "\n")
+    assert state == "running"
+    assert exit_code is None
+    assert parser.percent == 45
+
+
+def test_exit_marker_wins_over_running_marker():
+    output = LOG_LINES + f"{DETACHED_EXIT_MARKER}0\n" + DETACHED_RUNNING_MARKER + "\n"
+    state, exit_code, _, _ = parse_detached_poll(output)
+    assert (state, exit_code) == ("finished", 0)
+
+
+def test_log_without_markers_is_interrupted():
+    state, exit_code, last_line, _ = parse_detached_poll(LOG_LINES)
+    assert (state, exit_code) == ("interrupted", None)
+    assert last_line == "45% Copying image to rootfs.1"
+
+
+def test_empty_output_is_missing():
+    assert parse_detached_poll("")[0] == "missing"
+
+
+def test_unparsable_exit_code():
+    assert parse_detached_poll(f"{DETACHED_EXIT_MARKER}x\n")[:2] == ("finished", -1)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    log_path = str(tmp_path / "update-axcf.log")
+    with open(log_path, "w") as f:
+        f.write(LOG_LINES)
+    return log_path, str(tmp_path / "update-axcf.pid")
+
+
+def poll(log_path, pid_file):
+    result = subprocess.run(["sh", "-c", detached_poll_command(log_path, pid_file)],
+                            capture_output=True, text=True, timeout=10)
+    return parse_detached_poll(result.stdout)[0]
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="wymaga /proc")
+def test_poll_command_tracks_pid_file(paths):
+    log_path, pid_file = paths
+    # Jak w start_detached_firmware_update: powłoka zapisuje swój PID, a jej cmdline zawiera ścieżkę logu
+    process = subprocess.Popen(["sh", "-c", f"echo $$ > {pid_file}; sleep 30 >> {log_path}"])
+    try:
+        deadline = time.time() + 5
+        while not os.path.exists(pid_file) and time.time() < deadline:
+            time.sleep(0.05)
+        assert poll(log_path, pid_file) == "running"
+    finally:
+        process.send_signal(signal.SIGKILL)
+        process.wait()
+    assert poll(log_path, pid_file) == "interrupted"
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="wymaga /proc")
+def test_poll_command_does_not_match_itself(paths):
+    # Brak pliku PID: sama komenda kontrolna ma ścieżkę logu w argumentach, ale nie jest instalacją
+    log_path, pid_file = paths
+    assert poll(log_path, pid_file) == "interrupted"
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self"), reason="wymaga /proc")
+def test_poll_command_ignores_reused_pid(paths):
+    log_path, pid_file = paths
+    with open(pid_file, "w") as f:
+        f.write(f"{os.getpid()}\n")
+    assert poll(log_path, pid_file) == "interrupted"
@@ -0,0 +1,215 @@
+"""Serwer HTTP firmware (Range) i instalacja strumieniowa przez atrapę 'rauc install <url>'."""
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from urllib.request import Request, urlopen
+
+import pytest
+
+import plc_engine
+from firmware_http import FirmwareHttpServer
+
+BUNDLE_SIZE = 256 * 1024 + 123
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    path = tmp_path / "axcf2152-2025.0.raucb"
+    path.write_bytes(os.urandom(BUNDLE_SIZE))
+    return str(path)
+
+
+@pytest.fixture
+def server(bundle):
+    server = FirmwareHttpServer(0)
+    server.add_file(bundle)
+    server.start()
+    yield server
+    server.stop()
+
+
+def wait_for_served(server, expected, timeout=5):
+    """Licznik rośnie w wątku obsługi po wysłaniu odpowiedzi - klient może skończyć czytać wcześniej."""
+    deadline = time.monotonic() + timeout
+    while server.served_bytes < expected and time.monotonic() < deadline:
+        threading.Event().wait(0.01)
+    return server.served_bytes
+
+
+def request(server, method="GET", range_header=None, name="axcf2152-2025.0.raucb"):
+    connection = HTTPConnection("127.0.0.1", server.server_address[1], timeout=10)
+    headers = {"Range": range_header} if range_header else {}
+    connection.request(method, f"/{name}", headers=headers)
+    response = connection.getresponse()
+    body = response.read()
+    connection.close()
+    return response, body
+
+
+def test_full_get(server, bundle):
+    response, body = request(server)
+    assert response.status == 200
+    assert response.getheader("Accept-Ranges") == "bytes"
+    assert body == open(bundle, "rb").read()
+
+
+@pytest.mark.parametrize("range_header, start, end", [
+    ("bytes=100-199", 100, 199),
+    ("bytes=1000-", 1000, BUNDLE_SIZE - 1),
+    ("bytes=-500", BUNDLE_SIZE - 500, BUNDLE_SIZE - 1),
+    ("bytes=10-99999999", 10, BUNDLE_SIZE - 1),
+])
+def test_range_returns_206_with_content_range(server, bundle, range_header, start, end):
+    response, body = request(server, range_header=range_header)
+    assert response.status == 206
+    assert response.getheader("Content-Range") == f"bytes {start}-{end}/{BUNDLE_SIZE}"
+    assert int(response.getheader("Content-Length")) == end - start + 1
+    with open(bundle, "rb") as f:
+        f.seek(start)
+        assert body == f.read(end - start + 1)
+
+
+@pytest.mark.parametrize("range_header", [
+    f"bytes={BUNDLE_SIZE}-", "bytes=200-100", "bytes=-0", "bytes=-", "items=0-10",
+])
+def test_unsatisfiable_range_returns_416(server, range_header):
+    response, body = request(server, range_header=range_header)
+    assert response.status == 416
+    assert response.getheader("Content-Range") == f"bytes */{BUNDLE_SIZE}"
+    assert body == b""
+
+
+def test_head_and_unknown_file(server):
+    response, body = request(server, method="HEAD")
+    assert response.status == 200
+    assert int(response.getheader("Content-Length")) == BUNDLE_SIZE
+    assert body == b""
+    assert request(server, name="other.raucb")[0].status == 404
+
+
+def test_served_bytes_counts_concurrent_ranges(server):
+    chunk = 1000
+    ranges = [f"bytes={offset}-{offset + chunk - 1}" for offset in range(0, 200 * chunk, chunk)]
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        statuses = list(pool.map(lambda r: request(server, range_header=r)[0].status, ranges))
+    assert statuses == [206] * len(ranges)
+    assert wait_for_served(server, len(ranges) * chunk) == len(ranges) * chunk
+
+
+class StandInRaucChannel:
+    """Kanał SSH atrapy sterownika: 'rauc install <url>' pobiera bundle fragmentami (Range) i raportuje wynik."""
+    CHUNK = 64 * 1024
+
+    def __init__(self, expected_digest):
+        self.expected_digest = expected_digest
+        self.output = b""
+        self.exit_status = None
+        self.lock = threading.Lock()
+
+    def get_pty(self):
+        pass
+
+    def exec_command(self, command):
+        self.url = command.split()[-1]
+        threading.Thread(target=self._install, daemon=True).start()
+
+    def _install(self):
+        with urlopen(Request(self.url, method="HEAD"), timeout=10) as response:
+            size = int(response.headers["Content-Length"])
+        digest = hashlib.sha256()
+        for offset in range(0, size, self.CHUNK):
+            end = min(offset + self.CHUNK, size) - 1
+            with urlopen(Request(self.url, headers={"Range": f"bytes={offset}-{end}"}), timeout=10) as response:
+                assert response.status == 206
+                digest.update(response.read())
+            self._write(f"{min(99, offset * 100 // size)}% Copying image to rootfs.1\n")
+        if digest.hexdigest() == self.expected_digest:
+            self._write(f"100% Installing done.\nInstalling `{self.url}` succeeded\n", 0)
+        else:
+            self._write("LastError: Failed to check bundle: signature verification failed\n"
+                        f"Installing `{self.url}` failed\n", 1)
+
+    def _write(self, text, exit_status=None):
+        with self.lock:
+            self.output += text.encode()
+            if exit_status is not None:
+                self.exit_status = exit_status
+
+    def send(self, data):
+        pass
+
+    def recv_ready(self):
+        with self.lock:
+            return bool(self.output)
+
+    def recv(self, size):
+        with self.lock:
+            data, self.output = self.output[:size], self.output[size:]
+            return data
+
+    def exit_status_ready(self):
+        with self.lock:
+            return self.exit_status is not None and not self.output
+
+    def recv_exit_status(self):
+        return self.exit_status
+
+    def recv_stderr_ready(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class StandInSsh:
+    def __init__(self, channel):
+        self.channel = channel
+        self.sock = self
+
+    def get_transport(self):
+        return self
+
+    def getsockname(self):
+        return ("127.0.0.1", 0)
+
+    def open_session(self):
+        return self.channel
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    for name in ("NETWORK_PROFILES_FILE", "DIGEST_CACHE_FILE", "INVENTORY_CACHE_FILE", "FLEET_STATE_FILE"):
+        monkeypatch.setattr(plc_engine, name, str(tmp_path / name.lower()))
+    monkeypatch.setattr(plc_engine.time, "sleep", lambda seconds: None)
+    engine = plc_engine.BatchEngine()
+    engine.log = lambda message: None
+    engine.http_install_port = 0
+    yield engine
+    engine.stop_firmware_http_server()
+
+
+@pytest.mark.parametrize("corrupt", [False, True])
+def test_streaming_install_through_stand_in_rauc(engine, bundle, corrupt):
+    with open(bundle, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    channel = StandInRaucChannel("0" * 64 if corrupt else digest)
+    engine.create_ssh_client = lambda ip, password, timeout=None: StandInSsh(channel)
+    reboots = []
+    engine.execute_reboot = reboots.append
+    device = plc_engine.PLCDevice("plc1", "127.0.0.1", "secret")
+
+    if corrupt:
+        with pytest.raises(plc_engine.BundleVerificationError):
+            engine.execute_http_firmware_update(device, bundle)
+    else:
+        engine.execute_http_firmware_update(device, bundle)
+        assert device.install_progress == 100
+    assert reboots == ([] if corrupt else [device])
+    assert channel.url.endswith("/axcf2152-2025.0.raucb")
+    assert wait_for_served(engine.firmware_http_server, BUNDLE_SIZE) == BUNDLE_SIZE
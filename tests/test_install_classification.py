@@ -0,0 +1,42 @@
+"""Wynik instalacji z kodu wyjścia i linii RAUC (classify_install_failure)."""
+from plc_engine import (
+    EXIT_CODE_DISCONNECTED,
+    BundleIncompatibleError,
+    InstallFailedError,
+    InstallProgressParser,
+    classify_install_failure,
+)
+
+
+def parser_for(*lines):
+    parser = InstallProgressParser()
+    for line in lines:
+        parser.parse_line(line)
+    return parser
+
+
+def test_clean_exit_and_disconnect_are_not_failures():
+    for exit_code in (0, None, EXIT_CODE_DISCONNECTED):
+        assert classify_install_failure(exit_code, parser_for("40% Copying image")) is None
+
+
+def test_nonzero_exit_without_rauc_error_fails_for_rauc_install():
+    failure = classify_install_failure(1, parser_for("40% Copying image"))
+    assert isinstance(failure, InstallFailedError)
+    assert failure.exit_code == 1
+
+
+def test_nonzero_exit_without_rauc_error_is_inconclusive_for_update_axcf():
+    assert classify_install_failure(143, parser_for("40% Copying image"), reboots_itself=True) is None
+
+
+def test_rauc_error_fails_even_for_update_axcf():
+    parser = parser_for("LastError: Failed to check bundle: Compatible mismatch",
+                        "Installing `/opt/plcnext/fw.raucb` failed")
+    failure = classify_install_failure(1, parser, reboots_itself=True)
+    assert isinstance(failure, BundleIncompatibleError)
+
+
+def test_failed_result_line_fails_with_zero_exit():
+    parser = parser_for("Installing `/opt/plcnext/fw.raucb` failed")
+    assert isinstance(classify_install_failure(0, parser, reboots_itself=True), InstallFailedError)
@@ -0,0 +1,108 @@
+"""
+Pomiar ścieżki odczytu pliku firmware przy równoległym uploadzie (każdy pomiar w świeżym
+interpreterze): dotychczasowe otwarcie pliku przez każdego workera i odczyt kolejnych
+fragmentów 64 KiB kontra jedno mapowanie SharedFileMaps i wycinki memoryview.
+Workery przekazują dane do odbiornika liczącego SHA-256 (w miejsce zapisu SFTP).
+Raportuje czas, czas CPU procesu i szczytowe zużycie pamięci (RSS).
+
+    python upload_benchmark.py [--size-mb 300] [--workers 5] [--runs 3]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import hashlib, json, sys, threading, time
+path, mode, workers = sys.argv[1], sys.argv[2], int(sys.argv[3])
+chunk_size = 64 * 1024
+
+def legacy_worker():
+    sink = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_size)
+            if not data:
+                break
+            sink.update(data)
+
+def shared_worker(maps):
+    sink = hashlib.sha256()
+    with maps.mapped(path) as view:
+        for offset in range(0, len(view), chunk_size):
+            data = view[offset:offset + chunk_size]
+            sink.update(data)
+            data.release()
+
+if mode == "shared":
+    from plc_engine import SharedFileMaps
+    maps = SharedFileMaps()
+    target, args = shared_worker, (maps,)
+else:
+    target, args = legacy_worker, ()
+
+wall0, cpu0 = time.perf_counter(), time.process_time()
+threads = [threading.Thread(target=target, args=args) for _ in range(workers)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+wall, cpu = time.perf_counter() - wall0, time.process_time() - cpu0
+try:
+    import resource
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+except ImportError:
+    peak_kb = None
+print(json.dumps({"seconds": wall, "cpu": cpu, "peak_kb": peak_kb}))
+"""
+
+CASES = [
+    ("legacy", "Osobny plik na workera, odczyt fragmentów (dotychczas)"),
+    ("shared", "SharedFileMaps - jedno mapowanie, wycinki memoryview"),
+]
+
+
+def write_sample(path, size_mb):
+    block = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def run_once(path, mode, workers):
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, path, mode, str(workers)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=5)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "firmware.raucb")
+        write_sample(path, args.size_mb)
+        run_once(path, "legacy", 1)  # plik w page cache przed pomiarami
+        print(f"Mediana z {args.runs} uruchomień, plik {args.size_mb} MB, {args.workers} workerów:")
+        for mode, label in CASES:
+            runs = [run_once(path, mode, args.workers) for _ in range(args.runs)]
+            seconds = statistics.median(r["seconds"] for r in runs)
+            cpu = [r["cpu"] for r in runs]
+            peak = [r["peak_kb"] for r in runs if r["peak_kb"] is not None]
+            peak_text = f"{statistics.median(peak) / 1024:7.1f} MB" if peak else "      -"
+            print(f"  {label:<55} {seconds:6.2f} s  CPU {min(cpu):.2f}-{max(cpu):.2f} s  RSS {peak_text}")
+
+
+if __name__ == "__main__":
+    main()